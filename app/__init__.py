@@ -3,11 +3,13 @@ from flask_bootstrap import Bootstrap
 from flask_sqlalchemy import SQLAlchemy
 from flask_admin import Admin
 from config import config
+from .instrumentation import Instrumentation
 
 
 bootstrap = Bootstrap()
 db = SQLAlchemy()
 admin = Admin(template_mode='bootstrap3')
+instrumentation = Instrumentation()
 
 
 def create_app(config_name):
@@ -17,11 +19,15 @@ def create_app(config_name):
     # apply configuration
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
+    from .database import configure_pool, configure_engine
+    configure_pool(app)
 
     # initialize extensions
     bootstrap.init_app(app)
     db.init_app(app)
+    configure_engine(app)
     admin.init_app(app)
+    instrumentation.init_app(app)
 
     # register blueprints
     from .main import main as main_blueprint
@@ -31,4 +37,12 @@ def create_app(config_name):
     from .api import api as api_blueprint
     app.register_blueprint(api_blueprint, url_prefix='/api')
 
+    # keep the materialized risk roll-ups, the change counters and the
+    # catalogue cache up to date
+    from . import rollups, counters, catalogue
+
+    # run background jobs on a local worker pool
+    from .jobs import JobQueue
+    JobQueue(app)
+
     return app
\ No newline at end of file
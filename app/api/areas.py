@@ -7,14 +7,14 @@ from ..decorators import json, paginate
 
 @api.route('/areas/', methods=['GET'])
 @json
-@paginate('areas')
+@paginate('areas', eager=('facility',))
 def get_areas():
     return Area.query
 
 
 @api.route('/facilities/<int:id>/areas/', methods=['GET'])
 @json
-@paginate('areas')
+@paginate('areas', eager=('facility',))
 def get_facility_areas(id):
     facility = Facility.query.get_or_404(id)
     return facility.areas
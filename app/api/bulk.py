@@ -0,0 +1,78 @@
+import json
+from flask import request
+from sqlalchemy.exc import IntegrityError
+from .. import db
+from ..exceptions import ValidationError
+from ..generation import bulk_insert_ids
+
+
+def read_items():
+    """Return the items of a bulk request, sent either as a JSON array or as
+    newline delimited JSON."""
+    if request.mimetype == 'application/x-ndjson':
+        items = []
+        lines = request.get_data(as_text=True).splitlines()
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ValidationError('Invalid JSON on line {}'.format(number))
+        return items
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise ValidationError('Expected a JSON array or NDJSON body')
+    return items
+
+
+def bulk_create(model, items, values, key, check=None):
+    """Create an instance of a model per item in a single transaction.
+
+    Each item is validated by the ``import_data`` method of the model and by
+    ``check``, if given, which can raise ``ValidationError`` too. The valid
+    items are inserted with ``values`` for the parent columns, the invalid
+    ones are skipped, and their ids are read back by the natural ``key`` of
+    the model, see :func:`~app.generation.bulk_insert_ids`. Returns the
+    result of every item, in order, or a 409 response if the items conflict
+    with rows written by another request, in which case none is created."""
+    results = [None] * len(items)
+    columns = [column for column in model.__table__.columns
+               if not column.primary_key]
+    created = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValidationError('Invalid item: expected an object')
+            instance = model().import_data(item)
+            if check is not None:
+                check(instance)
+        except ValidationError as e:
+            results[index] = {'status': 400, 'message': e.args[0]}
+            continue
+        row = {}
+        for column in columns:
+            value = getattr(instance, column.key)
+            if value is None and column.default is not None and \
+                    column.default.is_scalar:
+                # applied by the flush, which the Core insert bypasses
+                value = column.default.arg
+            row[column.key] = value
+        row.update(values)
+        created.append((index, instance, row))
+
+    if created:
+        try:
+            bulk_insert_ids(model.__table__, [row for _, _, row in created],
+                            key)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return {'status': 409, 'error': 'conflict',
+                    'message': 'the items conflict with resources created '
+                               'by another request'}, 409
+    for index, instance, row in created:
+        instance.id = row['id']
+        results[index] = {'status': 201, 'location': instance.get_url()}
+    return {'results': results, 'created': len(created),
+            'errors': len(items) - len(created)}
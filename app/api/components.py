@@ -1,13 +1,16 @@
-from flask import jsonify, request
+from flask import abort, jsonify, request
 from . import api
 from .. import db
-from ..models import Area, Component
+from ..models import Area, Component, FMECA
 from ..decorators import json, paginate
+from ..exceptions import ValidationError
+from ..sensitivity import analyse
+from .bulk import read_items, bulk_create
 
 
 @api.route("/areas/<int:id>/components/", methods=['GET'])
 @json
-@paginate('components')
+@paginate('components', eager=('area',))
 def get_area_components(id):
     area = Area.query.get_or_404(id)
     return area.components
@@ -19,6 +22,26 @@ def get_component(id):
     return Component.query.get_or_404(id)
 
 
+@api.route("/components/<int:id>/rbi/sensitivity", methods=['GET'])
+@json
+def get_component_rbi_sensitivity(id):
+    fmeca = FMECA.query.filter_by(component_id=id).first_or_404()
+    rbi = fmeca.rbi
+    if rbi is None:
+        abort(404)
+    variation = request.args.get('variation', 0.1, type=float)
+    if not 0 < variation < 1:
+        raise ValidationError('Invalid variation: must be between 0 and 1')
+    analysis = analyse(rbi, variation)
+    return {
+        'variation': analysis.variation,
+        'risk': analysis.risk,
+        'inspection_interval': analysis.inspection_interval,
+        'inputs': [dict(sensitivity._asdict())
+                   for sensitivity in analysis.inputs],
+    }
+
+
 @api.route("/areas/<int:id>/components/", methods=["POST"])
 @json
 def new_area_component(id):
@@ -30,6 +53,23 @@ def new_area_component(id):
     return {}, 201, {'Location': component.get_url()}
 
 
+@api.route("/areas/<int:id>/components/bulk", methods=["POST"])
+@json
+def new_area_components(id):
+    area = Area.query.get_or_404(id)
+    items = read_items()
+    idents = {ident for ident, in db.session.query(Component.ident)}
+
+    def check(component):
+        if component.ident in idents:
+            raise ValidationError('Invalid component: duplicate ident ' +
+                                  component.ident)
+        idents.add(component.ident)
+
+    return bulk_create(Component, items, {'area_id': area.id}, ('ident',),
+                       check)
+
+
 @api.route("/components/<int:id>", methods=["PUT"])
 @json
 def edit_component(id):
@@ -3,11 +3,12 @@ from . import api
 from .. import db
 from ..models import Component, Consequence
 from ..decorators import json, paginate
+from .bulk import read_items, bulk_create
 
 
 @api.route('/components/<int:id>/consequences/', methods=['GET'])
 @json
-@paginate('consequences')
+@paginate('consequences', eager=('component',))
 def get_component_consequences(id):
     component = Component.query.get_or_404(id)
     return component.consequences
@@ -30,6 +31,16 @@ def new_component_consequence(id):
     return {}, 201, {'Location': consequence.get_url()}
 
 
+@api.route('/components/<int:id>/consequences/bulk', methods=['POST'])
+@json
+def new_component_consequences(id):
+    component = Component.query.get_or_404(id)
+    return bulk_create(Consequence, read_items(),
+                       {'component_id': component.id,
+                        'facility_id': component.area.facility_id},
+                       ('component_id', 'name'))
+
+
 @api.route('/consequences/<int:id>', methods=['PUT'])
 @json
 def edit_consequence(id):
@@ -1,4 +1,6 @@
 from flask import jsonify
+from sqlalchemy.orm.exc import StaleDataError
+from .. import db
 from ..exceptions import ValidationError
 from . import api
 
@@ -11,6 +13,18 @@ def bad_request(e):
     return response
 
 
+@api.errorhandler(StaleDataError)
+def conflict(e):
+    # the version of a versioned model changed since it was read, i.e. the
+    # resource was modified by another request in the meantime
+    db.session.rollback()
+    response = jsonify({'status': 409, 'error': 'conflict',
+                        'message': 'the resource was modified by another '
+                                   'request, fetch it and try again'})
+    response.status_code = 409
+    return response
+
+
 @api.app_errorhandler(404)  # this has to be an app-wide handler
 def not_found(e):
     response = jsonify({'status': 404, 'error': 'not found',
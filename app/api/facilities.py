@@ -1,8 +1,15 @@
-from flask import jsonify, request
+import numpy as np
+from flask import Response, current_app, jsonify, request, \
+    stream_with_context
 from . import api
 from .. import db
+from ..exceptions import ValidationError
 from ..models import Facility
 from ..decorators import json, paginate
+from ..export import export_facility, ndjson
+from ..campaigns import plan, export_plan
+from ..projection import project_facility, component_totals
+from ..uncertainty import simulate_facility, export_result
 
 
 @api.route("/facilities/", methods=['GET'])
@@ -18,6 +25,57 @@ def get_facility(id):
     return Facility.query.get_or_404(id)
 
 
+@api.route("/facilities/<int:id>/export", methods=['GET'])
+def get_facility_export(id):
+    facility = Facility.query.get_or_404(id)
+    return Response(stream_with_context(ndjson(export_facility(facility.id))),
+                    mimetype='application/x-ndjson')
+
+
+@api.route("/facilities/<int:id>/projection", methods=['GET'])
+@json
+def get_facility_projection(id):
+    facility = Facility.query.get_or_404(id)
+    projection = project_facility(
+        facility, horizon=request.args.get('horizon', type=float),
+        discount_rate=request.args.get('discount_rate', type=float))
+    expected = np.nansum(projection.expected_cost, axis=1)
+    discounted = np.nansum(projection.discounted_cost, axis=1)
+    return {
+        'years': projection.years,
+        'expected_cost': expected,
+        'discounted_cost': discounted,
+        'cumulative_discounted_cost': np.cumsum(discounted),
+        'total': float(discounted.sum()),
+        'components': [{'id': component_id, 'ident': ident, 'total': total}
+                       for component_id, ident, total in
+                       component_totals(projection, facility.id)],
+    }
+
+
+@api.route("/facilities/<int:id>/uncertainty", methods=['GET'])
+@json
+def get_facility_uncertainty(id):
+    facility = Facility.query.get_or_404(id)
+    samples = request.args.get('samples')
+    if samples is not None:
+        try:
+            samples = int(samples)
+        except ValueError:
+            raise ValidationError('Invalid samples: not an integer')
+    result = simulate_facility(facility.id, samples=samples,
+                               seed=request.args.get('seed', type=int))
+    return export_result(result)
+
+
+@api.route("/facilities/<int:id>/campaigns", methods=['GET'])
+@json
+def get_facility_campaigns(id):
+    facility = Facility.query.get_or_404(id)
+    return export_plan(plan(facility,
+                            request.args.get('horizon', type=float)))
+
+
 @api.route("/facilities/", methods=["POST"])
 @json
 def new_facility():
@@ -2,6 +2,7 @@ from flask import jsonify, request
 from . import api
 from .. import db
 from ..models import SubComponent, Consequence, FailureMode
+from ..catalogue import cache
 from ..decorators import json, paginate
 
 
@@ -13,6 +14,16 @@ def get_subcomponent_failure_modes(id):
     return subcomponent.failure_modes
 
 
+@api.route('/failure_modes/catalogue', methods=['GET'])
+@json
+def get_catalogue():
+    return {'version': cache.version,
+            'categories': {category: len(failure_modes)
+                           for category, failure_modes
+                           in cache.by_category().items()
+                           if category is not None}}
+
+
 @api.route('/failure_modes/<int:id>', methods=['GET'])
 @json
 def get_failure_mode(id):
@@ -0,0 +1,34 @@
+from flask import request
+from . import api
+from ..models import Job
+from ..decorators import json, paginate
+from ..exceptions import ValidationError
+from ..jobs import check_params, submit
+
+
+@api.route('/jobs/', methods=['GET'])
+@json
+@paginate('jobs')
+def get_jobs():
+    return Job.query.order_by(Job.id.desc())
+
+
+@api.route('/jobs/<int:id>', methods=['GET'])
+@json
+def get_job(id):
+    return Job.query.get_or_404(id)
+
+
+@api.route('/jobs/', methods=['POST'])
+@json
+def new_job():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValidationError('Invalid job: expected an object')
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        raise ValidationError('Invalid job: params must be an object')
+    # checked before the call, so that the params cannot set next_url
+    check_params(data.get('kind'), params)
+    job = submit(data['kind'], **params)
+    return job, 202, {'Location': job.get_url()}
@@ -0,0 +1,12 @@
+from flask import abort, current_app
+from . import api
+from .. import instrumentation
+from ..decorators import json
+
+
+@api.route('/_metrics', methods=['GET'])
+@json
+def get_metrics():
+    if not current_app.config['INSTRUMENTATION']:
+        abort(404)
+    return {'endpoints': instrumentation.export_data()}
@@ -0,0 +1,57 @@
+from flask import request
+from . import api
+from .. import db
+from ..models import Facility, Scenario
+from ..decorators import json, paginate
+from ..scenarios import compare, export_comparison
+
+
+@api.route('/facilities/<int:id>/scenarios/', methods=['GET'])
+@json
+@paginate('scenarios', eager=('facility',))
+def get_facility_scenarios(id):
+    facility = Facility.query.get_or_404(id)
+    return facility.scenarios
+
+
+@api.route('/scenarios/<int:id>', methods=['GET'])
+@json
+def get_scenario(id):
+    return Scenario.query.get_or_404(id)
+
+
+@api.route('/scenarios/<int:id>/comparison', methods=['GET'])
+@json
+def get_scenario_comparison(id):
+    scenario = Scenario.query.get_or_404(id)
+    return export_comparison(compare(scenario))
+
+
+@api.route('/facilities/<int:id>/scenarios/', methods=['POST'])
+@json
+def new_facility_scenario(id):
+    facility = Facility.query.get_or_404(id)
+    scenario = Scenario(facility=facility)
+    scenario.import_data(request.json)
+    db.session.add(scenario)
+    db.session.commit()
+    return {}, 201, {'Location': scenario.get_url()}
+
+
+@api.route('/scenarios/<int:id>', methods=['PUT'])
+@json
+def edit_scenario(id):
+    scenario = Scenario.query.get_or_404(id)
+    scenario.import_data(request.json)
+    db.session.add(scenario)
+    db.session.commit()
+    return {}
+
+
+@api.route('/scenarios/<int:id>', methods=['DELETE'])
+@json
+def delete_scenario(id):
+    scenario = Scenario.query.get_or_404(id)
+    db.session.delete(scenario)
+    db.session.commit()
+    return {}
@@ -3,11 +3,12 @@ from . import api
 from .. import db
 from ..models import Component, SubComponent
 from ..decorators import json, paginate
+from .bulk import read_items, bulk_create
 
 
 @api.route('/components/<int:id>/subcomponents/', methods=['GET'])
 @json
-@paginate('subcomponents')
+@paginate('subcomponents', eager=('component',))
 def get_component_subcomponents(id):
     component = Component.query.get_or_404(id)
     return component.subcomponents
@@ -30,6 +31,15 @@ def new_component_subcomponent(id):
     return {}, 201, {'Location': subcomponent.get_url()}
 
 
+@api.route('/components/<int:id>/subcomponents/bulk', methods=['POST'])
+@json
+def new_component_subcomponents(id):
+    component = Component.query.get_or_404(id)
+    return bulk_create(SubComponent, read_items(),
+                       {'component_id': component.id},
+                       ('component_id', 'ident'))
+
+
 @api.route('/subcomponents/<int:id>', methods=['PUT'])
 @json
 def edit_subcomponent(id):
@@ -0,0 +1,341 @@
+"""Inspection campaign optimizer.
+
+The inspection interval of an RBI is the longest time its component can go
+without the inspection. Inspected on their own, every component pays for a
+vessel mobilisation each time; the optimizer instead groups the RBIs of a
+facility into campaigns that share one mobilisation.
+
+A campaign is a vessel visiting a group of components every ``period``
+years, where the period is the shortest inspection interval in the group,
+so over a horizon of ``H`` years it sails ``floor(H / period)`` times. Each
+sailing costs the day rate of the vessel for its mobilisation time, for
+``CAMPAIGN_INSPECTION_DAYS`` per component and for
+``CAMPAIGN_TRANSIT_DAYS`` per area visited. Grouping therefore trades
+inspecting some components more often than needed against sharing the
+mobilisation and the transit.
+
+The groups are built greedily, components with the shortest intervals
+first, each joining the group that costs least or starting its own, and
+then improved by local search: moving single components between groups
+and merging groups, until no move lowers the total cost. Only the groups
+whose periods are nearest the interval of a component are candidates for
+it, which bounds the cost of a pass for facilities with many groups.
+
+The vessels able to do an inspection type are set by the
+``CAMPAIGN_VESSELS`` setting, which maps inspection types to vessel
+abbreviations. Inspection types it leaves out can use every vessel of the
+facility.
+"""
+import bisect
+import math
+from collections import Counter, namedtuple
+from flask import current_app
+from . import db
+from .exceptions import ValidationError
+from .models import Component, Vessel
+from .rbi import results
+
+Campaign = namedtuple('Campaign', ['vessel', 'period', 'sailings',
+                                   'sailing_cost', 'cost', 'areas',
+                                   'rbis'])
+
+CampaignPlan = namedtuple('CampaignPlan', ['horizon', 'cost',
+                                           'individual_cost', 'campaigns',
+                                           'uninspected'])
+
+# largest number of local search passes
+MAX_PASSES = 50
+
+# number of groups of a vessel on either side of an item's interval, in the
+# order of their periods, that the item may join, and of groups that a group
+# may merge with, so that a pass costs O(items) rather than O(items × groups)
+MAX_CANDIDATES = 8
+
+
+def sailings(horizon, period):
+    """Return the number of times a campaign sails over a horizon."""
+    return int(math.floor(horizon / period + 1e-9))
+
+
+class VesselCosts(object):
+    """The day rate and mobilisation cost of a vessel."""
+
+    def __init__(self, abbr, day_rate, mob_time, inspection_days,
+                 transit_days):
+        self.abbr = abbr
+        self.day_rate = day_rate or 0
+        self.mobilisation = (mob_time or 0) * self.day_rate
+        self.inspection = inspection_days * self.day_rate
+        self.transit = transit_days * self.day_rate
+
+    def sailing_cost(self, components, areas):
+        return self.mobilisation + components * self.inspection + \
+            areas * self.transit
+
+
+class Group(object):
+    """RBIs sharing the campaigns of a vessel.
+
+    The sorted intervals and the number of members per area are kept up to
+    date, so that the cost of the group with a member added or removed is
+    found without walking its members."""
+
+    def __init__(self, vessel):
+        self.vessel = vessel
+        self.members = set()
+        self.intervals = []
+        self.areas = Counter()
+
+    @property
+    def period(self):
+        return self.intervals[0] if self.intervals else None
+
+    def _cost(self, horizon, period, components, areas):
+        if period is None:
+            return 0.0
+        return sailings(horizon, period) * \
+            self.vessel.sailing_cost(components, areas)
+
+    def cost(self, horizon):
+        """Return the cost of the group over the horizon."""
+        return self._cost(horizon, self.period, len(self.members),
+                          len(self.areas))
+
+    def cost_with(self, horizon, item):
+        """Return the cost of the group with an item added."""
+        period = item.interval if self.period is None else \
+            min(self.period, item.interval)
+        return self._cost(horizon, period, len(self.members) + 1,
+                          len(self.areas) + (item.area_id not in self.areas))
+
+    def cost_without(self, horizon, item):
+        """Return the cost of the group with one of its items removed."""
+        if len(self.intervals) == 1:
+            return 0.0
+        period = self.intervals[1] if item.interval == self.intervals[0] \
+            else self.intervals[0]
+        return self._cost(horizon, period, len(self.members) - 1,
+                          len(self.areas) - (self.areas[item.area_id] == 1))
+
+    def cost_merged(self, horizon, other):
+        """Return the cost of the group merged with another one."""
+        return self._cost(horizon, min(self.period, other.period),
+                          len(self.members) + len(other.members),
+                          len(self.areas.keys() | other.areas.keys()))
+
+    def add(self, item):
+        self.members.add(item)
+        bisect.insort(self.intervals, item.interval)
+        self.areas[item.area_id] += 1
+        item.group = self
+
+    def remove(self, item):
+        self.members.remove(item)
+        del self.intervals[bisect.bisect_left(self.intervals, item.interval)]
+        self.areas[item.area_id] -= 1
+        if not self.areas[item.area_id]:
+            del self.areas[item.area_id]
+        item.group = None
+
+
+class Item(object):
+    """An RBI to schedule."""
+
+    def __init__(self, result, area_id, vessels):
+        self.result = result
+        self.interval = result.inspection_interval
+        self.area_id = area_id
+        self.vessels = vessels
+        self.group = None
+
+
+class GroupIndex(object):
+    """The groups of each vessel, sorted by period, so that an item is only
+    weighed against the groups whose period is nearest its interval."""
+
+    def __init__(self, groups=()):
+        self._groups = {}
+        self._periods = {}
+        for group in sorted(groups, key=lambda group: group.period):
+            self.add(group)
+
+    def add(self, group):
+        groups = self._groups.setdefault(group.vessel, [])
+        periods = self._periods.setdefault(group.vessel, [])
+        # periods drift as members move, until the index is rebuilt: the
+        # order only chooses the candidates
+        index = bisect.bisect_right(periods, group.period)
+        groups.insert(index, group)
+        periods.insert(index, group.period)
+
+    def nearest(self, vessel, interval, count=MAX_CANDIDATES):
+        """Return the ``count`` groups of a vessel on either side of an
+        interval."""
+        groups = self._groups.get(vessel, [])
+        index = bisect.bisect_left(self._periods.get(vessel, []), interval)
+        return groups[max(0, index - count):index + count]
+
+    def neighbours(self):
+        """Yield the pairs of groups of the same vessel that are at most
+        ``MAX_CANDIDATES`` apart in the order of their periods."""
+        for groups in self._groups.values():
+            for index, group in enumerate(groups):
+                for other in groups[index + 1:index + 1 + MAX_CANDIDATES]:
+                    yield group, other
+
+
+def optimize(items, horizon):
+    """Group items into campaigns. Returns the list of groups."""
+    groups = []
+    index = GroupIndex()
+
+    def best_move(item):
+        # the cheapest group to join, or a new group of one of its vessels,
+        # as a (change in cost, group or vessel) tuple
+        current = item.group
+        leave = 0.0
+        best = (math.inf, None)
+        if current is not None:
+            leave = current.cost_without(horizon, item) - \
+                current.cost(horizon)
+            best = (0.0, None)
+        for vessel in item.vessels:
+            for group in index.nearest(vessel, item.interval):
+                if group is current or not group.members:
+                    continue
+                delta = leave + group.cost_with(horizon, item) - \
+                    group.cost(horizon)
+                if delta < best[0] - 1e-9:
+                    best = (delta, group)
+        if current is None or len(current.members) > 1:
+            for vessel in item.vessels:
+                delta = leave + Group(vessel).cost_with(horizon, item)
+                if delta < best[0] - 1e-9:
+                    best = (delta, vessel)
+        return best
+
+    def move(item, target):
+        if item.group is not None:
+            item.group.remove(item)
+        if isinstance(target, VesselCosts):
+            target = Group(target)
+            target.add(item)
+            groups.append(target)
+            index.add(target)
+        else:
+            target.add(item)
+
+    # greedy construction, shortest intervals first
+    for item in sorted(items, key=lambda item: item.interval):
+        delta, target = best_move(item)
+        move(item, target)
+
+    # local search
+    for _ in range(MAX_PASSES):
+        improved = False
+        for item in items:
+            delta, target = best_move(item)
+            if target is not None:
+                move(item, target)
+                improved = True
+        groups[:] = [group for group in groups if group.members]
+        for a, b in GroupIndex(groups).neighbours():
+            if not a.members or not b.members:
+                continue
+            if a.cost_merged(horizon, b) < \
+                    a.cost(horizon) + b.cost(horizon) - 1e-9:
+                for item in list(b.members):
+                    b.remove(item)
+                    a.add(item)
+                improved = True
+        groups[:] = [group for group in groups if group.members]
+        index = GroupIndex(groups)
+        if not improved:
+            break
+    return groups
+
+
+def vessel_costs(facility_id):
+    """Return the :class:`VesselCosts` of the vessels of a facility."""
+    config = current_app.config
+    return [VesselCosts(abbr, day_rate, mob_time,
+                        config['CAMPAIGN_INSPECTION_DAYS'],
+                        config['CAMPAIGN_TRANSIT_DAYS'])
+            for abbr, day_rate, mob_time in
+            db.session.query(Vessel.abbr, Vessel.day_rate, Vessel.mob_time).
+            filter(Vessel.facility_id == facility_id).order_by(Vessel.id)]
+
+
+def plan(facility, horizon=None):
+    """Plan the inspection campaigns of the RBIs of a facility over a
+    horizon, by default its remaining life. Returns a
+    :class:`CampaignPlan`.
+
+    RBIs without risk, or whose interval is longer than the horizon, need
+    no inspection and are listed as uninspected, as are RBIs with a zero
+    interval, which no campaign can meet."""
+    if horizon is None:
+        horizon = facility.remaining_life or \
+            current_app.config['CAMPAIGN_HORIZON']
+    if not math.isfinite(horizon) or horizon <= 0:
+        raise ValidationError('Invalid horizon: must be positive and finite')
+    vessels = vessel_costs(facility.id)
+    by_type = current_app.config['CAMPAIGN_VESSELS']
+    rbis = results(facility)
+    areas = dict(db.session.query(Component.id, Component.area_id).
+                 filter(Component.id.in_(
+                     {result.component_id for result in rbis} or [None])))
+
+    items = []
+    uninspected = []
+    for result in rbis:
+        interval = result.inspection_interval
+        if interval is None or interval <= 0 or \
+                sailings(horizon, interval) == 0:
+            uninspected.append(result)
+            continue
+        abbrs = by_type.get(result.inspection_type)
+        eligible = [vessel for vessel in vessels
+                    if abbrs is None or vessel.abbr in abbrs]
+        if not eligible:
+            uninspected.append(result)
+            continue
+        items.append(Item(result, areas[result.component_id], eligible))
+
+    # the cost of inspecting every component on its own
+    individual = sum(min(Group(vessel).cost_with(horizon, item)
+                         for vessel in item.vessels) for item in items)
+
+    campaigns = []
+    for group in optimize(items, horizon):
+        count = sailings(horizon, group.period)
+        cost = group.cost(horizon)
+        campaigns.append(Campaign(
+            group.vessel.abbr, group.period, count, cost / count, cost,
+            len(group.areas),
+            sorted((item.result for item in group.members),
+                   key=lambda result: result.ident)))
+    campaigns.sort(key=lambda campaign: (campaign.period, campaign.vessel))
+    return CampaignPlan(horizon, sum(c.cost for c in campaigns), individual,
+                        campaigns, uninspected)
+
+
+def _rbi_data(result):
+    return {'rbi_id': result.rbi_id, 'component_id': result.component_id,
+            'ident': result.ident, 'inspection_type': result.inspection_type,
+            'inspection_interval': result.inspection_interval}
+
+
+def export_plan(plan):
+    """Return a campaign plan as a dictionary."""
+    return {
+        'horizon': plan.horizon,
+        'cost': plan.cost,
+        'individual_cost': plan.individual_cost,
+        'saving': plan.individual_cost - plan.cost,
+        'campaigns': [dict(campaign._asdict(),
+                           rbis=[_rbi_data(result)
+                                 for result in campaign.rbis])
+                      for campaign in plan.campaigns],
+        'uninspected': [_rbi_data(result) for result in plan.uninspected],
+    }
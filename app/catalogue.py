@@ -0,0 +1,205 @@
+"""Failure mode catalogue.
+
+The catalogue of failure modes is reference data loaded from ``fms.json``,
+which maps each sub-component category to its failure modes. Failure modes
+are identified by their sub-component category and description.
+
+:func:`sync_catalogue` brings the ``failure_modes`` table in line with a
+catalogue file: new failure modes are inserted and changed ones updated,
+each with bulk statements. Running it twice with the same file changes
+nothing. Failure modes that are not in the file, such as the ones created by
+users, are kept unless deleting them is asked for explicitly.
+
+As the catalogue rarely changes, it is also cached in memory by
+:data:`cache`, grouped by sub-component category. Every read checks a stamp
+made of the change counter of the ``failure_modes`` table (see
+:mod:`app.counters`), its largest id and its number of rows, so that changes
+committed by any process, worker or command are picked up on the next read.
+A session whose transaction writes failure modes reads them from the
+database instead, so that the cache only ever holds committed rows.
+"""
+import json
+import threading
+from collections import defaultdict, namedtuple, OrderedDict
+from sqlalchemy import bindparam, func
+from . import db
+from .counters import counter, touch, touched
+from .database import chunks
+from .models import FailureMode, Failure
+from .generation import bulk_insert
+from .rollups import mark_stale
+
+FIELDS = ('time_dependant', 'mean_time_to_failure', 'detectable',
+          'inspection_type', 'consequence_description', 'weibull_shape',
+          'weibull_scale')
+
+CachedFailureMode = namedtuple('CachedFailureMode',
+                               ('id', 'subcomponent_category', 'description')
+                               + FIELDS)
+
+CatalogueChanges = namedtuple('CatalogueChanges', ['inserted', 'updated',
+                                                   'deleted', 'unchanged'])
+
+
+def read_catalogue(fp):
+    """Yield a dictionary per failure mode of a catalogue file in the format
+    of ``fms.json``. The file is parsed as a whole."""
+    catalogue = json.load(fp, object_pairs_hook=OrderedDict)
+    for category, failure_modes in catalogue.items():
+        for description, failure_mode in failure_modes.items():
+            yield {
+                'subcomponent_category': category,
+                'description': description,
+                'time_dependant': failure_mode['time_dependent'],
+                'mean_time_to_failure': failure_mode['mean_time_to_failure'],
+                'detectable': failure_mode['detectable'],
+                'inspection_type': failure_mode['inspection_type'],
+                'consequence_description':
+                    failure_mode['consequence_description'],
+                'weibull_shape': failure_mode.get('weibull_shape'),
+                'weibull_scale': failure_mode.get('weibull_scale'),
+            }
+
+
+def sync_catalogue(entries, delete=False):
+    """Apply a catalogue to the ``failure_modes`` table.
+
+    ``entries`` is an iterable of failure mode dictionaries, as produced by
+    :func:`read_catalogue`. If ``delete`` is set, failure modes missing from
+    the catalogue are deleted together with their failures, and so are
+    duplicated failure modes. The caller commits. Returns a
+    :class:`CatalogueChanges` with the number of failure modes affected."""
+    existing = {}
+    duplicates = []
+    rows = db.session.query(FailureMode.id, FailureMode.subcomponent_category,
+                            FailureMode.description,
+                            *[getattr(FailureMode, field)
+                              for field in FIELDS]).order_by(FailureMode.id)
+    for id, category, description, *values in rows:
+        key = (category, description)
+        if key in existing:
+            duplicates.append(id)
+        else:
+            existing[key] = (id, tuple(values))
+
+    inserts = []
+    updates = []
+    unchanged = 0
+    seen = set()
+    for entry in entries:
+        key = (entry['subcomponent_category'], entry['description'])
+        if key in seen:
+            continue
+        seen.add(key)
+        values = tuple(entry[field] for field in FIELDS)
+        if key not in existing:
+            inserts.append(entry)
+        elif existing[key][1] != values:
+            update = dict(zip(FIELDS, values))
+            update['_id'] = existing[key][0]
+            updates.append(update)
+        else:
+            unchanged += 1
+
+    deletes = []
+    if delete:
+        deletes = duplicates + [id for key, (id, values) in existing.items()
+                                if key not in seen]
+    else:
+        unchanged += len(existing.keys() - seen) + len(duplicates)
+
+    bulk_insert(FailureMode.__table__, inserts)
+    if updates:
+        table = FailureMode.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('_id')).
+            values({field: bindparam(field) for field in FIELDS}),
+            updates)
+        touch(table)
+        mark_stale(FailureMode, [update['_id'] for update in updates])
+    for chunk in chunks(deletes):
+        Failure.query.filter(Failure.failure_mode_id.in_(chunk)).\
+            delete(synchronize_session=False)
+        FailureMode.query.filter(FailureMode.id.in_(chunk)).\
+            delete(synchronize_session=False)
+
+    return CatalogueChanges(len(inserts), len(updates), len(deletes),
+                            unchanged)
+
+
+class CatalogueCache(object):
+    """In-memory copy of the failure mode catalogue, grouped by sub-component
+    category."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._categories = None
+        self._stamp = None
+
+    @staticmethod
+    def _read():
+        categories = defaultdict(list)
+        rows = db.session.query(
+            FailureMode.id, FailureMode.subcomponent_category,
+            FailureMode.description,
+            *[getattr(FailureMode, field) for field in FIELDS]).\
+            order_by(FailureMode.id)
+        for row in rows:
+            categories[row[1]].append(CachedFailureMode(*row))
+        return dict(categories)
+
+    @staticmethod
+    def stamp():
+        """Return the current ``(counter, max_id, count)`` stamp of the
+        failure mode table."""
+        return tuple(db.session.query(counter(FailureMode.__table__),
+                                      func.max(FailureMode.id),
+                                      func.count(FailureMode.id)).one())
+
+    def _load(self):
+        # the stamp is read before the rows, so that a change committed in
+        # between causes a reload rather than a stale cache
+        stamp = self.stamp()
+        if touched(FailureMode.__table__):
+            return self._read()
+        with self._lock:
+            if self._categories is None or self._stamp != stamp:
+                self._categories = self._read()
+                self._stamp = stamp
+            return self._categories
+
+    @property
+    def version(self):
+        """The change counter of the committed catalogue."""
+        return self.stamp()[0] or 0
+
+    def failure_modes(self, category):
+        """Return the failure modes of a sub-component category."""
+        return self._load().get(category, [])
+
+    def by_category(self):
+        """Return a dictionary mapping each sub-component category to its
+        failure modes."""
+        return self._load()
+
+    def categories(self):
+        """Return the sorted sub-component categories of the catalogue."""
+        return sorted(category for category in self._load()
+                      if category is not None)
+
+    def consequence_descriptions(self):
+        """Return the sorted distinct consequence descriptions of the
+        catalogue."""
+        return sorted({failure_mode.consequence_description
+                       for failure_modes in self._load().values()
+                       for failure_mode in failure_modes
+                       if failure_mode.consequence_description is not None})
+
+    def invalidate(self):
+        """Drop the cached catalogue."""
+        with self._lock:
+            self._categories = None
+            self._stamp = None
+
+
+cache = CatalogueCache()
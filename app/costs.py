@@ -0,0 +1,200 @@
+"""Consequence cost resolver.
+
+The total cost of a consequence depends on its vessel trips, the vessels
+used, the equity share of the component's area and the deferred production
+cost of the facility. The resolver loads all of these for every consequence
+of a facility in one joined query and keeps the results, so rendering a page
+that shows the cost of many failures does not query the database per row.
+
+Inside a Flask application context the resolver is memoized in the ``info``
+of the database session and therefore lives for one unit of work: it is
+dropped when the transaction ends, so at the end of every request and at
+every commit of a command or job, and as soon as the session writes to one
+of the tables that costs depend on, through the ORM or Core (see
+:mod:`app.counters`). While the session holds unflushed edits to those
+tables, the memo is dropped as well and costs are resolved afresh. Batch
+jobs running outside a request can create their own :class:`CostResolver`
+and hold on to it.
+
+Costs whose inputs are missing, such as a consequence without an area or a
+replacement cost, are NaN in the dictionaries of the resolver, which feed
+the risk calculation. Reading such a cost from a consequence raises
+:class:`MissingInputError` instead.
+"""
+from collections import namedtuple
+from itertools import chain
+import math
+from flask import has_app_context
+from sqlalchemy import inspect
+from . import db
+from .counters import memo
+from .database import chunks
+from .models import Facility, Area, Component, Consequence, VesselTrip, \
+    Vessel
+
+Costs = namedtuple('Costs', ['production_impact', 'equipment_cost',
+                             'total_cost'])
+
+# models whose changes invalidate resolved costs
+COST_INPUTS = (Facility, Area, Component, Consequence, VesselTrip, Vessel)
+
+memo('cost_resolver', [model.__table__ for model in COST_INPUTS])
+
+
+class MissingInputError(ValueError):
+    """Raised when reading a cost of a consequence whose inputs are
+    missing."""
+
+
+def _costs(mttr, deferred_prod_rate, replacement_cost, deferred_prod_cost,
+           equity_share, trips):
+    """Return the :class:`Costs` of a consequence from its inputs, NaN for
+    the costs whose inputs are missing. ``trips`` is a list of
+    ``(active_repair_time, mob_time, day_rate)`` tuples."""
+    try:
+        production_impact = mttr * deferred_prod_rate * deferred_prod_cost
+    except TypeError:
+        production_impact = float('nan')
+    try:
+        equipment_cost = replacement_cost
+        for active_repair_time, mob_time, day_rate in trips:
+            equipment_cost += (active_repair_time + mob_time) * day_rate
+        equipment_cost = equity_share * equipment_cost
+    except TypeError:
+        equipment_cost = float('nan')
+    return Costs(production_impact, equipment_cost,
+                 production_impact + equipment_cost)
+
+
+def compute_costs(consequence):
+    """Return the costs of a single consequence by walking its
+    relationships."""
+    facility = consequence.facility
+    component = consequence.component
+    area = component.area if component is not None else None
+    trips = [(trip.active_repair_time,
+              trip.vessel.mob_time if trip.vessel is not None else None,
+              trip.vessel.day_rate if trip.vessel is not None else None)
+             for trip in consequence.vessel_trips]
+    return _costs(consequence.mean_time_to_repair,
+                  consequence.deferred_prod_rate,
+                  consequence.replacement_cost,
+                  facility.deferred_prod_cost if facility is not None
+                  else None,
+                  area.equity_share if area is not None else None, trips)
+
+
+class CostResolver(object):
+    """Resolves and memoizes the costs of consequences, one facility at a
+    time."""
+
+    def __init__(self):
+        self._facilities = {}
+
+    def facility(self, facility_id):
+        """Return a dictionary mapping the id of each consequence of a
+        facility to its :class:`Costs`."""
+        if facility_id not in self._facilities:
+            self._facilities[facility_id] = self._resolve(
+                Consequence.facility_id == facility_id)
+        return self._facilities[facility_id]
+
+    def costs(self, consequence):
+        """Return the :class:`Costs` of a consequence."""
+        state = inspect(consequence)
+        if consequence.facility_id is not None and state.persistent and \
+                not state.modified:
+            costs = self.facility(consequence.facility_id).get(consequence.id)
+            if costs is not None:
+                return costs
+        return compute_costs(consequence)
+
+    def total_costs(self, consequences):
+        """Return a dictionary mapping the id of each consequence selected by
+        a query to its total cost."""
+        resolved = {}
+        facility_ids = consequences.with_entities(Consequence.facility_id).\
+            distinct()
+        for facility_id, in facility_ids:
+            if facility_id is not None:
+                resolved.update(self.facility(facility_id))
+
+        ids = [id for id, in consequences.with_entities(Consequence.id)]
+        # consequences without a facility are resolved in batches
+        for chunk in chunks([id for id in ids if id not in resolved]):
+            resolved.update(self._resolve(Consequence.id.in_(chunk)))
+        return {id: resolved[id].total_cost for id in ids}
+
+    def invalidate(self):
+        """Forget all resolved costs."""
+        self._facilities.clear()
+
+    @staticmethod
+    def _resolve(criterion):
+        rows = db.session.query(Consequence.id,
+                                Consequence.mean_time_to_repair,
+                                Consequence.deferred_prod_rate,
+                                Consequence.replacement_cost,
+                                Facility.deferred_prod_cost,
+                                Area.equity_share,
+                                VesselTrip.id,
+                                VesselTrip.active_repair_time,
+                                Vessel.mob_time,
+                                Vessel.day_rate).\
+            outerjoin(Facility, Facility.id == Consequence.facility_id).\
+            outerjoin(Component, Component.id == Consequence.component_id).\
+            outerjoin(Area, Area.id == Component.area_id).\
+            outerjoin(VesselTrip, VesselTrip.consequence_id == Consequence.id).\
+            outerjoin(Vessel, Vessel.id == VesselTrip.vessel_id).\
+            filter(criterion).\
+            order_by(Consequence.id, VesselTrip.id)
+
+        consequences = {}
+        trips = {}
+        for (id, mttr, deferred_prod_rate, replacement_cost,
+             deferred_prod_cost, equity_share, trip_id, active_repair_time,
+             mob_time, day_rate) in rows:
+            if id not in consequences:
+                consequences[id] = (mttr, deferred_prod_rate, replacement_cost,
+                                    deferred_prod_cost, equity_share)
+                trips[id] = []
+            if trip_id is not None:
+                trips[id].append((active_repair_time, mob_time, day_rate))
+
+        return {id: _costs(*inputs, trips[id])
+                for id, inputs in consequences.items()}
+
+
+def get_resolver():
+    """Return the cost resolver of the current unit of work of the database
+    session, or a new resolver when called outside of an application
+    context or while the session holds unflushed edits to the inputs."""
+    if not has_app_context():
+        return CostResolver()
+    session = db.session()
+    if any(isinstance(instance, COST_INPUTS) for instance in
+           chain(session.new, session.dirty, session.deleted)):
+        # the memo may predate the edits
+        session.info.pop('cost_resolver', None)
+        return CostResolver()
+    resolver = session.info.get('cost_resolver')
+    if resolver is None:
+        resolver = session.info['cost_resolver'] = CostResolver()
+    return resolver
+
+
+def cost(consequence, name):
+    """Return one of the :class:`Costs` of a consequence by name. Raises
+    :class:`MissingInputError` if its inputs are incomplete."""
+    value = getattr(get_resolver().costs(consequence), name)
+    if math.isnan(value):
+        raise MissingInputError('Consequence {} is missing inputs of its {}'.
+                                format(consequence.id,
+                                       name.replace('_', ' ')))
+    return value
+
+
+def invalidate():
+    """Forget the costs memoized in the current unit of work."""
+    if has_app_context():
+        db.session().info.pop('cost_resolver', None)
@@ -0,0 +1,106 @@
+"""Per-table change counters.
+
+Every transaction of the database session that writes to a table increments
+the counter of that table in the ``change_counters`` table when it commits,
+so that caches in any process can tell whether a table changed since they
+read it with a single primary key lookup. Every table has its row from the
+start, inserted by the migration or when the tables are created, so that
+commits only ever update counters and concurrent first writers do not race
+to insert them; the migration that adds a table seeds its counter too.
+
+Writes through the ORM, including bulk updates and deletes, are recorded by
+session events. Core statements bypass them: :func:`touch` records the table
+that they write to, which :func:`~app.generation.bulk_insert` does for every
+insert.
+
+The same records keep memos of a unit of work, such as the resolved costs of
+:mod:`app.costs`, in line with the session: a memo registered with
+:func:`memo` is dropped whenever the session writes to a table that it
+depends on, and when its transaction ends.
+
+The counters are incremented by the last ``before_commit`` hook, after the
+one of :mod:`app.rollups`, so that the writes of the roll-up refresh are
+counted as well.
+"""
+import logging
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from . import db
+from .models import ChangeCounter
+
+# keys of the memos kept in the info of sessions, with the names of the
+# tables that they depend on
+MEMOS = {}
+
+
+def memo(key, tables):
+    """Register a memo kept under ``key`` in the ``info`` dictionary of
+    sessions, to be dropped when they write to one of the given tables."""
+    MEMOS[key] = {table.name for table in tables}
+
+
+def touch(table, session=None):
+    """Record that the current transaction of a session, by default the
+    database session, writes to a table."""
+    session = session or db.session()
+    session.info.setdefault('counters', set()).add(table.name)
+    for key, names in MEMOS.items():
+        if table.name in names:
+            session.info.pop(key, None)
+
+
+def touched(table, session=None):
+    """Return true if the current transaction of a session writes to a
+    table, so that its committed rows are not the ones that it sees."""
+    session = session or db.session()
+    return table.name in session.info.get('counters', ())
+
+
+def counter(table):
+    """Return a scalar clause selecting the change counter of a table."""
+    return select([ChangeCounter.counter]).\
+        where(ChangeCounter.table_name == table.name).as_scalar()
+
+
+@event.listens_for(ChangeCounter.__table__, 'after_create')
+def _seed(table, connection, **kwargs):
+    connection.execute(table.insert(),
+                       [{'table_name': name, 'counter': 0}
+                        for name in sorted(table.metadata.tables)
+                        if name != table.name])
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    for instance in set(session.new) | set(session.dirty) | \
+            set(session.deleted):
+        touch(type(instance).__table__, session)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def _after_bulk(context):
+    touch(context.mapper.local_table, context.session)
+
+
+@event.listens_for(Session, 'before_commit')
+def _before_commit(session):
+    if session is not db.session():
+        return
+    session.flush()
+    counters = ChangeCounter.__table__
+    # in name order, so that concurrent transactions lock them in turn
+    for name in sorted(session.info.pop('counters', ())):
+        updated = session.execute(
+            counters.update().where(counters.c.table_name == name).
+            values(counter=counters.c.counter + 1))
+        if not updated.rowcount:
+            logging.warning('No change counter for table %s', name)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _after_transaction(session):
+    session.info.pop('counters', None)
+    for key in MEMOS:
+        session.info.pop(key, None)
@@ -0,0 +1,69 @@
+"""Database engine tuning.
+
+Server databases are given a connection pool sized by the ``DATABASE_POOL_*``
+settings, passed to the engine in ``SQLALCHEMY_ENGINE_OPTIONS``. SQLite databases are opened without a pool, as by
+Flask-SQLAlchemy, and every new connection is configured with the
+``SQLITE_PRAGMAS`` setting, which by default switches to write-ahead logging
+so that readers no longer block the writer and vice versa.
+
+Statements that select rows by id bind at most :data:`CHUNK_SIZE` ids at a
+time, see :func:`chunks`.
+"""
+import functools
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from . import db
+
+# engine options and the settings they are taken from
+POOL_SETTINGS = {
+    'pool_size': 'DATABASE_POOL_SIZE',
+    'max_overflow': 'DATABASE_MAX_OVERFLOW',
+    'pool_recycle': 'DATABASE_POOL_RECYCLE',
+    'pool_timeout': 'DATABASE_POOL_TIMEOUT',
+}
+
+# largest number of ids bound in a single IN clause
+CHUNK_SIZE = 500
+
+
+def chunks(ids, size=CHUNK_SIZE):
+    """Split a collection of ids into lists of at most ``size`` ids."""
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def is_sqlite(uri):
+    return make_url(uri).drivername.startswith('sqlite')
+
+
+def configure_pool(app):
+    """Apply the pool settings to server databases. Must be called before
+    the engine is created. Engine options set explicitly are kept."""
+    if is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    for option, source in POOL_SETTINGS.items():
+        if app.config.get(source) is not None:
+            options.setdefault(option, app.config[source])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def apply_pragmas(pragmas, dbapi_connection, connection_record=None):
+    """Run ``PRAGMA`` statements on a new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+    finally:
+        cursor.close()
+
+
+def configure_engine(app):
+    """Apply the SQLite pragmas to the connections of the engine of an
+    application."""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas or not is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    event.listen(db.get_engine(app), 'connect',
+                 functools.partial(apply_pragmas, tuple(pragmas)))
@@ -1,15 +1,44 @@
 import functools
-from flask import jsonify
+from flask import current_app, request
+from ..serialization import json_response
+
+
+def resource_etag(model):
+    """Return the entity tag of a versioned database model, or ``None``."""
+    version = getattr(model, 'version', None)
+    if version is None:
+        return None
+    return '{}-{}-{}'.format(model.__tablename__, model.id, version)
+
+
+def not_modified(etag, weak=False):
+    """Return a 304 response if the request's ``If-None-Match`` header
+    matches an entity tag, or ``None`` otherwise."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    rv = current_app.response_class(status=304)
+    rv.set_etag(etag, weak=weak)
+    return rv
 
 
 def json(f):
     """Generate a JSON response from a database model or a Python
-    dictionary."""
+    dictionary.
+
+    The response is encoded by the encoder selected with the
+    ``JSON_ENCODER`` setting, see :mod:`app.serialization`. Responses for
+    versioned models carry a strong ``ETag`` and requests
+    that already hold the current version get a 304 response, without the
+    model being serialized."""
     @functools.wraps(f)
     def wrapped(*args, **kwargs):
         # invoke the wrapped function
         rv = f(*args, **kwargs)
 
+        # responses, such as a 304 from the paginate decorator, are final
+        if isinstance(rv, current_app.response_class):
+            return rv
+
         # the wrapped function can return the dictionary alone,
         # or can also include a status code and/or headers.
         # all these items are separated here.
@@ -22,14 +51,22 @@ def json(f):
 
         # if the response was a database model, then convert it to a
         # dictionary
+        etag = None
         if not isinstance(rv, dict):
+            if request.method in ('GET', 'HEAD'):
+                etag = resource_etag(rv)
+                response = not_modified(etag)
+                if response is not None:
+                    return response
             rv = rv.export_data()
 
         # generate the JSON response
-        rv = jsonify(rv)
+        rv = json_response(rv)
         if status is not None:
             rv.status_code = status
         if headers is not None:
             rv.headers.extend(headers)
+        if etag is not None:
+            rv.set_etag(etag)
         return rv
     return wrapped
@@ -1,15 +1,38 @@
 import functools
-from flask import url_for, request
+from flask import current_app, url_for, request
+from sqlalchemy.orm import joinedload
+from sqlalchemy.sql.util import find_tables
+from werkzeug.http import quote_etag
+from .. import db
+from ..models import ChangeCounter
+from .json import not_modified
 
 
-def paginate(collection, max_per_page=25):
+def paginate(collection, max_per_page=25, eager=()):
     """Generate a paginated response for a resource collection.
 
     Routes that use this decorator must return a SQLAlchemy query as a
     response.
 
+    Collections are paginated by page number by default. With ``?after=<id>``
+    they are paginated by id instead: each page holds the items with an id
+    greater than ``after`` and links to the next page through the last id,
+    so deep pages cost the same as the first one. The total is only counted
+    in this mode when ``?count=1`` is given, and up to
+    ``API_KEYSET_MAX_PER_PAGE`` items can be requested per page.
+
+    ``eager`` names the relationships of the items that their
+    ``export_data`` uses. They are loaded with the items when an expanded
+    collection is requested, instead of once per item.
+
+    Pages carry a weak ``ETag`` made of the change counters of the tables
+    that the collection query reads (see :mod:`app.counters`), and requests
+    that hold the current tag get a 304 response without the page being
+    loaded. Pages by id are left untagged to keep them free of counts.
+
     The output of this decorator is a Python dictionary with the paginated
-    results. The application must ensure that this result is converted to a
+    results, together with the response headers, or a 304 response. The
+    application must ensure that this result is converted to a
     response object, either by chaining another decorator or by using a
     custom response object that accepts dictionaries."""
     def decorator(f):
@@ -23,8 +46,26 @@ def paginate(collection, max_per_page=25):
             per_page = min(request.args.get('per_page', max_per_page,
                                             type=int), max_per_page)
             expanded = None
+            unloaded = query
             if request.args.get('expanded', 0, type=int) != 0:
                 expanded = 1
+                model = query.column_descriptions[0]['entity']
+                query = query.options(*[joinedload(getattr(model, name))
+                                        for name in eager])
+
+            after = request.args.get('after', None, type=int)
+            if after is not None:
+                return _paginate_keyset(collection, query, after, expanded,
+                                        kwargs)
+
+            # answer conditional requests before loading the page
+            etag = collection_etag(unloaded)
+            response = not_modified(etag, weak=True)
+            if response is not None:
+                return response
+            headers = {}
+            if etag is not None:
+                headers['ETag'] = quote_etag(etag, weak=True)
 
             # run the query with Flask-SQLAlchemy's pagination
             p = query.paginate(page, per_page)
@@ -60,6 +101,49 @@ def paginate(collection, max_per_page=25):
                 results = [item.get_url() for item in p.items]
 
             # return a dictionary as a response
-            return {collection: results, 'pages': pages}
+            return {collection: results, 'pages': pages}, headers
         return wrapped
     return decorator
+
+
+def collection_etag(query):
+    """Return the entity tag of a query, from the change counters of the
+    tables that it reads."""
+    model = query.column_descriptions[0]['entity']
+    names = sorted({table.name for table in find_tables(
+        query.statement, check_columns=True, include_joins=True)})
+    counters = dict(db.session.query(ChangeCounter.table_name,
+                                     ChangeCounter.counter).
+                    filter(ChangeCounter.table_name.in_(names)))
+    return '-'.join([model.__tablename__] +
+                    [str(counters.get(name, 0)) for name in names])
+
+
+def _paginate_keyset(collection, query, after, expanded, kwargs):
+    """Paginate a query by id, starting after the given id."""
+    limit = current_app.config.get('API_KEYSET_MAX_PER_PAGE', 1000)
+    per_page = max(min(request.args.get('per_page', limit, type=int), limit),
+                   1)
+    model = query.column_descriptions[0]['entity']
+
+    # fetch one extra item to find out whether there is a next page
+    items = query.filter(model.id > after).order_by(None).\
+        order_by(model.id).limit(per_page + 1).all()
+    has_next = len(items) > per_page
+    items = items[:per_page]
+
+    pages = {'after': after, 'per_page': per_page}
+    if request.args.get('count', 0, type=int) != 0:
+        pages['total'] = query.order_by(None).count()
+    if has_next:
+        pages['next_url'] = url_for(request.endpoint, after=items[-1].id,
+                                    per_page=per_page, expanded=expanded,
+                                    _external=True, **kwargs)
+    else:
+        pages['next_url'] = None
+
+    if expanded:
+        results = [item.export_data() for item in items]
+    else:
+        results = [item.get_url() for item in items]
+    return {collection: results, 'pages': pages}
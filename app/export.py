@@ -0,0 +1,99 @@
+"""Streaming export of a facility.
+
+:func:`export_facility` yields the facility, its areas, components,
+sub-components and failures as one dictionary per record, each tagged with
+its ``type`` and the id of its parent. Every level is read with a single
+query whose rows are fetched in batches, so exporting a facility takes
+memory for one batch only, whatever its size. Failures carry their
+probability, total cost and risk from the materialized failure risks of
+:mod:`app.rollups`.
+"""
+import math
+from . import db
+from .models import Facility, Area, Component, SubComponent, Consequence, \
+    FailureMode, Failure, FailureRisk
+from .rollups import pending_risks
+from .serialization import get_encoder
+
+# number of rows fetched from the database at a time
+YIELD_PER = 1000
+
+
+def _records(type, query, fields):
+    for row in query.yield_per(YIELD_PER):
+        record = {'type': type}
+        for field, value in zip(fields, row):
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            record[field] = value
+        yield record
+
+
+def export_facility(facility_id):
+    """Yield the records of a facility and its hierarchy, parents first."""
+    pending = pending_risks()
+    fresh = pending.fresh if pending is not None else {}
+    yield from _records(
+        'facility',
+        db.session.query(Facility.id, Facility.name, Facility.remaining_life,
+                         Facility.deferred_prod_cost, Facility.risk_cut_off).
+        filter(Facility.id == facility_id),
+        ('id', 'name', 'remaining_life', 'deferred_prod_cost',
+         'risk_cut_off'))
+
+    areas = db.session.query(Area.id).filter(Area.facility_id == facility_id)
+    yield from _records(
+        'area',
+        db.session.query(Area.id, Area.facility_id, Area.name,
+                         Area.equity_share).
+        filter(Area.facility_id == facility_id).order_by(Area.id),
+        ('id', 'facility_id', 'name', 'equity_share'))
+
+    components = db.session.query(Component.id).\
+        filter(Component.area_id.in_(areas))
+    yield from _records(
+        'component',
+        db.session.query(Component.id, Component.area_id, Component.ident,
+                         Component.category, Component.service_type).
+        filter(Component.area_id.in_(areas)).order_by(Component.id),
+        ('id', 'area_id', 'ident', 'category', 'service_type'))
+
+    subcomponents = db.session.query(SubComponent.id).\
+        filter(SubComponent.component_id.in_(components))
+    yield from _records(
+        'subcomponent',
+        db.session.query(SubComponent.id, SubComponent.component_id,
+                         SubComponent.ident, SubComponent.category).
+        filter(SubComponent.component_id.in_(components)).
+        order_by(SubComponent.id),
+        ('id', 'component_id', 'ident', 'category'))
+
+    for record in _records(
+        'failure',
+        db.session.query(Failure.id, Failure.subcomponent_id,
+                         Failure.fmeca_id, Failure.rbi_id,
+                         Failure.failure_mode_id, FailureMode.description,
+                         Failure.consequence_id, Consequence.name,
+                         FailureRisk.probability, FailureRisk.total_cost,
+                         FailureRisk.risk).
+        outerjoin(FailureMode, FailureMode.id == Failure.failure_mode_id).
+        outerjoin(Consequence, Consequence.id == Failure.consequence_id).
+        outerjoin(FailureRisk, FailureRisk.failure_id == Failure.id).
+        filter(Failure.subcomponent_id.in_(subcomponents)).
+        order_by(Failure.id),
+        ('id', 'subcomponent_id', 'fmeca_id', 'rbi_id', 'failure_mode_id',
+         'failure_mode', 'consequence_id', 'consequence', 'probability',
+         'total_cost', 'risk')):
+        row = fresh.get(record['id'])
+        if row is not None:
+            for field in ('probability', 'total_cost', 'risk'):
+                record[field] = row[field]
+        yield record
+
+
+def ndjson(records, encoder=None):
+    """Yield the records as lines of newline delimited JSON, encoded with
+    the configured encoder unless another one is given."""
+    dumps = encoder or get_encoder()
+    for record in records:
+        yield dumps(record) + b'\n'
@@ -0,0 +1,244 @@
+"""FMECA generation engine.
+
+An FMECA holds one failure for every failure mode in the catalogue that
+applies to the category of one of the component's sub-components. Each
+failure is linked to the component consequence named by its failure mode.
+
+The engine preloads the catalogue, the sub-components and the consequences
+with a fixed number of queries and writes the failures with bulk inserts,
+so the cost of generation does not grow with the number of round trips.
+
+Existing FMECAs are brought up to date by :func:`update`, which compares
+the failures they should have with the ones they have and only writes the
+difference, leaving the RBI assignments of the failures it keeps alone.
+"""
+import logging
+from collections import defaultdict, deque, namedtuple
+from sqlalchemy import func, select
+from . import db
+from .counters import touch
+from .database import CHUNK_SIZE, chunks
+from .models import Area, Component, SubComponent, Consequence, FMECA, \
+    RBI, Failure
+
+# number of rows sent to the database in a single INSERT statement
+BATCH_SIZE = 5000
+
+FailureChanges = namedtuple('FailureChanges', ['inserted', 'deleted',
+                                               'repointed', 'unchanged'])
+
+
+def load_catalogue():
+    """Return the failure mode catalogue as a dictionary that maps each
+    sub-component category to a list of
+    ``(failure_mode_id, consequence_description)`` tuples.
+
+    The catalogue is read from the in-memory cache of
+    :mod:`app.catalogue`."""
+    from .catalogue import cache
+    catalogue = defaultdict(list)
+    for category, failure_modes in cache.by_category().items():
+        catalogue[category] = [(failure_mode.id,
+                                failure_mode.consequence_description)
+                               for failure_mode in failure_modes]
+    return catalogue
+
+
+def bulk_insert(table, rows, batch_size=BATCH_SIZE):
+    """Insert a list of row dictionaries into a table in batches."""
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+    if rows:
+        touch(table)
+    if table is Failure.__table__ and rows:
+        # core inserts bypass the flush, so tell the roll-ups directly
+        from .rollups import changes
+        changes().fmeca_ids.update(row.get('fmeca_id') for row in rows)
+
+
+def bulk_insert_ids(table, rows, key, batch_size=BATCH_SIZE):
+    """Insert a list of row dictionaries like :func:`bulk_insert` and set
+    the ``id`` of each row.
+
+    The ids are read back with a single SELECT of the rows inserted since
+    the largest id before the insert, matched on the columns named by
+    ``key``, instead of running one INSERT per row to learn its id. The key
+    should be a natural key of the table, such as a parent id and a name:
+    its values are compared in Python, which suits integers and strings but
+    not floats. Rows with the same key get their ids in order."""
+    if not rows:
+        return
+    before = db.session.execute(select([func.max(table.c.id)])).scalar()
+    bulk_insert(table, rows, batch_size)
+
+    waiting = defaultdict(deque)
+    for row in rows:
+        waiting[tuple(row[column] for column in key)].append(row)
+    columns = [table.c[column] for column in key]
+    query = select([table.c.id] + columns).order_by(table.c.id)
+    if before is not None:
+        query = query.where(table.c.id > before)
+    # the first key column is usually an indexed parent id
+    values = {row[key[0]] for row in rows}
+    if None not in values and len(values) <= CHUNK_SIZE:
+        query = query.where(columns[0].in_(values))
+    for id, *values in db.session.execute(query):
+        queue = waiting.get(tuple(values))
+        if queue:
+            queue.popleft()['id'] = id
+
+
+def build_failures(fmeca_ids, scope, catalogue=None):
+    """Return the failure rows for a set of components.
+
+    ``fmeca_ids`` maps the id of each component to generate to the id of
+    the FMECA that its failures belong to. ``scope`` is a query selecting
+    the ids of those components (or of a superset of them)."""
+    if catalogue is None:
+        catalogue = load_catalogue()
+
+    # the first consequence of each name wins, as in a filter_by().first()
+    consequences = {}
+    rows = db.session.query(Consequence.id, Consequence.component_id,
+                            Consequence.name).\
+        filter(Consequence.component_id.in_(scope)).\
+        order_by(Consequence.id.desc())
+    for id, component_id, name in rows:
+        consequences[(component_id, name)] = id
+
+    failures = []
+    missing = set()
+    rows = db.session.query(SubComponent.id, SubComponent.component_id,
+                            SubComponent.category).\
+        filter(SubComponent.component_id.in_(scope)).\
+        order_by(SubComponent.id)
+    for subcomponent_id, component_id, category in rows:
+        if component_id not in fmeca_ids:
+            continue
+        for failure_mode_id, consequence_description in catalogue[category]:
+            consequence_id = consequences.get(
+                (component_id, consequence_description))
+            if consequence_id is None and component_id not in missing:
+                missing.add(component_id)
+                logging.info('No consequences found for component %s',
+                             component_id)
+            failures.append({'fmeca_id': fmeca_ids[component_id],
+                             'subcomponent_id': subcomponent_id,
+                             'failure_mode_id': failure_mode_id,
+                             'consequence_id': consequence_id})
+    return failures
+
+
+def generate(fmeca, catalogue=None):
+    """Create the failures of a single FMECA.
+
+    The FMECA is added to the session and flushed so that its failures can
+    be inserted in bulk. Returns the number of failures created."""
+    db.session.add(fmeca)
+    db.session.flush()
+    scope = db.session.query(Component.id).\
+        filter(Component.id == fmeca.component_id)
+    failures = build_failures({fmeca.component_id: fmeca.id}, scope,
+                              catalogue)
+    bulk_insert(Failure.__table__, failures)
+    return len(failures)
+
+
+def generate_facility(facility, replace=False, catalogue=None):
+    """Create the FMECAs of every component of a facility in one pass.
+
+    Components that already have an FMECA are left alone unless
+    ``replace`` is set, in which case their failures are brought up to date
+    by :func:`update_failures`, which keeps the failures still wanted and
+    their RBIs. Returns a ``(fmecas, failures)`` tuple with the number of
+    FMECAs and failures created."""
+    scope = db.session.query(Component.id).join(Area).\
+        filter(Area.facility_id == facility.id)
+    fmecas = db.session.query(FMECA.component_id, FMECA.id).\
+        filter(FMECA.component_id.in_(scope))
+
+    existing = dict(fmecas)
+    new = [{'component_id': id} for id, in scope if id not in existing]
+    bulk_insert(FMECA.__table__, new)
+
+    fmeca_ids = {component_id: id for component_id, id in fmecas
+                 if component_id not in existing}
+    failures = build_failures(fmeca_ids, scope, catalogue)
+    bulk_insert(Failure.__table__, failures)
+    created = len(failures)
+
+    if replace and existing:
+        created += update_failures(existing, scope, catalogue).inserted
+    return len(new), created
+
+
+def update_failures(fmeca_ids, scope, catalogue=None):
+    """Bring the failures of a set of existing FMECAs up to date.
+
+    Takes the same arguments as :func:`build_failures`. Missing failures are
+    inserted and assigned to the existing RBIs of their FMECA, obsolete ones
+    are deleted and the failures whose consequence changed are re-pointed.
+    The other failures, and their RBIs, are not touched. Returns the
+    :class:`FailureChanges`."""
+    from .rbi import assign
+    from .rollups import changes, mark_stale
+
+    wanted = {}
+    for row in build_failures(fmeca_ids, scope, catalogue):
+        key = (row['fmeca_id'], row['subcomponent_id'],
+               row['failure_mode_id'])
+        wanted.setdefault(key, row)
+
+    obsolete = []
+    repoint = defaultdict(list)
+    unchanged = 0
+    rows = db.session.query(Failure.id, Failure.fmeca_id,
+                            Failure.subcomponent_id, Failure.failure_mode_id,
+                            Failure.consequence_id).\
+        filter(Failure.fmeca_id.in_(list(fmeca_ids.values()))).\
+        order_by(Failure.id)
+    for id, fmeca_id, subcomponent_id, failure_mode_id, consequence_id \
+            in rows:
+        row = wanted.pop((fmeca_id, subcomponent_id, failure_mode_id), None)
+        if row is None:
+            # no longer wanted, or a duplicate of a failure already kept
+            obsolete.append(id)
+        elif row['consequence_id'] != consequence_id:
+            repoint[row['consequence_id']].append(id)
+        else:
+            unchanged += 1
+
+    failures = Failure.__table__
+    for chunk in chunks(obsolete):
+        db.session.execute(failures.delete().
+                           where(failures.c.id.in_(chunk)))
+    changes().orphan_ids.update(obsolete)
+    if obsolete or repoint:
+        touch(failures)
+    for consequence_id, ids in repoint.items():
+        for chunk in chunks(ids):
+            db.session.execute(failures.update().
+                               where(failures.c.id.in_(chunk)).
+                               values(consequence_id=consequence_id))
+        mark_stale(Failure, ids)
+
+    new = list(wanted.values())
+    bulk_insert(failures, new)
+    if new:
+        ids = list(fmeca_ids.values())
+        types = [type for type, in db.session.query(RBI.inspection_type).
+                 filter(RBI.fmeca_id.in_(ids)).distinct()]
+        if types:
+            assign(ids, types, unassigned=True)
+
+    return FailureChanges(len(new), len(obsolete),
+                          sum(len(ids) for ids in repoint.values()),
+                          unchanged)
+
+
+def update(fmeca, catalogue=None):
+    """Bring the failures of a single existing FMECA up to date, see
+    :func:`update_failures`."""
+    scope = db.session.query(Component.id).\
+        filter(Component.id == fmeca.component_id)
+    return update_failures({fmeca.component_id: fmeca.id}, scope, catalogue)
@@ -0,0 +1,242 @@
+"""Bulk CSV import pipeline.
+
+Imports the vessels of a facility and the consequences and sub-components
+of its components from the CSV formats found in ``inputs/``. Files are read
+as a stream, each row is validated, and valid rows are written with bulk
+inserts in batches. Vessels and components are resolved by name through an
+in-memory index built once per facility, so the cost of an import grows
+linearly with the number of rows.
+
+Invalid rows are skipped and reported with their line number.
+"""
+import csv
+import time
+from . import db
+from .models import Area, Component, SubComponent, Consequence, VesselTrip, \
+    Vessel
+from .generation import bulk_insert, bulk_insert_ids
+from .costs import invalidate
+
+# number of rows written per batch
+BATCH_SIZE = 1000
+
+
+def normalize(name):
+    """Return a name with surrounding and repeated whitespace removed, for
+    case insensitive lookups."""
+    return ' '.join(name.split()).lower()
+
+
+class NameIndex(object):
+    """Maps names to ids, ignoring case and whitespace differences."""
+
+    def __init__(self, rows=()):
+        self._ids = {}
+        for id, name in rows:
+            self.add(name, id)
+
+    def __contains__(self, name):
+        return normalize(name) in self._ids
+
+    def add(self, name, id):
+        self._ids.setdefault(normalize(name), id)
+
+    def get(self, name):
+        return self._ids.get(normalize(name))
+
+
+def vessel_index(facility_id):
+    """Return an index of the vessels of a facility by name."""
+    return NameIndex(db.session.query(Vessel.id, Vessel.name).
+                     filter(Vessel.facility_id == facility_id).
+                     order_by(Vessel.id))
+
+
+def component_index(facility_id):
+    """Return an index of the components of a facility by ident."""
+    return NameIndex(db.session.query(Component.id, Component.ident).
+                     join(Area).filter(Area.facility_id == facility_id).
+                     order_by(Component.id))
+
+
+class ImportReport(object):
+    """Counts the rows read, written and rejected by an import."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = time.time()
+        self.finished = None
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    def finish(self):
+        self.finished = time.time()
+        invalidate()
+        return self
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else float(self.rows)
+
+    def __str__(self):
+        return '{}: {} rows, {} inserted, {} skipped, {} errors ' \
+            '({:,.0f} rows/sec)'.format(self.name, self.rows, self.inserted,
+                                        self.skipped, len(self.errors),
+                                        self.rows_per_sec)
+
+
+def parse(row, columns):
+    """Convert the cells of a CSV row.
+
+    ``columns`` is a list of ``(index, field, type)`` tuples. Returns a
+    dictionary of converted values, or raises ``ValueError`` naming the
+    first invalid field."""
+    values = {}
+    for index, field, type in columns:
+        try:
+            value = row[index].strip()
+            if not value:
+                raise ValueError
+            values[field] = type(value)
+        except (IndexError, ValueError):
+            raise ValueError('invalid ' + field)
+    return values
+
+
+def _stream(lines, report):
+    for line, row in enumerate(csv.reader(lines), 1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        report.rows += 1
+        yield line, row
+
+
+def _flush(table, batch, report):
+    bulk_insert(table, batch)
+    report.inserted += len(batch)
+    del batch[:]
+
+
+VESSEL_COLUMNS = [(0, 'name', str), (1, 'abbr', str), (2, 'day_rate', int),
+                  (3, 'mob_time', float)]
+
+
+def import_vessels(facility_id, lines, batch_size=BATCH_SIZE):
+    """Import vessels from ``name,abbr,day_rate,mob_time`` rows.
+
+    Vessels whose name is already used in the facility are skipped."""
+    report = ImportReport('vessels')
+    index = vessel_index(facility_id)
+    batch = []
+    for line, row in _stream(lines, report):
+        try:
+            vessel = parse(row, VESSEL_COLUMNS)
+        except ValueError as e:
+            report.error(line, e.args[0])
+            continue
+        if vessel['name'] in index:
+            report.skipped += 1
+            continue
+        index.add(vessel['name'], None)
+        vessel['facility_id'] = facility_id
+        batch.append(vessel)
+        if len(batch) >= batch_size:
+            _flush(Vessel.__table__, batch, report)
+    _flush(Vessel.__table__, batch, report)
+    return report.finish()
+
+
+CONSEQUENCE_COLUMNS = [(0, 'name', str), (10, 'mean_time_to_repair', float),
+                       (11, 'replacement_cost', int),
+                       (13, 'deferred_prod_rate', float)]
+VESSEL_TRIP_COLUMNS = [((2, 'vessel', str), (5, 'active_repair_time', float)),
+                       ((6, 'vessel', str), (9, 'active_repair_time', float))]
+
+
+def import_consequences(facility_id, component_id, lines,
+                        batch_size=BATCH_SIZE):
+    """Import the consequences of a component, each with two vessel trips,
+    from rows in the format of ``inputs/consequences.csv``."""
+    report = ImportReport('consequences')
+    vessels = vessel_index(facility_id)
+    batch = []
+    trips = []
+
+    def flush():
+        # the ids of the consequences are needed to insert their trips
+        bulk_insert_ids(Consequence.__table__, batch,
+                        ('component_id', 'name'))
+        for consequence, consequence_trips in zip(batch, trips):
+            for trip in consequence_trips:
+                trip['consequence_id'] = consequence['id']
+        bulk_insert(VesselTrip.__table__,
+                    [trip for consequence_trips in trips
+                     for trip in consequence_trips])
+        report.inserted += len(batch)
+        del batch[:]
+        del trips[:]
+
+    for line, row in _stream(lines, report):
+        try:
+            consequence = parse(row, CONSEQUENCE_COLUMNS)
+            consequence_trips = []
+            for columns in VESSEL_TRIP_COLUMNS:
+                trip = parse(row, columns)
+                vessel_id = vessels.get(trip.pop('vessel'))
+                if vessel_id is None:
+                    raise ValueError('unknown vessel ' + row[columns[0][0]])
+                trip['vessel_id'] = vessel_id
+                consequence_trips.append(trip)
+        except ValueError as e:
+            report.error(line, e.args[0])
+            continue
+        consequence.update(facility_id=facility_id, component_id=component_id)
+        batch.append(consequence)
+        trips.append(consequence_trips)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report.finish()
+
+
+def import_subcomponents(facility_id, component_id, lines,
+                         batch_size=BATCH_SIZE):
+    """Import sub-components from ``category,ident[,component]`` rows.
+
+    The optional third column names the component by ident and defaults to
+    ``component_id``, so a single file can hold the sub-components of a whole
+    facility."""
+    report = ImportReport('subcomponents')
+    components = component_index(facility_id)
+    batch = []
+    for line, row in _stream(lines, report):
+        category = row[0].strip()
+        if not category:
+            report.error(line, 'invalid category')
+            continue
+        subcomponent = {'category': category,
+                        'ident': row[1].strip() if len(row) > 1 else '',
+                        'component_id': component_id}
+        if len(row) > 2 and row[2].strip():
+            subcomponent['component_id'] = components.get(row[2])
+            if subcomponent['component_id'] is None:
+                report.error(line, 'unknown component ' + row[2])
+                continue
+        if subcomponent['component_id'] is None:
+            report.error(line, 'missing component')
+            continue
+        batch.append(subcomponent)
+        if len(batch) >= batch_size:
+            _flush(SubComponent.__table__, batch, report)
+    _flush(SubComponent.__table__, batch, report)
+    return report.finish()
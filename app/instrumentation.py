@@ -0,0 +1,187 @@
+"""Request instrumentation.
+
+When ``INSTRUMENTATION`` is enabled in the configuration, every request
+records the number of SQL statements it executed, the time spent in SQL,
+the time spent rendering templates and its total latency. The numbers are
+returned in the ``Server-Timing`` and ``X-Query-Count`` response headers,
+aggregated per endpoint at ``/api/_metrics``, with the requests that match
+no endpoint under :data:`UNMATCHED`, and requests that exceed
+``INSTRUMENTATION_BUDGET_MS`` or ``INSTRUMENTATION_QUERY_BUDGET`` are logged
+as warnings.
+"""
+import logging
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# endpoint name of the requests that match no route, so that requests for
+# arbitrary URLs do not add an entry each
+UNMATCHED = '<unmatched>'
+
+
+class RequestMetrics(object):
+    """Measurements of a single request."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.total_time = None
+        self._rendering = 0
+
+    def finish(self):
+        self.total_time = time.time() - self.started
+        return self
+
+    def server_timing(self):
+        """Return the value of the ``Server-Timing`` header, in
+        milliseconds."""
+        return 'sql;dur={:.1f};desc="{} queries", render;dur={:.1f}, ' \
+            'total;dur={:.1f}'.format(self.sql_time * 1000, self.queries,
+                                      self.render_time * 1000,
+                                      self.total_time * 1000)
+
+
+class EndpointMetrics(object):
+    """Aggregated measurements of the requests to an endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.over_budget = 0
+
+    def add(self, metrics, over_budget):
+        self.requests += 1
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.sql_time += metrics.sql_time
+        self.render_time += metrics.render_time
+        self.total_time += metrics.total_time
+        self.max_time = max(self.max_time, metrics.total_time)
+        self.over_budget += over_budget
+
+    def export_data(self):
+        return {
+            'requests': self.requests,
+            'queries': self.queries,
+            'mean_queries': self.queries / self.requests,
+            'max_queries': self.max_queries,
+            'mean_sql_ms': self.sql_time / self.requests * 1000,
+            'mean_render_ms': self.render_time / self.requests * 1000,
+            'mean_total_ms': self.total_time / self.requests * 1000,
+            'max_total_ms': self.max_time * 1000,
+            'over_budget': self.over_budget,
+        }
+
+
+def current_metrics():
+    """Return the metrics of the current request, or ``None`` when the
+    request is not instrumented."""
+    if not has_request_context():
+        return None
+    return getattr(g, 'request_metrics', None)
+
+
+class TimedTemplate(Template):
+    """Template that adds its rendering time to the request metrics."""
+
+    def render(self, *args, **kwargs):
+        metrics = current_metrics()
+        if metrics is None:
+            return super(TimedTemplate, self).render(*args, **kwargs)
+        metrics._rendering += 1
+        started = time.time()
+        try:
+            return super(TimedTemplate, self).render(*args, **kwargs)
+        finally:
+            metrics._rendering -= 1
+            # only the outermost template counts, as it includes the others
+            if not metrics._rendering:
+                metrics.render_time += time.time() - started
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if current_metrics() is not None:
+        conn.info.setdefault('query_started', []).append(time.time())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    metrics = current_metrics()
+    started = conn.info.get('query_started')
+    if metrics is not None and started:
+        metrics.queries += 1
+        metrics.sql_time += time.time() - started.pop()
+
+
+class Instrumentation(object):
+    """Flask extension collecting request metrics."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('INSTRUMENTATION', False)
+        app.config.setdefault('INSTRUMENTATION_BUDGET_MS', 500)
+        app.config.setdefault('INSTRUMENTATION_QUERY_BUDGET', 50)
+        app.extensions['instrumentation'] = self
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        if current_app.config['INSTRUMENTATION']:
+            g.request_metrics = RequestMetrics()
+
+    def _after_request(self, response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        metrics.finish()
+        response.headers['Server-Timing'] = metrics.server_timing()
+        response.headers['X-Query-Count'] = str(metrics.queries)
+
+        config = current_app.config
+        budget = config['INSTRUMENTATION_BUDGET_MS'] / 1000
+        over_budget = metrics.total_time > budget or \
+            metrics.queries > config['INSTRUMENTATION_QUERY_BUDGET']
+        if over_budget:
+            logger.warning(
+                '%s %s over budget: %d queries, %.1f ms SQL, %.1f ms render, '
+                '%.1f ms total', request.method, request.path,
+                metrics.queries, metrics.sql_time * 1000,
+                metrics.render_time * 1000, metrics.total_time * 1000)
+
+        endpoint = request.endpoint or UNMATCHED
+        with self._lock:
+            self.endpoints.setdefault(endpoint, EndpointMetrics()).add(
+                metrics, over_budget)
+        return response
+
+    def export_data(self):
+        """Return the aggregated metrics of every endpoint."""
+        with self._lock:
+            return {endpoint: metrics.export_data()
+                    for endpoint, metrics in sorted(self.endpoints.items())}
+
+    def reset(self):
+        """Forget the aggregated metrics."""
+        with self._lock:
+            self.endpoints.clear()
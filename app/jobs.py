@@ -0,0 +1,341 @@
+"""Background jobs.
+
+Long running operations, such as generating the FMECAs of a facility, are
+run as jobs instead of inside the HTTP request. A job is a row of the
+``jobs`` table naming a registered task and its parameters; the row holds
+the state, progress and result of the job, so it can be polled by the user
+interface and survives the process that runs it.
+
+Jobs are handed to a local worker pool chosen with the ``JOBS_EXECUTOR``
+setting: ``'thread'`` (the default), ``'process'`` or ``'inline'``, which
+runs the job before :func:`submit` returns. Jobs left queued, for instance
+by a restart, are run by the ``flask run_jobs`` command. Jobs left running
+by a worker that died are marked as failed once they have run for longer
+than ``JOBS_TIMEOUT`` seconds.
+"""
+import inspect
+import json
+import logging
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from . import db
+from .exceptions import ValidationError
+from .models import Facility, Area, Component, FMECA, RBI, Job, \
+    DEFAULT_INSPECTION_TYPE
+from .generation import load_catalogue, generate
+from .campaigns import plan, export_plan
+from .rbi import run_facility
+from .uncertainty import simulate_facility, export_result
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class JobError(Exception):
+    """Raised by a task to fail its job with a message for the user."""
+
+
+def task(name):
+    """Register a function as the task of a kind of job.
+
+    The function is called with a :class:`JobContext` and the parameters of
+    the job, and returns a JSON serializable result."""
+    def decorator(f):
+        TASKS[name] = f
+        return f
+    return decorator
+
+
+class JobContext(object):
+    """Passed to a running task to report its progress."""
+
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, done, total, message=None):
+        """Record the progress of the job and commit the work done so far,
+        so that pollers see both."""
+        self.job.progress = done / total if total else 1.0
+        if message is not None:
+            self.job.message = message
+        db.session.commit()
+
+
+def check_params(kind, params):
+    """Raise ``ValidationError`` unless ``kind`` is a registered task that
+    accepts the given parameters."""
+    if not isinstance(kind, str) or kind not in TASKS:
+        raise ValidationError('Invalid job: unknown kind')
+    try:
+        inspect.signature(TASKS[kind]).bind(None, **params)
+    except TypeError as e:
+        raise ValidationError('Invalid job: ' + str(e))
+
+
+def is_relative_url(url):
+    """Return true if a URL is a path on this site, such as the result of
+    ``url_for`` without ``_external``."""
+    parts = urlsplit(url)
+    return not parts.scheme and not parts.netloc and \
+        url.startswith('/') and not url.startswith('//') and '\\' not in url
+
+
+def submit(kind, *, next_url=None, **params):
+    """Create a job and queue it. Returns the :class:`~app.models.Job`.
+
+    ``next_url`` is where the job page sends the user once the job is done,
+    and must be a relative URL."""
+    check_params(kind, params)
+    if next_url is not None and not is_relative_url(next_url):
+        raise ValidationError('Invalid job: next_url must be relative')
+    expire()
+    job = Job(kind=kind, params=json.dumps(params), next_url=next_url)
+    db.session.add(job)
+    db.session.commit()
+    current_app.extensions['jobs'].enqueue(job.id)
+    return job
+
+
+def expire(timeout=None):
+    """Mark the jobs running for longer than ``timeout`` seconds, by default
+    ``JOBS_TIMEOUT``, as failed: their worker died without recording it.
+    Returns the number of jobs expired."""
+    if timeout is None:
+        timeout = current_app.config['JOBS_TIMEOUT']
+    now = datetime.utcnow()
+    return Job.query.filter(
+        Job.status == 'running',
+        Job.started_at < now - timedelta(seconds=timeout)).update(
+        {'status': 'failed', 'finished_at': now,
+         'error': 'Timed out: the worker running the job stopped'},
+        synchronize_session=False)
+
+
+def run(job_id):
+    """Run a queued job in the current application context.
+
+    Returns false if the job was not queued, for instance because another
+    worker claimed it first."""
+    claimed = Job.query.filter_by(id=job_id, status='queued').update(
+        {'status': 'running', 'started_at': datetime.utcnow()},
+        synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return False
+
+    job = Job.query.get(job_id)
+    try:
+        result = TASKS[job.kind](JobContext(job), **json.loads(job.params))
+    except Exception as e:
+        if isinstance(e, JobError):
+            logger.info('Job %s failed: %s', job_id, e)
+            error = str(e)
+        else:
+            logger.exception('Job %s failed', job_id)
+            error = ''.join(traceback.format_exception_only(type(e), e))
+        db.session.rollback()
+        job = Job.query.get(job_id)
+        job.status = 'failed'
+        job.error = error
+    else:
+        job.status = 'done'
+        job.progress = 1.0
+        job.result = json.dumps(result)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def run_queued():
+    """Run the queued jobs one after the other. Returns the number of jobs
+    run."""
+    expire()
+    db.session.commit()
+    count = 0
+    while True:
+        job = Job.query.filter_by(status='queued').order_by(Job.id).first()
+        if job is None:
+            return count
+        count += run(job.id)
+
+
+def _run_in_app(app, job_id):
+    with app.app_context():
+        try:
+            run(job_id)
+        finally:
+            db.session.remove()
+
+
+_process_app = None
+
+
+def _run_in_process(config_name, job_id):
+    # each worker process creates its own application once
+    global _process_app
+    if _process_app is None:
+        from . import create_app
+        _process_app = create_app(config_name)
+    _run_in_app(_process_app, job_id)
+
+
+class JobQueue(object):
+    """Flask extension running jobs on a local worker pool.
+
+    Process workers create their application from the ``FLASK_CONFIG``
+    environment variable, like ``fmeca.py``, so they need a database that
+    outlives the process, not an in-memory one."""
+
+    def __init__(self, app=None):
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_EXECUTOR', 'thread')
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_TIMEOUT', 3600)
+        self.app = app
+        app.extensions['jobs'] = self
+
+    def _executor(self):
+        if self.executor is None:
+            kind = self.app.config['JOBS_EXECUTOR']
+            workers = self.app.config['JOBS_WORKERS']
+            if kind == 'process':
+                self.executor = ProcessPoolExecutor(workers)
+            else:
+                self.executor = ThreadPoolExecutor(workers)
+        return self.executor
+
+    def enqueue(self, job_id):
+        kind = self.app.config['JOBS_EXECUTOR']
+        if kind == 'inline':
+            run(job_id)
+        elif kind == 'process':
+            self._executor().submit(_run_in_process,
+                                    os.getenv('FLASK_CONFIG') or 'default',
+                                    job_id)
+        else:
+            self._executor().submit(_run_in_app, self.app, job_id)
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait)
+            self.executor = None
+
+
+def _get(model, id, name):
+    instance = model.query.get(id)
+    if instance is None:
+        raise JobError('{} {} not found'.format(name, id))
+    return instance
+
+
+def _component_fmeca(component_id):
+    return FMECA.query.filter_by(component_id=component_id).first()
+
+
+def _required_fmeca(component_id):
+    fmeca = _get(Component, component_id, 'Component').fmeca
+    if fmeca is None:
+        raise JobError('Component {} has no FMECA'.format(component_id))
+    return fmeca
+
+
+@task('fmeca_create')
+def create_fmeca(context, component_id):
+    """Create the FMECA of a component, unless it has one."""
+    fmeca = _component_fmeca(component_id)
+    if fmeca is None:
+        fmeca = FMECA(component_id=component_id)
+        generate(fmeca)
+        db.session.commit()
+    return {'fmeca_id': fmeca.id, 'failures': fmeca.failures.count()}
+
+
+@task('fmeca_update')
+def update_fmeca(context, component_id):
+    """Update the failures of the FMECA of a component in a single
+    transaction, creating the FMECA if needed."""
+    fmeca = _component_fmeca(component_id)
+    if fmeca is None:
+        return create_fmeca(context, component_id)
+    changes = fmeca.update()
+    db.session.commit()
+    result = {'fmeca_id': fmeca.id, 'failures': fmeca.failures.count()}
+    result.update(changes._asdict())
+    return result
+
+
+@task('rbi_create')
+def create_rbi(context, component_id):
+    """Create the RBI of a component's FMECA, unless it has one."""
+    fmeca = _required_fmeca(component_id)
+    rbi = fmeca.rbi
+    if rbi is None:
+        rbi = RBI(fmeca=fmeca, inspection_type=DEFAULT_INSPECTION_TYPE)
+        rbi.run()
+        db.session.commit()
+    return {'rbi_id': rbi.id, 'failures': rbi.failures.count()}
+
+
+@task('rbi_update')
+def update_rbi(context, component_id):
+    """Reassign the failures of a component's FMECA to its RBI in a single
+    transaction."""
+    fmeca = _required_fmeca(component_id)
+    rbi = fmeca.rbi
+    if rbi is None:
+        rbi = RBI(fmeca=fmeca, inspection_type=DEFAULT_INSPECTION_TYPE)
+    rbi.run()
+    db.session.commit()
+    return {'rbi_id': rbi.id, 'failures': rbi.failures.count()}
+
+
+@task('facility_fmecas')
+def facility_fmecas(context, facility_id, replace=False):
+    """Generate the FMECAs of a facility one component at a time, committing
+    after each one."""
+    components = Component.query.options(joinedload(Component.fmeca)).\
+        join(Area).filter(Area.facility_id == facility_id).\
+        order_by(Component.id).all()
+    catalogue = load_catalogue()
+    created = 0
+    for done, component in enumerate(components):
+        if component.fmeca is None:
+            generate(FMECA(component_id=component.id), catalogue)
+            created += 1
+        elif replace:
+            update_fmeca(context, component.id)
+            created += 1
+        context.progress(done + 1, len(components), component.ident)
+    return {'components': len(components), 'fmecas': created}
+
+
+@task('facility_rbi')
+def facility_rbi(context, facility_id):
+    """Run the RBIs of every component of a facility."""
+    results = run_facility(_get(Facility, facility_id, 'Facility'))
+    db.session.commit()
+    return {'rbis': len(results)}
+
+
+@task('facility_uncertainty')
+def facility_uncertainty(context, facility_id, samples=None, seed=None):
+    """Run a Monte Carlo simulation of the risk of a facility."""
+    return export_result(simulate_facility(facility_id, samples=samples,
+                                           seed=seed))
+
+
+@task('facility_campaigns')
+def facility_campaigns(context, facility_id, horizon=None):
+    """Plan the inspection campaigns of a facility."""
+    return export_plan(plan(_get(Facility, facility_id, 'Facility'),
+                            horizon))
@@ -6,10 +6,16 @@ from bokeh.plotting import figure
 from bokeh.charts import Line
 from bokeh.embed import components
 from bokeh.models.sources import ColumnDataSource
+from sqlalchemy.orm import joinedload
 from . import main
 from app import db
 from ..models import FailureMode, Facility, Area, Component, SubComponent, \
-    Vessel, Consequence, VesselTrip, FailureMode, FMECA, RBI
+    Vessel, Consequence, VesselTrip, FailureMode, FMECA, RBI, Job
+from ..catalogue import cache
+from ..jobs import submit
+from ..reports import fmeca_rows, rbi_rows, rbi_summary
+from ..sensitivity import analyse
+from ..rbi import results as rbi_results
 from .forms import FailureModeForm, FacilityForm, AreaForm, VesselForm, \
     ComponentForm, SubComponentForm, ConsequenceForm, VesselTripForm, \
     FailureModeForm
@@ -61,6 +67,45 @@ def facility(id):
                            facility=facility)
 
 
+@main.route('/facility/<int:id>/rbi', methods=['GET', 'POST'])
+def facility_rbi(id):
+    facility = Facility.query.get_or_404(id)
+    results = rbi_results(facility)
+    return render_template('facility_rbi.html', facility=facility,
+                           results=results)
+
+
+@main.route('/facility/<int:id>/rbi/run', methods=['GET', 'POST'])
+def facility_rbi_run(id):
+    facility = Facility.query.get_or_404(id)
+    job = submit('facility_rbi', next_url=url_for('.facility_rbi', id=id),
+                 facility_id=facility.id)
+    return job_redirect(job, 'RBIs updated.')
+
+
+@main.route('/facility/<int:id>/fmecas/generate', methods=['GET', 'POST'])
+def facility_fmecas(id):
+    facility = Facility.query.get_or_404(id)
+    job = submit('facility_fmecas', next_url=url_for('.facility', id=id),
+                 facility_id=facility.id)
+    return job_redirect(job, 'FMECAs generated.')
+
+
+def job_redirect(job, message):
+    """Redirect to the page of a job, or to its next page if it has already
+    finished."""
+    if job.status == 'done':
+        flash(message)
+        return redirect(job.next_url)
+    return redirect(url_for('.job', id=job.id))
+
+
+@main.route('/job/<int:id>')
+def job(id):
+    job = Job.query.get_or_404(id)
+    return render_template('job.html', job=job)
+
+
 @main.route('/facility/<int:id>/add_vessel', methods=['GET', 'POST'])
 def add_vessel(id):
     facility = Facility.query.get_or_404(id)
@@ -113,8 +158,8 @@ def area(id):
 def component(id):
     component = Component.query.get_or_404(id)
     c_form = ConsequenceForm()
-    c_form.name.choices = [(failure_mode.consequence_description, failure_mode.consequence_description)
-                           for failure_mode in FailureMode.query.with_entities(FailureMode.consequence_description).distinct()]
+    c_form.name.choices = [(description, description)
+                           for description in cache.consequence_descriptions()]
     if c_form.validate_on_submit():
         c = Consequence(component=component,
                         name=c_form.name.data,
@@ -128,8 +173,8 @@ def component(id):
         return redirect(url_for('.component', id=id))
     sc_form = SubComponentForm()
     # assign list of unique subcomponent categories
-    sc_form.category.choices = [(failure_mode.subcomponent_category, failure_mode.subcomponent_category)
-                                for failure_mode in FailureMode.query.with_entities(FailureMode.subcomponent_category).distinct()]
+    sc_form.category.choices = [(category, category)
+                                for category in cache.categories()]
     if sc_form.validate_on_submit():
         sc = SubComponent(component=component,
                           ident=sc_form.ident.data,
@@ -163,77 +208,87 @@ def consequence(id):
 @main.route('/component/<int:id>/fmeca', methods=['GET', 'POST'])
 def fmeca(id):
     component = Component.query.get_or_404(id)
-    fmeca = component.fmeca
-    return render_template('fmeca.html', component=component, fmeca=fmeca)
+    fmeca = FMECA.query.filter_by(component_id=id).first()
+    rows = fmeca_rows(fmeca) if fmeca is not None else []
+    return render_template('fmeca.html', component=component, fmeca=fmeca,
+                           rows=rows)
 
 
 @main.route('/component/<int:id>/fmeca/create', methods=['GET', 'POST'])
 def fmeca_create(id):
     component = Component.query.get_or_404(id)
-    fmeca = FMECA(component=component)
-    fmeca.create()
-    db.session.add(fmeca)
-    db.session.commit()
-    flash('FMECA created.')
-    return redirect(url_for('.fmeca', id=component.id))
+    job = submit('fmeca_create', component_id=component.id,
+                 next_url=url_for('.fmeca', id=component.id))
+    return job_redirect(job, 'FMECA created.')
 
 
 @main.route('/component/<int:id>/fmeca/update', methods=['GET', 'POST'])
 def fmeca_update(id):
     component = Component.query.get_or_404(id)
-    fmeca = FMECA.query.filter_by(component_id=id).first()
-    db.session.delete(fmeca)
-    db.session.commit()
-    fmeca = FMECA(component=component)
-    fmeca.create()
-    db.session.add(fmeca)
-    db.session.commit()
-    flash('FMECA updated.')
-    return redirect(url_for('.fmeca', id=component.id))
+    job = submit('fmeca_update', component_id=component.id,
+                 next_url=url_for('.fmeca', id=component.id))
+    return job_redirect(job, 'FMECA updated.')
 
 
 @main.route('/component/<int:id>/rbi', methods=['GET', 'POST'])
 def rbi(id):
-    fmeca = FMECA.query.filter_by(component_id=id).first()
+    fmeca = FMECA.query.options(joinedload(FMECA.component).
+                                joinedload(Component.area).
+                                joinedload(Area.facility)).\
+        filter_by(component_id=id).first_or_404()
     rbi = fmeca.rbi
+    rows = []
+    summary = None
+    script, div = None, None
 
     if rbi is not None:
-        # generate chart
-        data = {'risk': rbi.risk, 'interval': rbi.inspection_interval}
-        # hover = create_hover_tool()
-        title = fmeca.component.ident
-        plot = create_rbi_chart(data=data, title=title, x_name='Time [yrs]',
-                                y_name='Commercial Risk [£]')  # , hover_tool=hover)
-        script, div = components(plot)
-    else:
-        script, div = None, None
-
-    return render_template('rbi.html', fmeca=fmeca, rbi=rbi, div=div, script=script)
+        rows = rbi_rows(rbi)
+        summary = rbi_summary(rbi, fmeca.component.area.facility.risk_cut_off,
+                              rows)
+        if summary.inspection_interval is not None:
+            # generate chart
+            data = {'risk': summary.risk,
+                    'interval': summary.inspection_interval}
+            # hover = create_hover_tool()
+            title = fmeca.component.ident
+            plot = create_rbi_chart(data=data, title=title, x_name='Time [yrs]',
+                                    y_name='Commercial Risk [£]')  # , hover_tool=hover)
+            script, div = components(plot)
+
+    return render_template('rbi.html', fmeca=fmeca, rbi=rbi, rows=rows,
+                           summary=summary, div=div, script=script)
+
+
+@main.route('/component/<int:id>/rbi/sensitivity', methods=['GET'])
+def rbi_sensitivity(id):
+    # a pass over every input, so on its own page rather than on the RBI's
+    rbi = RBI.query.join(FMECA).filter(FMECA.component_id == id).\
+        first_or_404()
+    fmeca = rbi.fmeca
+    analysis = analyse(rbi)
+    script, div = None, None
+    if analysis.inputs:
+        tornado = create_tornado_chart(analysis, title='Sensitivity',
+                                       x_name='Annual Commercial Risk [£]')
+        script, div = components(tornado)
+    return render_template('rbi_sensitivity.html', fmeca=fmeca,
+                           analysis=analysis, div=div, script=script)
 
 
 @main.route('/component/<int:id>/rbi/create', methods=['GET', 'POST'])
 def rbi_create(id):
-    fmeca = FMECA.query.filter_by(component_id=id).first()
-    rbi = RBI(fmeca=fmeca, inspection_type='ROV Inspection')
-    rbi.run()
-    db.session.add(rbi)
-    db.session.commit()
-    flash('RBI created.')
-    return redirect(url_for('.rbi', id=fmeca.component.id))
+    FMECA.query.filter_by(component_id=id).first_or_404()
+    job = submit('rbi_create', component_id=id,
+                 next_url=url_for('.rbi', id=id))
+    return job_redirect(job, 'RBI created.')
 
 
 @main.route('/component/<int:id>/rbi/update', methods=['GET', 'POST'])
 def rbi_update(id):
-    fmeca = FMECA.query.filter_by(component_id=id).first()
-    rbi = RBI.query.filter_by(fmeca=fmeca).first()
-    db.session.delete(rbi)
-    db.session.commit()
-    rbi = RBI(fmeca=fmeca, inspection_type='ROV Inspection')
-    rbi.run()
-    db.session.add(rbi)
-    db.session.commit()
-    flash('RBI updated.')
-    return redirect(url_for('.rbi', id=id))
+    FMECA.query.filter_by(component_id=id).first_or_404()
+    job = submit('rbi_update', component_id=id,
+                 next_url=url_for('.rbi', id=id))
+    return job_redirect(job, 'RBI updated.')
 
 
 # def create_hover_tool():
@@ -252,6 +307,26 @@ def rbi_update(id):
 #     return HoverTool(tooltips=hover_html)
 
 
+def create_figure(title, x_name, y_name, hover_tool=None, width=1200,
+                  height=500, **kwargs):
+    """Creates a Bokeh figure with the styling shared by the charts of the
+    RBI page."""
+    tools = []
+    if hover_tool:
+        tools = [hover_tool, ]
+
+    plot = figure(title=title, plot_width=width,
+                  plot_height=height, h_symmetry=False, v_symmetry=False,
+                  min_border=0, toolbar_location="above", tools=tools,
+                  responsive=True, outline_line_color="#666666", **kwargs)
+
+    plot.toolbar.logo = None
+    plot.min_border_top = 0
+    plot.yaxis.axis_label = y_name
+    plot.xaxis.axis_label = x_name
+    return plot
+
+
 def create_rbi_chart(data, title, x_name, y_name, hover_tool=None,
                      width=1200, height=500):
     """Creates a line chart plot. Pass in data as a dictionary, desired plot title,
@@ -265,25 +340,28 @@ def create_rbi_chart(data, title, x_name, y_name, hover_tool=None,
           [0, interval, interval]]
     ys = [[risk, risk, risk], [0, risk, 0]]
 
-    tools = []
-    if hover_tool:
-        tools = [hover_tool, ]
-
-    plot = figure(title=title, plot_width=width,
-                  plot_height=height, h_symmetry=False, v_symmetry=False,
-                  min_border=0, toolbar_location="above", tools=tools,
-                  responsive=True, outline_line_color="#666666")
+    plot = create_figure(title, x_name, y_name, hover_tool, width, height)
 
     plot.multi_line(xs, ys, color=["firebrick", "navy"], line_width=2)
 
     plot.x_range = Range1d(start=0, end=interval + 0.1 * interval)
     plot.y_range = Range1d(start=0, end=risk + 0.1 * risk)
+    return plot
 
-    xaxis = LinearAxis()
-    yaxis = LinearAxis()
 
-    plot.toolbar.logo = None
-    plot.min_border_top = 0
-    plot.yaxis.axis_label = y_name
-    plot.xaxis.axis_label = x_name
+def create_tornado_chart(analysis, title, x_name, width=1200, height=500):
+    """Creates a tornado chart of a sensitivity analysis: a horizontal bar
+    per input from its low to its high risk, largest swing on top."""
+    inputs = analysis.inputs[::-1]
+    labels = [sensitivity.label for sensitivity in inputs]
+
+    plot = create_figure(title, x_name, None, width=width, height=height,
+                         y_range=FactorRange(factors=labels))
+
+    plot.hbar(y=labels, height=0.6, left=analysis.risk,
+              right=[sensitivity.low_risk for sensitivity in inputs],
+              color="navy", legend='-{:.0%}'.format(analysis.variation))
+    plot.hbar(y=labels, height=0.6, left=analysis.risk,
+              right=[sensitivity.high_risk for sensitivity in inputs],
+              color="firebrick", legend='+{:.0%}'.format(analysis.variation))
     return plot
@@ -1,10 +1,24 @@
+import json
 import math
-import logging
-from flask import url_for
+from datetime import datetime
 from flask_admin import BaseView, expose
 from flask_admin.contrib.sqla import ModelView
 from . import db, admin
 from .exceptions import ValidationError
+from .urls import resource_url
+
+# inspection type of the RBI shown on a component's RBI page
+DEFAULT_INSPECTION_TYPE = 'ROV Inspection'
+
+# fields that scenarios can override, per kind of entity
+SCENARIO_FIELDS = {
+    'facility': ('deferred_prod_cost', 'risk_cut_off'),
+    'area': ('equity_share',),
+    'vessel': ('day_rate', 'mob_time'),
+    'consequence': ('mean_time_to_repair', 'deferred_prod_rate',
+                    'replacement_cost'),
+    'failure_mode': ('mean_time_to_failure',),
+}
 
 
 class Facility(db.Model):
@@ -24,19 +38,26 @@ class Facility(db.Model):
                             cascade='all, delete-orphan')
     consequences = db.relationship('Consequence', backref='facility',
                                    lazy='dynamic')
+    scenarios = db.relationship('Scenario', backref='facility',
+                                lazy='dynamic',
+                                cascade='all, delete-orphan')
+    # incremented on every update, see app/decorators/json.py
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.name}>'
 
     def get_url(self):
-        return url_for('api.get_facility', id=self.id, _external=True)
+        return resource_url('api.get_facility', self.id)
 
     def export_data(self):
         return {
             'self_url': self.get_url(),
             'name': self.name,
-            'areas_url': url_for('api.get_facility_areas', id=self.id,
-                                 _external=True),
+            'areas_url': resource_url('api.get_facility_areas', self.id),
         }
 
     def import_data(self, data):
@@ -59,12 +80,16 @@ class Area(db.Model):
     components = db.relationship('Component', backref='area',
                                  lazy='dynamic',
                                  cascade='all, delete-orphan')
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.name}>'
 
     def get_url(self):
-        return url_for('api.get_area', id=self.id, _external=True)
+        return resource_url('api.get_area', self.id)
 
     def export_data(self):
         return {
@@ -72,8 +97,8 @@ class Area(db.Model):
             'facility_url': self.facility.get_url(),
             'name': self.name,
             'equity_share': self.equity_share,
-            'components_url': url_for('api.get_area_components', id=self.id,
-                                      _external=True),
+            'components_url': resource_url('api.get_area_components',
+                                           self.id),
         }
 
     def import_data(self, data):
@@ -101,12 +126,16 @@ class Component(db.Model):
         'SubComponent', backref='component', lazy='dynamic',
         cascade='all, delete-orphan')
     fmeca = db.relationship("FMECA", backref='component', uselist=False)
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.ident}>'
 
     def get_url(self):
-        return url_for('api.get_component', id=self.id, _external=True)
+        return resource_url('api.get_component', self.id)
 
     def export_data(self):
         return {
@@ -139,12 +168,16 @@ class SubComponent(db.Model):
         db.Integer, db.ForeignKey('components.id'), index=True)
     failures = db.relationship('Failure', backref='subcomponent',
                                lazy='dynamic', cascade='all, delete-orphan')
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.ident}>'
 
     def get_url(self):
-        return url_for('api.get_subcomponent', id=self.id, _external=True)
+        return resource_url('api.get_subcomponent', self.id)
 
     def export_data(self):
         return {
@@ -185,12 +218,16 @@ class Consequence(db.Model):
         db.Integer, db.ForeignKey('components.id'), index=True)
     facility_id = db.Column(
         db.Integer, db.ForeignKey('facilities.id'), index=True)
+    version = db.Column(db.Integer, nullable=False, default=1,
+                        server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.name}>'
 
     def get_url(self):
-        return url_for('api.get_consequence', id=self.id, _external=True)
+        return resource_url('api.get_consequence', self.id)
 
     def export_data(self):
         return {
@@ -215,19 +252,18 @@ class Consequence(db.Model):
 
     @property
     def production_impact(self):
-        facility = Facility.query.get_or_404(self.facility_id)
-        return self.gross_deferred_volume * facility.deferred_prod_cost
+        from .costs import cost
+        return cost(self, 'production_impact')
 
     @property
     def equipment_cost(self):
-        equipment_cost = self.replacement_cost
-        for vessel_trip in self.vessel_trips:
-            equipment_cost += vessel_trip.total_cost
-        return self.component.area.equity_share * equipment_cost
+        from .costs import cost
+        return cost(self, 'equipment_cost')
 
     @property
     def total_cost(self):
-        return self.production_impact + self.equipment_cost
+        from .costs import cost
+        return cost(self, 'total_cost')
 
 
 class VesselTrip(db.Model):
@@ -246,9 +282,8 @@ class VesselTrip(db.Model):
 
     @property
     def total_cost(self):
-        vessel = Vessel.query.get_or_404(self.vessel_id)
-        total_time = self.active_repair_time + vessel.mob_time
-        return total_time * vessel.day_rate
+        total_time = self.active_repair_time + self.vessel.mob_time
+        return total_time * self.vessel.day_rate
 
 
 class Vessel(db.Model):
@@ -277,31 +312,28 @@ class FMECA(db.Model):
     component_id = db.Column(db.Integer, db.ForeignKey('components.id'),
                              index=True)
     failures = db.relationship('Failure', backref='fmeca', lazy='dynamic')
-    rbi = db.relationship("RBI", backref='fmeca', uselist=False)
+    rbis = db.relationship('RBI', backref='fmeca', lazy='dynamic')
 
     def __repr__(self):
         return f'<{self.__class__.__name__} {self.id}>'
 
-    # TODO: Add caching
     def create(self):
-        for subcomponent in self.component.subcomponents:
-            for failure_mode in FailureMode.query.\
-                    filter_by(subcomponent_category=subcomponent.category).all():
-
-                try:
-                    consequence = Consequence.query.\
-                        filter_by(component=self.component,
-                                  name=failure_mode.consequence_description).\
-                        first()
-                    if consequence is None:
-                        raise ValidationError('No consequences found')
-                except ValidationError as e:
-                    logging.info('No consequences found')
-
-                failure = Failure(fmeca=self,
-                                  subcomponent=subcomponent,
-                                  failure_mode=failure_mode,
-                                  consequence=consequence)
+        """Populate the FMECA with a failure for each failure mode of each
+        of the component's sub-components."""
+        from .generation import generate
+        generate(self)
+
+    def update(self):
+        """Bring the failures of the FMECA up to date with the component's
+        sub-components and the catalogue, keeping their RBI assignments.
+        Returns the changes made."""
+        from .generation import update
+        return update(self)
+
+    @property
+    def rbi(self):
+        return self.rbis.filter_by(
+            inspection_type=DEFAULT_INSPECTION_TYPE).first()
 
 
 class RBI(db.Model):
@@ -317,21 +349,24 @@ class RBI(db.Model):
         return f'<{self.__class__.__name__} {self.id}>'
 
     def run(self):
-        for failure in self.fmeca.failures:
-            if failure.failure_mode.inspection_type == self.inspection_type and not failure.failure_mode.time_dependant:
-                failure.rbi = self
+        """Assign the failures of the FMECA that are found by the inspection
+        type and are not time dependant to the RBI."""
+        from .rbi import assign
+        db.session.add(self)
+        db.session.flush()
+        assign([self.fmeca_id], [self.inspection_type])
 
     @property
     def risk(self):
-        risk = 0
-        for failure in self.fmeca.failures:
-            if failure.rbi == self:
-                risk += failure.risk
-        return risk
+        from .rollups import rbi_risk
+        return rbi_risk(self.id)
 
     @property
     def inspection_interval(self):
-        return self.fmeca.component.area.facility.risk_cut_off / self.risk
+        """The inspection interval, ``None`` for an RBI without risk."""
+        risk = self.risk
+        cut_off = self.fmeca.component.area.facility.risk_cut_off
+        return cut_off / risk if risk and cut_off is not None else None
 
 
 class FailureMode(db.Model):
@@ -346,6 +381,9 @@ class FailureMode(db.Model):
     detectable = db.Column(db.String(64))
     inspection_type = db.Column(db.String(64))
     consequence_description = db.Column(db.String(64))
+    # Weibull life distribution of time dependant failure modes, in years
+    weibull_shape = db.Column(db.Float)
+    weibull_scale = db.Column(db.Float)
     failures = db.relationship('Failure', backref='failure_mode',
                                lazy='dynamic')
 
@@ -377,22 +415,11 @@ class Failure(db.Model):
         """
         Return the annual probability of failure of the failure mode
         """
-
-        # apply rbi filters
-        if not self.failure_mode.time_dependant:
-            if self.failure_mode.detectable == 'Lagging':
-                multiplier = 0.5
-            else:
-                multiplier = 1
-        else:
-            multiplier = 0
-
-        try:
-            failure_rate = 1 / self.failure_mode.mean_time_to_failure
-            t = 1
-            return multiplier * (1 - math.exp(-failure_rate * t))
-        except ZeroDivisionError as e:
-            raise e
+        from . import risk
+        return float(risk.probability(
+            self.failure_mode.mean_time_to_failure,
+            risk.detectability_multiplier(self.failure_mode.detectable),
+            self.failure_mode.time_dependant))
 
     @property
     def total_cost(self):
@@ -409,7 +436,226 @@ class Failure(db.Model):
         """
         Return the annual commercial risk of the failure.
         """
-        return self.probability * self.total_cost
+        from . import risk
+        return float(risk.risk(self.probability, self.total_cost))
+
+
+class FailureRisk(db.Model):
+    """Materialized risk of a failure, maintained by :mod:`app.rollups`."""
+
+    __tablename__ = 'failure_risks'
+
+    failure_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    subcomponent_id = db.Column(db.Integer, index=True)
+    component_id = db.Column(db.Integer, index=True)
+    area_id = db.Column(db.Integer, index=True)
+    facility_id = db.Column(db.Integer, index=True)
+    probability = db.Column(db.Float)
+    total_cost = db.Column(db.Float)
+    risk = db.Column(db.Float)
+    stale = db.Column(db.Boolean, default=False, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.failure_id}>'
+
+
+class RiskRollup(db.Model):
+    """Materialized risk of a sub-component, component, area or facility,
+    maintained by :mod:`app.rollups`."""
+
+    __tablename__ = 'risk_rollups'
+
+    level = db.Column(db.String(16), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    risk = db.Column(db.Float)
+    failures = db.Column(db.Integer)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.level} {self.entity_id}>'
+
+
+class Job(db.Model):
+    """Background job, run by :mod:`app.jobs`."""
+
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    params = db.Column(db.Text)
+    status = db.Column(db.String(16), nullable=False, default='queued',
+                       index=True)
+    progress = db.Column(db.Float, nullable=False, default=0)
+    message = db.Column(db.String(256))
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    next_url = db.Column(db.String(256))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.id} {self.kind}>'
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def get_url(self):
+        return resource_url('api.get_job', self.id)
+
+    def export_data(self):
+        return {
+            'self_url': self.get_url(),
+            'kind': self.kind,
+            'params': json.loads(self.params or '{}'),
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'next_url': self.next_url,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class ChangeCounter(db.Model):
+    """Number of committed transactions that wrote to a table, maintained by
+    :mod:`app.counters`."""
+
+    __tablename__ = 'change_counters'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    counter = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.table_name}>'
+
+
+class Scenario(db.Model):
+    """A what-if variant of a facility, see :mod:`app.scenarios`."""
+
+    __tablename__ = 'scenarios'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(128), nullable=False)
+    description = db.Column(db.Text)
+    facility_id = db.Column(
+        db.Integer, db.ForeignKey('facilities.id'), index=True)
+    overrides = db.relationship('ScenarioOverride', backref='scenario',
+                                lazy='dynamic',
+                                cascade='all, delete-orphan')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.name}>'
+
+    def get_url(self):
+        return resource_url('api.get_scenario', self.id)
+
+    def export_data(self):
+        return {
+            'self_url': self.get_url(),
+            'facility_url': self.facility.get_url(),
+            'name': self.name,
+            'description': self.description,
+            'overrides': [override.export_data()
+                          for override in self.overrides.
+                          order_by(ScenarioOverride.id)],
+            'comparison_url': resource_url('api.get_scenario_comparison',
+                                           self.id),
+            'created_at': self.created_at,
+        }
+
+    def import_data(self, data):
+        try:
+            self.name = data['name']
+        except KeyError as e:
+            raise ValidationError('Invalid scenario: missing ' + e.args[0])
+        self.description = data.get('description')
+        if 'overrides' in data:
+            overrides = [ScenarioOverride().import_data(item)
+                         for item in data['overrides']]
+            keys = [(o.model, o.entity_id, o.field) for o in overrides]
+            if len(set(keys)) != len(keys):
+                raise ValidationError(
+                    'Invalid scenario: duplicate overrides')
+            from .scenarios import missing_entities
+            with db.session.no_autoflush:
+                missing = missing_entities(self.facility, overrides)
+            if missing:
+                raise ValidationError('Invalid override: no {} {} in the '
+                                      'facility'.format(*missing[0]))
+            if self.id is not None:
+                self.overrides.delete()
+            self.overrides = overrides
+        return self
+
+
+class ScenarioOverride(db.Model):
+    """A field of an entity, or of every entity of a kind when
+    ``entity_id`` is null, set to a ``value`` or scaled by a ``factor``
+    in a scenario."""
+
+    __tablename__ = 'scenario_overrides'
+    __table_args__ = (db.UniqueConstraint('scenario_id', 'model',
+                                          'entity_id', 'field'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    scenario_id = db.Column(
+        db.Integer, db.ForeignKey('scenarios.id'), index=True)
+    model = db.Column(db.String(32), nullable=False)
+    entity_id = db.Column(db.Integer)
+    field = db.Column(db.String(64), nullable=False)
+    value = db.Column(db.Float)
+    factor = db.Column(db.Float)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.model}.{self.field}>'
+
+    def export_data(self):
+        return {
+            'model': self.model,
+            'entity_id': self.entity_id,
+            'field': self.field,
+            'value': self.value,
+            'factor': self.factor,
+        }
+
+    def import_data(self, data):
+        try:
+            self.model = data['model']
+            self.field = data['field']
+        except KeyError as e:
+            raise ValidationError('Invalid override: missing ' + e.args[0])
+        except TypeError:
+            raise ValidationError('Invalid override: not an object')
+        if self.field not in SCENARIO_FIELDS.get(self.model, ()):
+            raise ValidationError('Invalid override: {}.{} cannot be '
+                                  'overridden'.format(self.model, self.field))
+        self.entity_id = data.get('entity_id')
+        if self.entity_id is not None and (
+                isinstance(self.entity_id, bool) or
+                not isinstance(self.entity_id, int)):
+            raise ValidationError('Invalid override: entity_id must be an '
+                                  'integer')
+        self.value = data.get('value')
+        self.factor = data.get('factor')
+        if (self.value is None) == (self.factor is None):
+            raise ValidationError('Invalid override: give either a value '
+                                  'or a factor')
+        number = self.value if self.factor is None else self.factor
+        if isinstance(number, bool) or \
+                not isinstance(number, (int, float)) or \
+                not math.isfinite(number):
+            raise ValidationError('Invalid override: not a number')
+        return self
+
+
+class VersionedModelView(ModelView):
+    # the version is maintained by SQLAlchemy
+    form_excluded_columns = ('version',)
 
 
 class MyView(BaseView):
@@ -418,12 +664,14 @@ class MyView(BaseView):
         return 'Hello World!'
 
 
-admin.add_view(ModelView(Facility, db.session))
-admin.add_view(ModelView(Area, db.session))
-admin.add_view(ModelView(Component, db.session))
-admin.add_view(ModelView(SubComponent, db.session))
+admin.add_view(VersionedModelView(Facility, db.session))
+admin.add_view(VersionedModelView(Area, db.session))
+admin.add_view(VersionedModelView(Component, db.session))
+admin.add_view(VersionedModelView(SubComponent, db.session))
 admin.add_view(ModelView(FailureMode, db.session))
-admin.add_view(ModelView(Consequence, db.session))
+admin.add_view(VersionedModelView(Consequence, db.session))
 admin.add_view(ModelView(Vessel, db.session))
 admin.add_view(ModelView(VesselTrip, db.session))
 admin.add_view(ModelView(Failure, db.session))
+admin.add_view(ModelView(Job, db.session))
+admin.add_view(ModelView(Scenario, db.session))
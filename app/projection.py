@@ -0,0 +1,125 @@
+"""Life-of-field risk projection.
+
+The annual risk of :mod:`app.risk` looks one year ahead and leaves out the
+time dependant failure modes. A projection instead follows every failure of
+a facility year by year over a horizon, by default the remaining life of
+the facility, as a single years × failures matrix:
+
+* random failure modes have an exponential life with their mean time to
+  failure, as in the annual risk;
+* time dependant failure modes have a Weibull life with their
+  ``weibull_shape`` and ``weibull_scale``. A missing scale is derived from
+  the mean time to failure and a missing shape falls back to the
+  exponential life.
+
+Every component is taken to be new at the start of the horizon. The
+expected cost of a failure in a year is the probability that it first
+fails in that year times its total cost, discounted to the start of the
+horizon at the ``PROJECTION_DISCOUNT_RATE``.
+"""
+import math
+from collections import namedtuple
+import numpy as np
+from flask import current_app
+from .exceptions import ValidationError
+from .models import Area, Component, SubComponent, Failure
+from .risk import load_columns
+
+Projection = namedtuple('Projection', ['years', 'failure_ids',
+                                       'cumulative_probability',
+                                       'expected_cost', 'discounted_cost'])
+
+_gamma = np.vectorize(math.gamma, otypes=[float])
+
+
+def life_parameters(mean_time_to_failure, time_dependant, weibull_shape,
+                    weibull_scale):
+    """Return the ``(shape, scale)`` arrays of the life distribution of
+    columns of failures."""
+    mttf = np.asarray(mean_time_to_failure, dtype=float)
+    shape = np.asarray(weibull_shape, dtype=float)
+    scale = np.asarray(weibull_scale, dtype=float)
+    weibull = np.asarray(time_dependant, dtype=bool) & ~np.isnan(shape)
+    shape = np.where(weibull, shape, 1.0)
+    # the scale giving the mean time to failure: mttf = scale * Γ(1 + 1/k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        derived = mttf / _gamma(1 + 1 / shape)
+    scale = np.where(weibull & ~np.isnan(scale), scale, derived)
+    return shape, scale
+
+
+def cumulative_probability(years, shape, scale, multiplier):
+    """Return the probability of failure by the end of each year as a
+    years × failures matrix."""
+    t = np.asarray(years, dtype=float)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.asarray(multiplier) * \
+            (1 - np.exp(-(t / np.asarray(scale)) ** np.asarray(shape)))
+
+
+def discount_factors(years, discount_rate):
+    """Return the factor discounting the costs of each year to the start of
+    the horizon."""
+    return (1 + discount_rate) ** -np.asarray(years, dtype=float)
+
+
+def project(columns, horizon, discount_rate=0):
+    """Project columns of failure data, as loaded by
+    :func:`~app.risk.load_columns`, over a horizon in years, rounded up to
+    whole years. Returns a :class:`Projection`."""
+    years = np.arange(1, int(math.ceil(horizon)) + 1)
+    shape, scale = life_parameters(columns['mean_time_to_failure'],
+                                   columns['time_dependant'],
+                                   columns['weibull_shape'],
+                                   columns['weibull_scale'])
+    cumulative = cumulative_probability(years, shape, scale,
+                                        columns['multiplier'])
+    # probability of first failing during each year
+    incremental = np.vstack([cumulative[:1], np.diff(cumulative, axis=0)])
+    expected = incremental * np.asarray(columns['total_cost'],
+                                        dtype=float)
+    discounted = expected * discount_factors(years,
+                                             discount_rate)[:, np.newaxis]
+    return Projection(years, columns['id'], cumulative, expected, discounted)
+
+
+def failures_of_facility(facility_id):
+    """Return the query of the failures of a facility."""
+    return Failure.query.join(SubComponent).join(Component).join(Area).\
+        filter(Area.facility_id == facility_id)
+
+
+def project_facility(facility, horizon=None, discount_rate=None):
+    """Project the failures of a facility over its remaining life, or the
+    given horizon of at most ``PROJECTION_MAX_HORIZON`` years. Returns a
+    :class:`Projection`."""
+    config = current_app.config
+    if horizon is None:
+        horizon = facility.remaining_life
+    limit = config['PROJECTION_MAX_HORIZON']
+    if not horizon or not 0 < horizon <= limit:
+        raise ValidationError('Invalid projection: the horizon must be '
+                              'between 0 and {} years'.format(limit))
+    if discount_rate is None:
+        discount_rate = config['PROJECTION_DISCOUNT_RATE']
+    if not math.isfinite(discount_rate) or discount_rate <= -1:
+        raise ValidationError('Invalid projection: the discount rate must '
+                              'be greater than -1')
+    return project(load_columns(failures_of_facility(facility.id)), horizon,
+                   discount_rate)
+
+
+def component_totals(projection, facility_id):
+    """Return the discounted cost of each component of a facility over the
+    horizon of a projection, as a list of ``(component_id, ident, cost)``
+    tuples ordered by component id."""
+    rows = failures_of_facility(facility_id).\
+        with_entities(Failure.id, Component.id).order_by(Failure.id).all()
+    component_ids = np.array([component_id for id, component_id in rows],
+                             dtype=int)
+    costs = np.nansum(projection.discounted_cost, axis=0)
+    idents = dict(Component.query.join(Area).
+                  filter(Area.facility_id == facility_id).
+                  with_entities(Component.id, Component.ident))
+    return [(id, idents[id], float(costs[component_ids == id].sum()))
+            for id in sorted(idents)]
@@ -0,0 +1,118 @@
+"""Facility-wide RBI runner.
+
+An RBI groups the failures of an FMECA that are found by one type of
+inspection and are not time dependant. The runner creates the RBIs of every
+component of a facility for every inspection type in the catalogue and
+assigns the failures to them with a single set-based UPDATE, instead of
+walking the failures through the ORM one at a time.
+"""
+from collections import namedtuple
+from sqlalchemy import and_, func, or_, select
+from . import db
+from .counters import touch
+from .models import Facility, Area, Component, FMECA, RBI, FailureMode, \
+    Failure, FailureRisk
+from .generation import bulk_insert
+from .rollups import deltas, pending_risks
+
+RBIResult = namedtuple('RBIResult', ['rbi_id', 'component_id', 'ident',
+                                     'inspection_type', 'failures', 'risk',
+                                     'inspection_interval'])
+
+
+def inspection_types():
+    """Return the distinct inspection types of the failure mode catalogue."""
+    types = db.session.query(FailureMode.inspection_type).distinct().\
+        filter(FailureMode.inspection_type.isnot(None),
+               FailureMode.inspection_type != '').\
+        order_by(FailureMode.inspection_type)
+    return [type for type, in types]
+
+
+def assign(fmeca_ids, types, unassigned=False):
+    """Assign the failures of a set of FMECAs to their RBIs.
+
+    ``fmeca_ids`` is a list or query of FMECA ids. Each failure whose
+    failure mode is inspected by one of ``types`` and is not time dependant
+    is assigned to the RBI of its FMECA with the same inspection type.
+    Failures previously assigned to an RBI of those types are released,
+    unless ``unassigned`` is set, in which case only the failures without
+    an RBI are assigned."""
+    rbis = RBI.__table__
+    failure_modes = FailureMode.__table__
+    failures = Failure.__table__
+    candidates = and_(failure_modes.c.id == failures.c.failure_mode_id,
+                      or_(failure_modes.c.time_dependant.is_(None),
+                          failure_modes.c.time_dependant == False))
+    rbi_id = select([rbis.c.id]).\
+        where(rbis.c.fmeca_id == failures.c.fmeca_id).\
+        where(rbis.c.inspection_type == failure_modes.c.inspection_type).\
+        where(rbis.c.inspection_type.in_(types)).\
+        where(candidates).\
+        order_by(rbis.c.id).limit(1).as_scalar()
+    previous = select([rbis.c.id]).\
+        where(rbis.c.fmeca_id.in_(fmeca_ids)).\
+        where(rbis.c.inspection_type.in_(types))
+    released = failures.c.rbi_id.is_(None)
+    if not unassigned:
+        released = or_(released, failures.c.rbi_id.in_(previous))
+    db.session.execute(failures.update().
+                       where(failures.c.fmeca_id.in_(fmeca_ids)).
+                       where(released).
+                       values(rbi_id=rbi_id))
+    touch(failures)
+
+
+def run_facility(facility, types=None):
+    """Create an RBI for every component of a facility and every inspection
+    type, and assign the failures to them.
+
+    Existing RBIs are reused. Returns the results of the facility, see
+    :func:`results`."""
+    if types is None:
+        types = inspection_types()
+    fmeca_ids = db.session.query(FMECA.id).join(Component).join(Area).\
+        filter(Area.facility_id == facility.id)
+    existing = set(db.session.query(RBI.fmeca_id, RBI.inspection_type).
+                   filter(RBI.fmeca_id.in_(fmeca_ids)))
+    bulk_insert(RBI.__table__,
+                [{'fmeca_id': fmeca_id, 'inspection_type': type}
+                 for fmeca_id, in fmeca_ids for type in types
+                 if (fmeca_id, type) not in existing])
+    assign(fmeca_ids, types)
+    return results(facility, types)
+
+
+def results(facility, types=None):
+    """Return the RBIs of a facility as a list of :class:`RBIResult`, with
+    the number of failures, the annual commercial risk and the inspection
+    interval of each RBI.
+
+    The interval is ``None`` for an RBI without risk."""
+    rows = db.session.query(RBI.id, Component.id, Component.ident,
+                            RBI.inspection_type,
+                            func.count(Failure.id),
+                            func.sum(FailureRisk.risk),
+                            Facility.risk_cut_off).\
+        join(FMECA, FMECA.id == RBI.fmeca_id).\
+        join(Component, Component.id == FMECA.component_id).\
+        join(Area, Area.id == Component.area_id).\
+        join(Facility, Facility.id == Area.facility_id).\
+        outerjoin(Failure, Failure.rbi_id == RBI.id).\
+        outerjoin(FailureRisk, FailureRisk.failure_id == Failure.id).\
+        filter(Facility.id == facility.id).\
+        group_by(RBI.id, Component.id, Component.ident, RBI.inspection_type,
+                 Facility.risk_cut_off).\
+        order_by(Component.ident, RBI.inspection_type)
+    if types is not None:
+        rows = rows.filter(RBI.inspection_type.in_(types))
+
+    pending = pending_risks()
+    changes = deltas(pending, 'rbi_id') if pending is not None else {}
+    results = []
+    for id, component_id, ident, type, failures, risk, cut_off in rows:
+        risk = (risk or 0) + changes.get(id, 0)
+        interval = cut_off / risk if risk and cut_off is not None else None
+        results.append(RBIResult(id, component_id, ident, type, failures,
+                                 risk, interval))
+    return results
@@ -0,0 +1,78 @@
+"""Row models for the FMECA and RBI pages.
+
+The pages list many failures together with their sub-component, failure
+mode, consequence and risk. Walking those relationships from each
+:class:`~app.models.Failure` issues several queries per row, so the rows are
+instead loaded with a single joined query, with the probability, cost and
+risk read from the materialized failure risks of :mod:`app.rollups`.
+"""
+from collections import namedtuple
+from . import db
+from .models import SubComponent, Consequence, FailureMode, Failure, \
+    FailureRisk
+from .rollups import pending_risks
+
+FailureRow = namedtuple('FailureRow', [
+    'id', 'subcomponent_category', 'subcomponent_ident', 'failure_mode',
+    'time_dependant', 'mean_time_to_failure', 'detectable', 'inspection_type',
+    'consequence', 'probability', 'total_cost', 'risk'])
+
+RBISummary = namedtuple('RBISummary', ['inspection_type', 'risk_cut_off',
+                                       'risk', 'inspection_interval',
+                                       'failures'])
+
+
+def failure_rows(*criterion):
+    """Return a list of :class:`FailureRow`, ordered by failure id, for the
+    failures matching the given criteria.
+
+    Probabilities, costs and risks that cannot be evaluated are NaN."""
+    pending = pending_risks()
+    fresh = pending.fresh if pending is not None else {}
+    rows = db.session.query(Failure.id, SubComponent.category,
+                            SubComponent.ident, FailureMode.description,
+                            FailureMode.time_dependant,
+                            FailureMode.mean_time_to_failure,
+                            FailureMode.detectable,
+                            FailureMode.inspection_type, Consequence.name,
+                            FailureRisk.probability, FailureRisk.total_cost,
+                            FailureRisk.risk).\
+        outerjoin(SubComponent, SubComponent.id == Failure.subcomponent_id).\
+        outerjoin(FailureMode, FailureMode.id == Failure.failure_mode_id).\
+        outerjoin(Consequence, Consequence.id == Failure.consequence_id).\
+        outerjoin(FailureRisk, FailureRisk.failure_id == Failure.id).\
+        filter(*criterion).order_by(Failure.id)
+    results = []
+    for row in rows:
+        values = row[-3:]
+        if row.id in fresh:
+            values = [fresh[row.id][key]
+                      for key in ('probability', 'total_cost', 'risk')]
+        results.append(FailureRow(*row[:-3],
+                                  *[_number(value) for value in values]))
+    return results
+
+
+def fmeca_rows(fmeca):
+    """Return the failure rows of an FMECA."""
+    return failure_rows(Failure.fmeca_id == fmeca.id)
+
+
+def rbi_rows(rbi):
+    """Return the failure rows of an RBI."""
+    return failure_rows(Failure.rbi_id == rbi.id)
+
+
+def rbi_summary(rbi, risk_cut_off, rows):
+    """Summarize an RBI from its failure rows.
+
+    The inspection interval is ``None`` for an RBI without risk."""
+    risk = sum(row.risk for row in rows if row.risk == row.risk)
+    interval = risk_cut_off / risk if risk and risk_cut_off is not None \
+        else None
+    return RBISummary(rbi.inspection_type, risk_cut_off, risk, interval,
+                      len(rows))
+
+
+def _number(value):
+    return float('nan') if value is None else value
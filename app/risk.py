@@ -0,0 +1,94 @@
+"""Vectorised risk evaluation kernel.
+
+The functions in this module work on columns of failure data (NumPy arrays
+or plain sequences, one entry per failure) so that the probability and
+commercial risk of a whole FMECA, area or facility are evaluated in a single
+call. They also accept scalars, which is how the properties of the
+:class:`~app.models.Failure` model use them.
+"""
+import numpy as np
+from .models import Failure, FailureMode, Consequence
+from .costs import get_resolver
+
+# probability multipliers applied by the RBI filters
+LAGGING = 0.5
+DETECTABLE = 1.0
+TIME_DEPENDANT = 0.0
+
+
+def detectability_multiplier(detectable):
+    """Return the probability multiplier for the ``detectable`` field of a
+    failure mode: failures whose detection lags are halved."""
+    return np.where(np.asarray(detectable, dtype=object) == 'Lagging',
+                    LAGGING, DETECTABLE)
+
+
+def probability(mean_time_to_failure, multiplier, time_dependant, t=1):
+    """Return the probability of failure within ``t`` years.
+
+    Time dependant failure modes are excluded from the RBI and have a zero
+    probability. A missing mean time to failure gives ``nan``."""
+    mttf = np.asarray(mean_time_to_failure, dtype=float)
+    time_dependant = np.asarray(time_dependant, dtype=object).astype(bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        failure_rate = 1 / mttf
+        p = np.asarray(multiplier) * (1 - np.exp(-failure_rate * t))
+    return np.where(time_dependant, TIME_DEPENDANT, p)
+
+
+def risk(probability, total_cost):
+    """Return the commercial risk of failures with the given probabilities
+    and total costs."""
+    return np.asarray(probability) * np.asarray(total_cost, dtype=float)
+
+
+def evaluate(mean_time_to_failure, multiplier, time_dependant, total_cost,
+             t=1):
+    """Return a ``(probability, risk)`` tuple of arrays for columns of
+    failure data."""
+    p = probability(mean_time_to_failure, multiplier, time_dependant, t)
+    return p, risk(p, total_cost)
+
+
+def load_columns(failures):
+    """Load the inputs of the kernel for a query of failures.
+
+    Returns a dictionary of arrays: ``id``, ``mean_time_to_failure``,
+    ``multiplier``, ``time_dependant``, ``weibull_shape``,
+    ``weibull_scale``, ``consequence_id`` and ``total_cost``. Failures
+    without a consequence have a zero cost."""
+    rows = failures.outerjoin(FailureMode,
+                              Failure.failure_mode_id == FailureMode.id).\
+        with_entities(Failure.id, FailureMode.mean_time_to_failure,
+                      FailureMode.detectable, FailureMode.time_dependant,
+                      FailureMode.weibull_shape, FailureMode.weibull_scale,
+                      Failure.consequence_id).\
+        order_by(Failure.id).all()
+    ids, mttf, detectable, time_dependant, shape, scale, consequence_ids = \
+        zip(*rows) if rows else ((),) * 7
+
+    costs = get_resolver().total_costs(Consequence.query.filter(
+        Consequence.id.in_(failures.with_entities(Failure.consequence_id))))
+
+    return {
+        'id': np.array(ids, dtype=int),
+        'mean_time_to_failure': np.array(mttf, dtype=float),
+        'multiplier': detectability_multiplier(detectable),
+        'time_dependant': np.array(time_dependant, dtype=object).astype(bool),
+        'weibull_shape': np.array(shape, dtype=float),
+        'weibull_scale': np.array(scale, dtype=float),
+        'consequence_id': np.array(consequence_ids, dtype=object),
+        'total_cost': np.array([costs.get(id, 0) for id in consequence_ids],
+                               dtype=float),
+    }
+
+
+def evaluate_failures(failures, t=1):
+    """Evaluate a query of failures in one call.
+
+    Returns a ``(ids, probability, risk)`` tuple of arrays ordered by
+    failure id."""
+    columns = load_columns(failures)
+    p, r = evaluate(columns['mean_time_to_failure'], columns['multiplier'],
+                    columns['time_dependant'], columns['total_cost'], t)
+    return columns['id'], p, r
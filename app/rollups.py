@@ -0,0 +1,392 @@
+"""Materialized risk roll-ups.
+
+The risk of every failure is stored in the ``failure_risks`` table together
+with the ids of its sub-component, component, area and facility, and the sum
+of those risks per sub-component, component, area and facility is stored in
+the ``risk_rollups`` table.
+
+Edits to the inputs of the risk calculation mark the affected failure risks
+as stale when they are flushed, and the session records what it changed in
+its ``info`` dictionary: stale risks, FMECAs with new failures and deleted
+failures. Before the session commits, :func:`refresh` recomputes those
+failures only and the roll-ups of the groups they belong to, so a commit
+that touched none of the inputs runs no query at all.
+
+Readers never write. Within a transaction that has pending changes,
+:func:`rollup`, :func:`rbi_risk` and the other readers evaluate the changed
+failures on the fly and add the differences to the stored numbers.
+
+Writes made outside of the session, on a connection of its own, are not
+tracked: call :func:`refresh` afterwards, which then checks every stored
+risk.
+"""
+from collections import defaultdict, namedtuple
+import math
+from sqlalchemy import and_, event, false, func, inspect, or_, select, true
+from sqlalchemy.orm import Query, Session
+from . import db
+from .database import CHUNK_SIZE, chunks
+from .models import Facility, Area, Component, SubComponent, Consequence, \
+    VesselTrip, Vessel, FailureMode, Failure, FailureRisk, RiskRollup
+from .generation import bulk_insert
+from .risk import evaluate, load_columns
+
+LEVELS = ('subcomponent', 'component', 'area', 'facility')
+
+# attributes that the risk of a failure depends on, per model
+INPUTS = {
+    FailureMode: ('mean_time_to_failure', 'detectable', 'time_dependant'),
+    Consequence: ('mean_time_to_repair', 'replacement_cost',
+                  'deferred_prod_rate', 'facility_id', 'component_id'),
+    VesselTrip: ('active_repair_time', 'vessel_id', 'consequence_id'),
+    Vessel: ('day_rate', 'mob_time'),
+    Facility: ('deferred_prod_cost',),
+    Area: ('equity_share',),
+    Component: ('area_id',),
+    SubComponent: ('component_id',),
+    Failure: ('subcomponent_id', 'failure_mode_id', 'consequence_id'),
+}
+
+Pending = namedtuple('Pending', ['outdated', 'fresh'])
+
+
+def affected_failures(model, ids):
+    """Return a clause selecting the ids of the failures whose risk depends
+    on the given instances of a model."""
+    failures = select([Failure.id])
+    if model is FailureMode:
+        return failures.where(Failure.failure_mode_id.in_(ids))
+    if model is Consequence:
+        return failures.where(Failure.consequence_id.in_(ids))
+    if model is Vessel:
+        return failures.where(Failure.consequence_id.in_(
+            select([VesselTrip.consequence_id]).
+            where(VesselTrip.vessel_id.in_(ids))))
+    if model is Facility:
+        return failures.where(Failure.consequence_id.in_(
+            select([Consequence.id]).where(Consequence.facility_id.in_(ids))))
+    if model is Area:
+        return failures.where(Failure.consequence_id.in_(
+            select([Consequence.id]).
+            where(Consequence.component_id == Component.id).
+            where(Component.area_id.in_(ids))))
+    if model is Component:
+        return failures.where(Failure.subcomponent_id.in_(
+            select([SubComponent.id]).
+            where(SubComponent.component_id.in_(ids))))
+    if model is SubComponent:
+        return failures.where(Failure.subcomponent_id.in_(ids))
+    return failures.where(Failure.id.in_(ids))
+
+
+class Changes(object):
+    """The changes of a session that its stored risks do not reflect yet.
+
+    ``fmeca_ids`` holds the FMECAs that gained failures and ``orphan_ids``
+    the failures that were deleted; ``None`` in either set stands for ids
+    that are unknown, in which case every failure is checked."""
+
+    def __init__(self):
+        self.stale = False
+        self.fmeca_ids = set()
+        self.orphan_ids = set()
+
+    def __bool__(self):
+        return self.stale or bool(self.fmeca_ids) or bool(self.orphan_ids)
+
+
+def changes(session=None):
+    """Return the pending :class:`Changes` of a session, by default the
+    database session."""
+    session = session or db.session()
+    return session.info.setdefault('rollups', Changes())
+
+
+def mark_stale(model, ids, connection=None):
+    """Mark the stored risk of the failures affected by the given instances
+    of a model as stale.
+
+    ``connection`` defaults to the database session. Rows marked stale on a
+    connection of its own are not tracked, see :func:`refresh`."""
+    target = connection or db.session()
+    ids = list(ids)
+    for chunk in chunks(ids):
+        target.execute(FailureRisk.__table__.update().
+                       where(FailureRisk.failure_id.in_(
+                           affected_failures(model, chunk))).
+                       values(stale=True))
+    if ids and isinstance(target, Session):
+        changes(target).stale = True
+
+
+def _mark_all_stale(session):
+    session.execute(FailureRisk.__table__.update().values(stale=True))
+    changes(session).stale = True
+
+
+def _changed(instance, attributes):
+    state = inspect(instance)
+    return any(state.attrs[attribute].history.has_changes()
+               for attribute in attributes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    changed = {}
+    new = set(session.new)
+    deleted = set(session.deleted)
+    dirty = set(session.dirty)
+    for instance in new | dirty | deleted:
+        model = type(instance)
+        if model not in INPUTS:
+            continue
+        if model is Failure and instance in new:
+            # a new failure has no stored risk yet
+            changes(session).fmeca_ids.add(instance.fmeca_id)
+        elif model is Failure and instance in deleted:
+            changes(session).orphan_ids.add(instance.id)
+        if instance in dirty and not _changed(instance, INPUTS[model]):
+            continue
+        if model is VesselTrip:
+            # a trip affects the failures of its old and new consequence
+            history = inspect(instance).attrs.consequence_id.history
+            ids = set(history.deleted or ()) | {instance.consequence_id}
+            changed.setdefault(Consequence, set()).update(ids - {None})
+        else:
+            changed.setdefault(model, set()).add(instance.id)
+
+    for model, ids in changed.items():
+        mark_stale(model, ids, session)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+def _after_bulk_update(update_context):
+    # the updated rows are unknown, so every stored risk is recomputed
+    if update_context.mapper.class_ in INPUTS:
+        _mark_all_stale(update_context.session)
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _after_bulk_delete(delete_context):
+    model = delete_context.mapper.class_
+    if model is Failure:
+        # the deleted failures are unknown
+        changes(delete_context.session).orphan_ids.add(None)
+    elif model in INPUTS:
+        _mark_all_stale(delete_context.session)
+
+
+# ahead of the other hooks, so that app.counters counts the writes of the
+# refresh whatever the order of the imports
+@event.listens_for(Session, 'before_commit', insert=True)
+def _before_commit(session):
+    if session is db.session():
+        session.flush()
+        pending = session.info.get('rollups')
+        if pending:
+            refresh(pending)
+        session.info.pop('rollups', None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    # the stale flags were rolled back with the edits
+    session.info.pop('rollups', None)
+
+
+def _ids_clause(column, ids, everything):
+    """Return a clause restricting a column to a set of ids, or
+    ``everything`` if some of them are unknown or they are too many to
+    bind."""
+    if None in ids or len(ids) > CHUNK_SIZE:
+        return everything
+    return column.in_(list(ids))
+
+
+def _queries(pending=None):
+    """Return the query of the failures whose risk must be computed and the
+    query of the stored risks that they replace or that are left behind by
+    deleted failures, for the given :class:`Changes` or, by default, for
+    the whole database."""
+    stale = db.session.query(FailureRisk.failure_id).filter(FailureRisk.stale)
+    missing = Failure.id.notin_(db.session.query(FailureRisk.failure_id))
+    orphaned = FailureRisk.failure_id.notin_(db.session.query(Failure.id))
+    if pending is None:
+        return (Failure.query.filter(or_(Failure.id.in_(stale), missing)),
+                FailureRisk.query.filter(or_(FailureRisk.stale, orphaned)))
+
+    targets = []
+    outdated = []
+    if pending.stale:
+        targets.append(Failure.id.in_(stale))
+        outdated.append(FailureRisk.stale)
+    if pending.fmeca_ids:
+        targets.append(and_(_ids_clause(Failure.fmeca_id, pending.fmeca_ids,
+                                        true()), missing))
+    if pending.orphan_ids:
+        outdated.append(and_(_ids_clause(FailureRisk.failure_id,
+                                         pending.orphan_ids, true()),
+                             orphaned))
+    return (Failure.query.filter(or_(*targets) if targets else false()),
+            FailureRisk.query.filter(or_(*outdated) if outdated else false()))
+
+
+def _evaluate(targets):
+    """Evaluate the selected failures. Returns a dictionary mapping their
+    ids to a row of the ``failure_risks`` table, with the id of their RBI
+    under ``rbi_id``."""
+    columns = load_columns(targets)
+    probability, risk = evaluate(columns['mean_time_to_failure'],
+                                 columns['multiplier'],
+                                 columns['time_dependant'],
+                                 columns['total_cost'])
+    keys = db.session.query(Failure.id, Failure.rbi_id,
+                            Failure.subcomponent_id,
+                            SubComponent.component_id, Component.area_id,
+                            Area.facility_id).\
+        outerjoin(SubComponent, SubComponent.id == Failure.subcomponent_id).\
+        outerjoin(Component, Component.id == SubComponent.component_id).\
+        outerjoin(Area, Area.id == Component.area_id).\
+        filter(Failure.id.in_(targets.with_entities(Failure.id))).\
+        order_by(Failure.id).all()
+
+    rows = {}
+    for (id, rbi_id, *group), p, c, r in zip(keys, probability,
+                                             columns['total_cost'], risk):
+        row = {'failure_id': id, 'rbi_id': rbi_id, 'stale': False,
+               'probability': _float(p), 'total_cost': _float(c),
+               'risk': _float(r)}
+        for level, group_id in zip(LEVELS, group):
+            row[level + '_id'] = group_id
+        rows[id] = row
+    return rows
+
+
+def refresh(pending=None):
+    """Recompute the stale and missing failure risks and the roll-ups of the
+    groups they belong to.
+
+    By default every stored risk is checked; the commit hook passes the
+    :class:`Changes` of the session instead. Returns the number of failures
+    recomputed."""
+    targets, outdated = _queries(pending)
+
+    # the groups of the outdated rows need new roll-ups, even if the failures
+    # no longer exist or have moved to another group
+    groups = {level: set() for level in LEVELS}
+    for row in outdated.with_entities(*[getattr(FailureRisk, level + '_id')
+                                        for level in LEVELS]):
+        for level, id in zip(LEVELS, row):
+            groups[level].add(id)
+    if not any(groups.values()) and \
+            not db.session.query(targets.exists()).scalar():
+        if pending is None:
+            db.session().info.pop('rollups', None)
+        return 0
+
+    rows = list(_evaluate(targets).values())
+    for row in rows:
+        del row['rbi_id']
+        for level in LEVELS:
+            groups[level].add(row[level + '_id'])
+
+    outdated.delete(synchronize_session=False)
+    bulk_insert(FailureRisk.__table__, rows)
+    for level, group_ids in groups.items():
+        _rollup(level, group_ids - {None})
+    if pending is None:
+        db.session().info.pop('rollups', None)
+    return len(rows)
+
+
+def _float(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _rollup(level, ids):
+    column = getattr(FailureRisk, level + '_id')
+    for chunk in chunks(ids):
+        RiskRollup.query.filter(RiskRollup.level == level,
+                                RiskRollup.entity_id.in_(chunk)).\
+            delete(synchronize_session=False)
+        sums = db.session.query(column, func.sum(FailureRisk.risk),
+                                func.count(FailureRisk.failure_id)).\
+            filter(column.in_(chunk)).group_by(column)
+        bulk_insert(RiskRollup.__table__,
+                    [{'level': level, 'entity_id': id, 'risk': risk or 0,
+                      'failures': failures}
+                     for id, risk, failures in sums])
+
+
+def pending_risks():
+    """Evaluate the failures changed by the database session since the
+    stored risks were last refreshed, without writing anything.
+
+    Returns ``None`` if nothing changed, otherwise a :class:`Pending` whose
+    ``outdated`` is the list of the stored rows no longer valid and whose
+    ``fresh`` maps the ids of the changed failures to their new row, as
+    dictionaries keyed like the ``failure_risks`` table plus ``rbi_id``."""
+    pending = db.session().info.get('rollups')
+    if not pending:
+        return None
+    targets, outdated = _queries(pending)
+    columns = [FailureRisk.failure_id, FailureRisk.risk, Failure.rbi_id] + \
+        [getattr(FailureRisk, level + '_id') for level in LEVELS]
+    rows = outdated.with_entities(*columns).\
+        outerjoin(Failure, Failure.id == FailureRisk.failure_id)
+    return Pending([dict(zip([column.key for column in columns], row))
+                    for row in rows], _evaluate(targets))
+
+
+def deltas(pending, key):
+    """Return a dictionary mapping the values of ``key`` (a group column
+    such as ``'component_id'``, or ``'rbi_id'``) to the change in risk that
+    the :class:`Pending` failures make to them."""
+    deltas = defaultdict(float)
+    for row in pending.outdated:
+        deltas[row[key]] -= row['risk'] or 0
+    for row in pending.fresh.values():
+        deltas[row[key]] += row['risk'] or 0
+    deltas.pop(None, None)
+    return deltas
+
+
+def rollup(level, ids=None):
+    """Return a dictionary mapping entity ids to their annual commercial risk
+    for a level of the hierarchy (``'subcomponent'``, ``'component'``,
+    ``'area'`` or ``'facility'``)."""
+    rows = db.session.query(RiskRollup.entity_id, RiskRollup.risk).\
+        filter(RiskRollup.level == level)
+    if ids is not None:
+        rows = rows.filter(RiskRollup.entity_id.in_(ids))
+    risks = dict(rows)
+
+    pending = pending_risks()
+    if pending is not None:
+        wanted = None
+        if isinstance(ids, Query):
+            wanted = {id for id, in ids}
+        elif ids is not None:
+            wanted = set(ids)
+        for id, delta in deltas(pending, level + '_id').items():
+            if wanted is None or id in wanted:
+                risks[id] = risks.get(id, 0) + delta
+    return risks
+
+
+def risk(level, id):
+    """Return the annual commercial risk of a single entity."""
+    return rollup(level, [id]).get(id, 0)
+
+
+def rbi_risk(rbi_id):
+    """Return the annual commercial risk of the failures assigned to an
+    RBI."""
+    total = db.session.query(func.sum(FailureRisk.risk)).\
+        join(Failure, Failure.id == FailureRisk.failure_id).\
+        filter(Failure.rbi_id == rbi_id).scalar() or 0
+    pending = pending_risks()
+    if pending is not None:
+        total += deltas(pending, 'rbi_id').get(rbi_id, 0)
+    return total
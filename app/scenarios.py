@@ -0,0 +1,271 @@
+"""What-if scenarios.
+
+A :class:`~app.models.Scenario` asks how the risk of a facility changes
+when some of its inputs do, e.g. day rates rising 20%. Rather than a copy
+of the facility, it stores a sparse list of overrides: a field of one
+facility, area, vessel, consequence or failure mode, or of every one of a
+kind in the facility when the entity id is left out, set to a value or
+scaled by a factor. The fields that can be overridden are listed in
+:data:`~app.models.SCENARIO_FIELDS`.
+
+:func:`compare` evaluates a scenario against its base. The base risks come
+from the materialized failure risks and roll-ups of :mod:`app.rollups`, so
+only the failures depending on an overridden entity are evaluated again,
+through the overlay, and the differences are added to the base risks of
+their components and RBIs.
+"""
+from collections import defaultdict, namedtuple
+import numpy as np
+from sqlalchemy import false, or_, select, true
+from . import db
+from .models import Facility, Area, Component, Consequence, VesselTrip, \
+    Vessel, FailureMode, Failure, FailureRisk, ScenarioOverride
+from .risk import detectability_multiplier, probability, risk
+from .rollups import affected_failures, pending_risks, rollup
+from .rbi import results
+
+MODELS = {
+    'facility': Facility,
+    'area': Area,
+    'vessel': Vessel,
+    'consequence': Consequence,
+    'failure_mode': FailureMode,
+}
+
+ComponentDelta = namedtuple('ComponentDelta', ['component_id', 'ident',
+                                               'base_risk', 'scenario_risk',
+                                               'delta'])
+
+RBIDelta = namedtuple('RBIDelta', ['rbi_id', 'component_id', 'ident',
+                                   'inspection_type', 'base_risk',
+                                   'scenario_risk', 'base_interval',
+                                   'scenario_interval'])
+
+Comparison = namedtuple('Comparison', ['scenario_id', 'base_risk',
+                                       'scenario_risk', 'delta',
+                                       'evaluated', 'components', 'rbis'])
+
+
+class Overlay(object):
+    """Reads the inputs of the risk calculation through the overrides of a
+    scenario."""
+
+    def __init__(self, overrides):
+        self._overrides = defaultdict(dict)
+        for override in overrides:
+            self._overrides[override.model, override.field][
+                override.entity_id] = (override.value, override.factor)
+
+    def get(self, model, entity_id, field, base):
+        """Return the value of a field of an entity in the scenario. An
+        override of the entity takes precedence over an override of every
+        entity of its kind."""
+        overrides = self._overrides.get((model, field))
+        if not overrides:
+            return base
+        override = overrides.get(entity_id, overrides.get(None))
+        if override is None:
+            return base
+        value, factor = override
+        if value is not None:
+            return value
+        return None if base is None else base * factor
+
+    def touched(self):
+        """Return a dictionary mapping the kinds of entity whose risk inputs
+        are overridden to the set of their ids, ``None`` standing for all of
+        them."""
+        touched = defaultdict(set)
+        for (model, field), overrides in self._overrides.items():
+            if field != 'risk_cut_off':
+                touched[model].update(overrides)
+        return touched
+
+
+def _entity_ids(model, facility_id):
+    """Return a clause selecting the ids of the entities of a kind in a
+    facility."""
+    if model is Facility:
+        return select([Facility.id]).where(Facility.id == facility_id)
+    return select([model.id]).where(model.facility_id == facility_id)
+
+
+def missing_entities(facility, overrides):
+    """Return the ``(model, entity_id)`` pairs, in order, of the overrides
+    naming an entity that is not part of the facility. Failure modes are
+    shared by every facility."""
+    wanted = defaultdict(set)
+    for override in overrides:
+        if override.entity_id is not None:
+            wanted[override.model].add(override.entity_id)
+    missing = []
+    for name, ids in sorted(wanted.items()):
+        model = MODELS[name]
+        found = db.session.query(model.id).filter(model.id.in_(list(ids)))
+        if model is not FailureMode:
+            found = found.filter(model.id.in_(_entity_ids(model,
+                                                          facility.id)))
+        missing.extend((name, id)
+                       for id in sorted(ids - {id for id, in found}))
+    return missing
+
+
+def affected(overlay, facility_id):
+    """Return a clause selecting the ids of the failures of a facility whose
+    risk depends on an overridden input."""
+    clauses = []
+    for name, ids in overlay.touched().items():
+        model = MODELS[name]
+        if None not in ids:
+            ids = list(ids)
+        elif model is FailureMode:
+            # the failure modes are shared by every facility
+            clauses.append(true())
+            continue
+        else:
+            ids = _entity_ids(model, facility_id)
+        clauses.append(FailureRisk.failure_id.in_(
+            affected_failures(model, ids)))
+    return select([FailureRisk.failure_id]).\
+        where(FailureRisk.facility_id == facility_id).\
+        where(or_(*clauses) if clauses else false())
+
+
+def total_costs(overlay, consequence_ids):
+    """Return a dictionary mapping the id of each selected consequence to
+    its total cost in the scenario, or ``nan`` for missing inputs."""
+    rows = db.session.query(Consequence.id, Consequence.mean_time_to_repair,
+                            Consequence.deferred_prod_rate,
+                            Consequence.replacement_cost, Facility.id,
+                            Facility.deferred_prod_cost, Area.id,
+                            Area.equity_share).\
+        join(Facility, Facility.id == Consequence.facility_id).\
+        outerjoin(Component, Component.id == Consequence.component_id).\
+        outerjoin(Area, Area.id == Component.area_id).\
+        filter(Consequence.id.in_(consequence_ids))
+    trips = defaultdict(list)
+    for consequence_id, active_repair_time, vessel_id, mob_time, day_rate \
+            in db.session.query(VesselTrip.consequence_id,
+                                VesselTrip.active_repair_time, Vessel.id,
+                                Vessel.mob_time, Vessel.day_rate).\
+            join(Vessel, Vessel.id == VesselTrip.vessel_id).\
+            filter(VesselTrip.consequence_id.in_(consequence_ids)):
+        trips[consequence_id].append((
+            active_repair_time,
+            overlay.get('vessel', vessel_id, 'mob_time', mob_time),
+            overlay.get('vessel', vessel_id, 'day_rate', day_rate)))
+
+    get = overlay.get
+    costs = {}
+    for id, mttr, deferred_prod_rate, replacement_cost, facility_id, \
+            deferred_prod_cost, area_id, equity_share in rows:
+        try:
+            production_impact = \
+                get('consequence', id, 'mean_time_to_repair', mttr) * \
+                get('consequence', id, 'deferred_prod_rate',
+                    deferred_prod_rate) * \
+                get('facility', facility_id, 'deferred_prod_cost',
+                    deferred_prod_cost)
+            equipment_cost = get('consequence', id, 'replacement_cost',
+                                 replacement_cost)
+            for active_repair_time, mob_time, day_rate in trips[id]:
+                equipment_cost += (active_repair_time + mob_time) * day_rate
+            equipment_cost *= get('area', area_id, 'equity_share',
+                                  equity_share)
+        except TypeError:
+            costs[id] = float('nan')
+            continue
+        costs[id] = production_impact + equipment_cost
+    return costs
+
+
+def evaluate(overlay, failure_ids):
+    """Evaluate the selected failures in the scenario. Returns a dictionary
+    mapping their ids to their annual risk."""
+    rows = db.session.query(Failure.id, Failure.failure_mode_id,
+                            FailureMode.mean_time_to_failure,
+                            FailureMode.detectable,
+                            FailureMode.time_dependant,
+                            Failure.consequence_id).\
+        outerjoin(FailureMode, FailureMode.id == Failure.failure_mode_id).\
+        filter(Failure.id.in_(failure_ids)).order_by(Failure.id).all()
+    if not rows:
+        return {}
+    ids, mode_ids, mttf, detectable, time_dependant, consequence_ids = \
+        zip(*rows)
+    costs = total_costs(overlay, select([Failure.consequence_id]).
+                        where(Failure.id.in_(failure_ids)))
+    mttf = [overlay.get('failure_mode', mode_id, 'mean_time_to_failure',
+                        value) for mode_id, value in zip(mode_ids, mttf)]
+    p = probability(mttf, detectability_multiplier(detectable),
+                    time_dependant)
+    r = np.nan_to_num(risk(p, [costs.get(id, 0) for id in consequence_ids]))
+    return {id: float(value) for id, value in zip(ids, r)}
+
+
+def _interval(risk_cut_off, risk):
+    return risk_cut_off / risk if risk and risk_cut_off is not None else None
+
+
+def compare(scenario):
+    """Compare a scenario with its base facility. Returns a
+    :class:`Comparison` of the risk of each component and the risk and
+    inspection interval of each RBI."""
+    facility = scenario.facility
+    overlay = Overlay(scenario.overrides.order_by(ScenarioOverride.id))
+    pending = pending_risks()
+    fresh = pending.fresh if pending is not None else {}
+
+    # the failures depending on an override, with their base risk
+    failure_ids = affected(overlay, facility.id)
+    rows = db.session.query(FailureRisk.failure_id, FailureRisk.component_id,
+                            FailureRisk.risk, Failure.rbi_id).\
+        join(Failure, Failure.id == FailureRisk.failure_id).\
+        filter(FailureRisk.failure_id.in_(failure_ids)).all()
+    risks = evaluate(overlay, failure_ids) if rows else {}
+    component_deltas = defaultdict(float)
+    rbi_deltas = defaultdict(float)
+    for id, component_id, base, rbi_id in rows:
+        if id in fresh:
+            base = fresh[id]['risk']
+        delta = risks.get(id, 0) - (base or 0)
+        component_deltas[component_id] += delta
+        if rbi_id is not None:
+            rbi_deltas[rbi_id] += delta
+
+    idents = db.session.query(Component.id, Component.ident).\
+        join(Area, Area.id == Component.area_id).\
+        filter(Area.facility_id == facility.id).order_by(Component.ident)
+    base_risks = rollup('component', db.session.query(Component.id).
+                        join(Area, Area.id == Component.area_id).
+                        filter(Area.facility_id == facility.id))
+    components = []
+    for id, ident in idents:
+        base = base_risks.get(id, 0)
+        delta = component_deltas.get(id, 0)
+        components.append(ComponentDelta(id, ident, base, base + delta,
+                                         delta))
+
+    cut_off = overlay.get('facility', facility.id, 'risk_cut_off',
+                          facility.risk_cut_off)
+    rbis = []
+    for result in results(facility):
+        scenario_risk = result.risk + rbi_deltas.get(result.rbi_id, 0)
+        rbis.append(RBIDelta(result.rbi_id, result.component_id,
+                             result.ident, result.inspection_type,
+                             result.risk, scenario_risk,
+                             result.inspection_interval,
+                             _interval(cut_off, scenario_risk)))
+
+    base_risk = sum(c.base_risk for c in components)
+    scenario_risk = sum(c.scenario_risk for c in components)
+    return Comparison(scenario.id, base_risk, scenario_risk,
+                      scenario_risk - base_risk, len(rows), components, rbis)
+
+
+def export_comparison(comparison):
+    """Return a scenario comparison as a dictionary."""
+    data = comparison._asdict()
+    data['components'] = [dict(c._asdict()) for c in comparison.components]
+    data['rbis'] = [dict(r._asdict()) for r in comparison.rbis]
+    return dict(data)
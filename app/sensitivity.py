@@ -0,0 +1,191 @@
+"""Sensitivity of the risk of an RBI to its inputs.
+
+The risk of an RBI is the sum over its failures of the probability of
+failure times the total cost of the consequence, where the total cost is::
+
+    mttr × deferred_prod_rate × deferred_prod_cost
+    + equity_share × (replacement_cost
+                      + Σ trips (active_repair_time + mob_time) × day_rate)
+
+Every input but the mean time to failure enters a single term of that sum
+linearly, so scaling it by ``1 ± variation`` changes the risk by
+``± variation`` times the share of the risk carried by its term. The
+shares are computed once for all the inputs from the failures of the RBI,
+and only the probabilities are recomputed to vary the mean time to
+failure. Day rates and mobilisation times are varied per vessel.
+
+As in the roll-ups, failures with a missing input carry no risk and are
+left out, so that the analysis starts from the risk of the RBI.
+"""
+from collections import Counter, defaultdict, namedtuple
+import numpy as np
+from . import db
+from .models import Area, Component, Consequence, Facility, FailureMode, \
+    Failure, Vessel, VesselTrip
+from .risk import detectability_multiplier, probability
+from .rollups import rbi_risk
+
+Sensitivity = namedtuple('Sensitivity', ['input', 'vessel_id', 'vessel',
+                                         'label',
+                                         'low_risk', 'high_risk',
+                                         'low_interval', 'high_interval',
+                                         'swing'])
+
+SensitivityAnalysis = namedtuple('SensitivityAnalysis', [
+    'variation', 'risk', 'inspection_interval', 'inputs'])
+
+LABELS = {
+    'mean_time_to_failure': 'Mean time to failure',
+    'mean_time_to_repair': 'Mean time to repair',
+    'deferred_prod_rate': 'Deferred production rate',
+    'deferred_prod_cost': 'Deferred production cost',
+    'replacement_cost': 'Replacement cost',
+    'equity_share': 'Equity share',
+    'active_repair_time': 'Active repair time',
+    'day_rate': 'Day rate',
+    'mob_time': 'Mobilisation time',
+}
+
+
+def _interval(risk_cut_off, risk):
+    return risk_cut_off / risk if risk and risk_cut_off is not None else None
+
+
+def load_terms(rbi_id):
+    """Load the failures of an RBI and split their risk into the terms of
+    its inputs.
+
+    Returns a ``(columns, shares, vessels)`` tuple: ``columns`` holds the
+    arrays needed to recompute the probabilities, with the ``probability``
+    and ``total_cost`` of each failure, ``shares`` maps each linear input,
+    or ``(input, vessel_id)`` for vessel inputs, to the risk carried by its
+    term, and ``vessels`` maps the id of each vessel to its abbreviation.
+    Failures with a missing input have a zero probability."""
+    rows = db.session.query(Failure.consequence_id,
+                            FailureMode.mean_time_to_failure,
+                            FailureMode.detectable,
+                            FailureMode.time_dependant,
+                            Consequence.mean_time_to_repair,
+                            Consequence.deferred_prod_rate,
+                            Consequence.replacement_cost,
+                            Facility.deferred_prod_cost,
+                            Area.equity_share).\
+        outerjoin(FailureMode, FailureMode.id == Failure.failure_mode_id).\
+        outerjoin(Consequence, Consequence.id == Failure.consequence_id).\
+        outerjoin(Facility, Facility.id == Consequence.facility_id).\
+        outerjoin(Component, Component.id == Consequence.component_id).\
+        outerjoin(Area, Area.id == Component.area_id).\
+        filter(Failure.rbi_id == rbi_id).order_by(Failure.id).all()
+    consequence_ids, mttf, detectable, time_dependant, mttr, \
+        deferred_prod_rate, replacement_cost, deferred_prod_cost, \
+        equity_share = zip(*rows) if rows else ((),) * 9
+
+    def column(values):
+        return np.array(values, dtype=float)
+
+    trips = db.session.query(VesselTrip.consequence_id,
+                             VesselTrip.active_repair_time, Vessel.id,
+                             Vessel.abbr, Vessel.mob_time, Vessel.day_rate).\
+        outerjoin(Vessel, Vessel.id == VesselTrip.vessel_id).\
+        filter(VesselTrip.consequence_id.in_(
+            [id for id in set(consequence_ids) if id is not None] or [None])).\
+        order_by(VesselTrip.id).all()
+    incomplete = {consequence_id for consequence_id, *inputs in trips
+                  if None in inputs[:2] or None in inputs[3:]}
+
+    multiplier = detectability_multiplier(detectable)
+    p = probability(mttf, multiplier, time_dependant)
+    equity_share = column(equity_share)
+    production = column(mttr) * column(deferred_prod_rate) * \
+        column(deferred_prod_cost)
+    replacement = equity_share * column(replacement_cost)
+    complete = ~np.isnan(p) & ~np.isnan(production) & \
+        ~np.isnan(replacement) & \
+        np.array([id is not None and id not in incomplete
+                  for id in consequence_ids], dtype=bool)
+    p = np.where(complete, p, 0.0)
+    production = np.where(complete, production, 0.0)
+    replacement = np.where(complete, replacement, 0.0)
+    equity_share = np.where(complete, equity_share, 0.0)
+
+    # the probability weighted equity share of each consequence scales the
+    # cost of its vessel trips
+    weights = defaultdict(float)
+    for consequence_id, weight in zip(consequence_ids, p * equity_share):
+        weights[consequence_id] += weight
+
+    shares = defaultdict(float)
+    trip_costs = defaultdict(float)
+    vessels = {}
+    for consequence_id, active_repair_time, vessel_id, abbr, mob_time, \
+            day_rate in trips:
+        if consequence_id in incomplete:
+            continue
+        vessels[vessel_id] = abbr
+        active = active_repair_time * day_rate
+        mobilisation = mob_time * day_rate
+        trip_costs[consequence_id] += active + mobilisation
+        weight = weights[consequence_id]
+        shares['active_repair_time'] += weight * active
+        shares[('mob_time', vessel_id)] += weight * mobilisation
+        shares[('day_rate', vessel_id)] += weight * (active + mobilisation)
+
+    trips = equity_share * np.array([trip_costs[id]
+                                     for id in consequence_ids], dtype=float)
+    production_risk = float(np.dot(p, production))
+    for input in ('mean_time_to_repair', 'deferred_prod_rate',
+                  'deferred_prod_cost'):
+        shares[input] = production_risk
+    shares['replacement_cost'] = float(np.dot(p, replacement))
+    shares['equity_share'] = float(np.dot(p, replacement + trips))
+
+    columns = {'mean_time_to_failure': column(mttf),
+               'multiplier': multiplier,
+               'time_dependant': np.array(time_dependant,
+                                          dtype=object).astype(bool),
+               'complete': complete,
+               'probability': p,
+               'total_cost': production + replacement + trips}
+    return columns, dict(shares), vessels
+
+
+def analyse(rbi, variation=0.1):
+    """Vary each input of the risk of an RBI by ``± variation`` and return a
+    :class:`SensitivityAnalysis` whose inputs are ranked by the swing of
+    the risk."""
+    columns, shares, vessels = load_terms(rbi.id)
+    # the terms cover the failures counted by the roll-ups, whose risk is
+    # the base of the analysis
+    terms = float(np.dot(columns['probability'], columns['total_cost']))
+    risk = rbi_risk(rbi.id)
+    risk_cut_off = rbi.fmeca.component.area.facility.risk_cut_off
+
+    changes = {key: (-variation * share, variation * share)
+               for key, share in shares.items()}
+    # a longer mean time to failure lowers the probability
+    low, high = [float(np.dot(np.where(columns['complete'], probability(
+        columns['mean_time_to_failure'] * factor, columns['multiplier'],
+        columns['time_dependant']), 0.0), columns['total_cost'])) - terms
+        for factor in (1 - variation, 1 + variation)]
+    changes['mean_time_to_failure'] = (low, high)
+
+    abbrs = Counter(vessels.values())
+    inputs = []
+    for key, (low, high) in changes.items():
+        input, vessel_id = key if isinstance(key, tuple) else (key, None)
+        vessel = vessels.get(vessel_id)
+        label = LABELS[input]
+        if vessel_id is not None:
+            # labels name the chart bars, so they must tell vessels apart
+            name = vessel or 'vessel'
+            if not vessel or abbrs[vessel] > 1:
+                name += ' #{}'.format(vessel_id)
+            label += ' ({})'.format(name)
+        inputs.append(Sensitivity(
+            input, vessel_id, vessel, label, risk + low, risk + high,
+            _interval(risk_cut_off, risk + low),
+            _interval(risk_cut_off, risk + high), abs(high - low)))
+    inputs.sort(key=lambda sensitivity: (-sensitivity.swing,
+                                         sensitivity.label))
+    return SensitivityAnalysis(variation, risk,
+                               _interval(risk_cut_off, risk), inputs)
@@ -0,0 +1,99 @@
+"""JSON encoders for API responses.
+
+The ``JSON_ENCODER`` setting selects the encoder used by the ``json``
+decorator and the NDJSON export: ``'orjson'``, ``'stdlib'`` or ``'auto'``,
+the default, which uses orjson when it is installed and the standard
+library otherwise. Both encoders produce compact output, handle dates,
+datetimes and numpy scalars, and only indent when the application runs in
+debug mode. JSON has no NaN or infinity, so both write non-finite numbers
+as ``null``.
+"""
+import datetime
+import decimal
+import json
+import math
+import numpy as np
+from flask import current_app, has_app_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, (np.floating, decimal.Decimal)):
+        return _finite(float(obj))
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist())
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
+def _finite(obj):
+    """Return a copy of an object with its non-finite floats replaced by
+    ``None``."""
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+def stdlib_dumps(obj, pretty=False):
+    """Encode an object to JSON bytes with the standard library."""
+    if pretty:
+        options = {'indent': 2, 'sort_keys': True}
+    else:
+        options = {'separators': (',', ':')}
+    try:
+        text = json.dumps(obj, default=_default, allow_nan=False, **options)
+    except ValueError:
+        # only walk the payload when it holds non-finite numbers
+        text = json.dumps(_finite(obj), default=_default, allow_nan=False,
+                          **options)
+    return text.encode('utf-8')
+
+
+def orjson_dumps(obj, pretty=False):
+    """Encode an object to JSON bytes with orjson."""
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=_default, option=option)
+
+
+ENCODERS = {'stdlib': stdlib_dumps}
+if orjson is not None:
+    ENCODERS['orjson'] = orjson_dumps
+
+
+def get_encoder(name=None):
+    """Return the encoder function of a name, by default the one configured
+    for the current application."""
+    if name is None:
+        name = current_app.config.get('JSON_ENCODER', 'auto') \
+            if has_app_context() else 'auto'
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    try:
+        return ENCODERS[name]
+    except KeyError:
+        raise ValueError('Unavailable JSON encoder: ' + name)
+
+
+def dumps(obj):
+    """Encode an object to JSON bytes with the configured encoder."""
+    pretty = has_app_context() and current_app.debug
+    return get_encoder()(obj, pretty=pretty)
+
+
+def json_response(obj):
+    """Return a JSON response for an object."""
+    return current_app.response_class(dumps(obj) + b'\n',
+                                      mimetype='application/json')
@@ -0,0 +1,275 @@
+"""Monte Carlo uncertainty of the commercial risk of a facility.
+
+The inputs of the risk calculation are point estimates. :func:`simulate`
+instead draws the uncertain inputs from distributions centred on them and
+evaluates the annual risk of every failure of a facility for every sample,
+as a samples × failures matrix, giving the 10th, 50th and 90th percentiles
+of the risk of each component and of the facility.
+
+The distribution of each input is set by the ``UNCERTAINTY_DISTRIBUTIONS``
+setting, which maps the name of a field to one of:
+
+* ``('triangular', low, high)``: a triangular distribution whose mode is
+  the point estimate and whose bounds are ``low`` and ``high`` times it;
+* ``('lognormal', sigma)``: a lognormal distribution whose median is the
+  point estimate and whose shape is ``sigma``.
+
+Fields left out keep their point estimate. Inputs are drawn once per
+failure mode, consequence, vessel trip and vessel, so that the failures
+sharing an input move together. Samples are evaluated in chunks small
+enough to bound the size of the matrices, optionally on a process pool,
+and every chunk has its own seed so the results do not depend on the
+number of workers.
+"""
+from collections import namedtuple
+from numbers import Integral
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from flask import current_app
+from . import db
+from .exceptions import ValidationError
+from .models import Facility, Area, Component, SubComponent, Consequence, \
+    VesselTrip, Vessel, FailureMode, Failure
+from .risk import detectability_multiplier, probability, risk
+
+# the inputs of a facility: point estimates per entity, and the index of
+# each failure, consequence and trip in the arrays of its parents
+Inputs = namedtuple('Inputs', [
+    'failure_ids', 'component_ids', 'component_starts', 'failure_mode',
+    'consequence', 'multiplier', 'time_dependant', 'mean_time_to_failure',
+    'mean_time_to_repair', 'deferred_prod_rate', 'replacement_cost',
+    'deferred_prod_cost', 'equity_share', 'trip_consequence', 'trip_vessel',
+    'active_repair_time', 'day_rate', 'mob_time'])
+
+Percentiles = namedtuple('Percentiles', ['p10', 'p50', 'p90', 'mean'])
+
+UncertaintyResult = namedtuple('UncertaintyResult', ['samples', 'facility',
+                                                     'components'])
+
+
+def _index(ids):
+    """Map each of a sequence of ids to its position."""
+    return {id: index for index, id in enumerate(ids)}
+
+
+def _float(values):
+    return np.array(values, dtype=float)
+
+
+def load_inputs(facility_id):
+    """Load the point estimates of the risk of the failures of a facility,
+    with one query per kind of entity. Returns :class:`Inputs`."""
+    failures = db.session.query(Failure.id, SubComponent.component_id,
+                                Failure.failure_mode_id,
+                                Failure.consequence_id).\
+        join(SubComponent, SubComponent.id == Failure.subcomponent_id).\
+        join(Component, Component.id == SubComponent.component_id).\
+        join(Area, Area.id == Component.area_id).\
+        filter(Area.facility_id == facility_id).\
+        order_by(SubComponent.component_id, Failure.id).all()
+    failure_ids, component_of, mode_of, consequence_of = \
+        zip(*failures) if failures else ((),) * 4
+
+    modes = db.session.query(FailureMode.id, FailureMode.mean_time_to_failure,
+                             FailureMode.detectable,
+                             FailureMode.time_dependant).\
+        filter(FailureMode.id.in_(set(mode_of) or [None])).\
+        order_by(FailureMode.id).all()
+    mode_ids, mttf, detectable, time_dependant = \
+        zip(*modes) if modes else ((),) * 4
+    mode_index = _index(mode_ids)
+
+    consequences = db.session.query(Consequence.id,
+                                    Consequence.mean_time_to_repair,
+                                    Consequence.deferred_prod_rate,
+                                    Consequence.replacement_cost,
+                                    Facility.deferred_prod_cost,
+                                    Area.equity_share).\
+        join(Facility, Facility.id == Consequence.facility_id).\
+        outerjoin(Component, Component.id == Consequence.component_id).\
+        outerjoin(Area, Area.id == Component.area_id).\
+        filter(Consequence.facility_id == facility_id).\
+        order_by(Consequence.id).all()
+    consequence_ids, mttr, deferred_prod_rate, replacement_cost, \
+        deferred_prod_cost, equity_share = \
+        zip(*consequences) if consequences else ((),) * 6
+    consequence_index = _index(consequence_ids)
+
+    trips = db.session.query(VesselTrip.consequence_id, VesselTrip.vessel_id,
+                             VesselTrip.active_repair_time).\
+        filter(VesselTrip.consequence_id.in_(consequence_ids or [None])).\
+        order_by(VesselTrip.id).all()
+    vessels = db.session.query(Vessel.id, Vessel.day_rate, Vessel.mob_time).\
+        filter(Vessel.id.in_({vessel_id for _, vessel_id, _ in trips}
+                             or [None])).\
+        order_by(Vessel.id).all()
+    vessel_ids, day_rate, mob_time = zip(*vessels) if vessels else ((),) * 3
+    vessel_index = _index(vessel_ids)
+    trips = [trip for trip in trips if trip[1] in vessel_index]
+
+    component_ids, component_starts = np.unique(
+        np.array(component_of, dtype=int), return_index=True)
+    # failures without a failure mode point at an extra mode without a mean
+    # time to failure, and failures without a consequence at an extra zero
+    # cost
+    no_failure_mode = len(mode_ids)
+    no_consequence = len(consequence_ids)
+    return Inputs(
+        failure_ids=np.array(failure_ids, dtype=int),
+        component_ids=component_ids,
+        component_starts=component_starts,
+        failure_mode=np.array([mode_index.get(id, no_failure_mode)
+                               for id in mode_of], dtype=int),
+        consequence=np.array([consequence_index.get(id, no_consequence)
+                              for id in consequence_of], dtype=int),
+        multiplier=detectability_multiplier(detectable + (None,)),
+        time_dependant=np.array(time_dependant + (False,),
+                                dtype=object).astype(bool),
+        mean_time_to_failure=_float(mttf + (None,)),
+        mean_time_to_repair=_float(mttr),
+        deferred_prod_rate=_float(deferred_prod_rate),
+        replacement_cost=_float(replacement_cost),
+        deferred_prod_cost=_float(deferred_prod_cost),
+        equity_share=_float(equity_share),
+        trip_consequence=np.array([consequence_index[id]
+                                   for id, _, _ in trips], dtype=int),
+        trip_vessel=np.array([vessel_index[id] for _, id, _ in trips],
+                             dtype=int),
+        active_repair_time=_float([time for _, _, time in trips]),
+        day_rate=_float(day_rate),
+        mob_time=_float(mob_time))
+
+
+def sample(random, estimates, distribution, samples):
+    """Draw samples × entities values of a field around its point
+    estimates."""
+    estimates = np.asarray(estimates, dtype=float)
+    shape = (samples, len(estimates))
+    if distribution is None:
+        return np.broadcast_to(estimates, shape)
+    kind, *params = distribution
+    if kind == 'triangular':
+        low, high = params
+        # numpy requires left < right, so degenerate estimates stay put
+        with np.errstate(invalid='ignore'):
+            spread = (estimates > 0) & (low < high)
+        safe = np.where(spread, estimates, 1.0)
+        values = random.triangular(low * safe, safe, high * safe, shape)
+        return np.where(spread, values, estimates)
+    if kind == 'lognormal':
+        sigma, = params
+        return estimates * random.lognormal(0, sigma, shape)
+    raise ValueError('Unknown distribution: ' + kind)
+
+
+def evaluate_chunk(inputs, distributions, samples, seed):
+    """Evaluate the risk of the components of a facility for a chunk of
+    samples. Returns a samples × components matrix."""
+    random = np.random.RandomState(seed)
+
+    def draw(field):
+        return sample(random, getattr(inputs, field),
+                      distributions.get(field), samples)
+
+    mttf = draw('mean_time_to_failure')
+    mttr = draw('mean_time_to_repair')
+    deferred_prod_rate = draw('deferred_prod_rate')
+    active_repair_time = draw('active_repair_time')
+    day_rate = draw('day_rate')
+    mob_time = draw('mob_time')
+
+    # the cost of each consequence, with vessel trips added per consequence
+    trips = (active_repair_time + mob_time[:, inputs.trip_vessel]) * \
+        day_rate[:, inputs.trip_vessel]
+    equipment = np.zeros((samples, len(inputs.replacement_cost)))
+    equipment += inputs.replacement_cost
+    np.add.at(equipment, (slice(None), inputs.trip_consequence), trips)
+    total_cost = mttr * deferred_prod_rate * inputs.deferred_prod_cost + \
+        inputs.equity_share * equipment
+    total_cost = np.hstack([total_cost, np.zeros((samples, 1))])
+
+    modes = inputs.failure_mode
+    p = probability(mttf[:, modes], inputs.multiplier[modes],
+                    inputs.time_dependant[modes])
+    # failures with missing inputs add nothing, as in the roll-ups
+    failure_risk = np.nan_to_num(risk(p, total_cost[:, inputs.consequence]))
+    if not len(inputs.component_starts):
+        return np.zeros((samples, 0))
+    return np.add.reduceat(failure_risk, inputs.component_starts, axis=1)
+
+
+def _percentiles(values):
+    p10, p50, p90 = np.percentile(values, [10, 50, 90], axis=0)
+    return Percentiles(p10, p50, p90, np.mean(values, axis=0))
+
+
+def sample_count(samples=None):
+    """Return the number of samples to draw, ``UNCERTAINTY_SAMPLES`` by
+    default. Raises :class:`~app.exceptions.ValidationError` unless it is
+    between 1 and ``UNCERTAINTY_MAX_SAMPLES``."""
+    config = current_app.config
+    if samples is None:
+        samples = config['UNCERTAINTY_SAMPLES']
+    limit = config['UNCERTAINTY_MAX_SAMPLES']
+    if isinstance(samples, bool) or not isinstance(samples, Integral) or \
+            not 0 < samples <= limit:
+        raise ValidationError(
+            'Invalid samples: must be between 1 and {}'.format(limit))
+    return samples
+
+
+def simulate(inputs, samples=None, seed=None, distributions=None,
+             workers=None):
+    """Run a Monte Carlo simulation of the annual risk of a facility.
+
+    The defaults are taken from the ``UNCERTAINTY_*`` settings. Returns an
+    :class:`UncertaintyResult` with the :class:`Percentiles` of the facility
+    and a dictionary of the percentiles of each component."""
+    config = current_app.config
+    samples = sample_count(samples)
+    if distributions is None:
+        distributions = config['UNCERTAINTY_DISTRIBUTIONS']
+    if workers is None:
+        workers = config['UNCERTAINTY_WORKERS']
+    chunk = max(1, min(samples, config['UNCERTAINTY_CHUNK_ELEMENTS'] //
+                       max(1, len(inputs.failure_ids))))
+    sizes = [min(chunk, samples - start) for start in range(0, samples, chunk)]
+    seeds = np.random.RandomState(seed).randint(2 ** 31 - 1, size=len(sizes))
+    arguments = [(inputs, distributions, size, seed)
+                 for size, seed in zip(sizes, seeds)]
+
+    if workers:
+        with ProcessPoolExecutor(workers) as executor:
+            chunks = list(executor.map(evaluate_chunk, *zip(*arguments)))
+    else:
+        chunks = [evaluate_chunk(*args) for args in arguments]
+    components = np.vstack(chunks)
+
+    per_component = _percentiles(components)
+    return UncertaintyResult(
+        samples, _percentiles(components.sum(axis=1)),
+        {int(id): Percentiles(*(float(values[index])
+                                for values in per_component))
+         for index, id in enumerate(inputs.component_ids)})
+
+
+def simulate_facility(facility_id, **kwargs):
+    """Load the inputs of a facility and simulate its risk, see
+    :func:`simulate`."""
+    sample_count(kwargs.get('samples'))
+    return simulate(load_inputs(facility_id), **kwargs)
+
+
+def export_result(result):
+    """Return a Monte Carlo result as a dictionary, with the ident of each
+    component."""
+    idents = dict(db.session.query(Component.id, Component.ident).
+                  filter(Component.id.in_(list(result.components) or
+                                          [None])))
+    return {
+        'samples': result.samples,
+        'facility': dict(result.facility._asdict()),
+        'components': [dict(percentiles._asdict(), id=id, ident=idents[id])
+                       for id, percentiles in
+                       sorted(result.components.items())],
+    }
@@ -0,0 +1,31 @@
+"""Cached URL building for API resources.
+
+Exporting a collection builds several external URLs per item. Instead of
+running the URL routing for each of them, :func:`resource_url` builds the
+URL of an endpoint once per host with a placeholder id and then only
+formats the id into it.
+"""
+from flask import has_request_context, request, url_for
+
+# stands in for the id while building a template
+PLACEHOLDER = 1234567890
+
+# largest number of cached templates, as the host comes from the request
+MAX_TEMPLATES = 256
+
+_templates = {}
+
+
+def resource_url(endpoint, id):
+    """Return the external URL of an endpoint that takes an ``id``."""
+    if id is None or not has_request_context():
+        return url_for(endpoint, id=id, _external=True)
+    key = (endpoint, request.url_root)
+    template = _templates.get(key)
+    if template is None:
+        if len(_templates) >= MAX_TEMPLATES:
+            _templates.clear()
+        url = url_for(endpoint, id=PLACEHOLDER, _external=True)
+        template = _templates[key] = url.replace('{', '{{').\
+            replace('}', '}}').replace(str(PLACEHOLDER), '{}')
+    return template.format(int(id))
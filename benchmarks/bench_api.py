@@ -0,0 +1,30 @@
+"""Benchmarks of the API collections and the NDJSON export."""
+import pytest
+
+from .conftest import prepare
+
+
+@pytest.fixture
+def get(client, facility):
+    prepare(facility)
+
+    def get(url):
+        def request():
+            rv = client.get(url.format(id=facility.id))
+            assert rv.status_code == 200
+            return rv.get_data()
+        return request
+    return get
+
+
+def bench_api_list(measure, get):
+    measure(get('/api/facilities/{id}/areas/?after=0'), warmup=True)
+
+
+def bench_api_expanded(measure, get):
+    measure(get('/api/facilities/{id}/areas/?after=0&expanded=1'),
+            warmup=True)
+
+
+def bench_api_export(measure, get):
+    measure(get('/api/facilities/{id}/export'), warmup=True)
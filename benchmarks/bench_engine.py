@@ -0,0 +1,55 @@
+"""Benchmarks of FMECA generation, the RBI runner, the risk roll-ups and the
+campaign optimizer."""
+from app import db
+from app.campaigns import plan
+from app.generation import generate_facility
+from app.models import FailureRisk
+from app.rbi import run_facility
+from app.rollups import refresh, rollup
+from .conftest import clear_fmecas, prepare
+
+
+def bench_fmeca_creation(measure, facility):
+    def create():
+        generate_facility(facility)
+        db.session.commit()
+
+    measure(create, setup=lambda: clear_fmecas(facility))
+
+
+def bench_rbi_run(measure, facility):
+    def run():
+        run_facility(facility)
+        db.session.commit()
+
+    measure(run, setup=lambda: prepare(facility, rbis=False))
+
+
+def bench_risk_rollup(measure, facility):
+    def mark_stale():
+        prepare(facility)
+        # mark the risks stale outside of the session, which does not track
+        # them, so that the measured refresh checks every stored risk
+        with db.engine.begin() as connection:
+            connection.execute(FailureRisk.__table__.update().
+                               where(FailureRisk.facility_id == facility.id).
+                               values(stale=True))
+
+    def run():
+        refresh()
+        risks = rollup('component')
+        db.session.commit()
+        return risks
+
+    measure(run, setup=mark_stale)
+
+
+def bench_campaign_plan(measure, facility):
+    prepare(facility)
+
+    def run():
+        campaigns = plan(facility, horizon=20)
+        assert campaigns.cost <= campaigns.individual_cost
+        return campaigns
+
+    measure(run)
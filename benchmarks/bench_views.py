@@ -0,0 +1,25 @@
+"""Benchmarks of the rendering of the HTML views."""
+from sqlalchemy import func
+
+from app import db
+from app.models import Area, Component, FMECA, Failure
+from .conftest import prepare
+
+
+def bench_fmeca_render(measure, client, facility):
+    prepare(facility)
+    # the component with the largest FMECA
+    component_id, = db.session.query(Component.id).\
+        join(Area, Area.id == Component.area_id).\
+        join(FMECA, FMECA.component_id == Component.id).\
+        join(Failure, Failure.fmeca_id == FMECA.id).\
+        filter(Area.facility_id == facility.id).\
+        group_by(Component.id).\
+        order_by(func.count(Failure.id).desc(), Component.id).first()
+
+    def render():
+        rv = client.get('/component/{}/fmeca'.format(component_id))
+        assert rv.status_code == 200
+        return rv.get_data()
+
+    measure(render, warmup=True)
@@ -0,0 +1,146 @@
+"""Fixtures of the pytest-benchmark suite.
+
+The suite runs against a scratch database, a temporary SQLite file unless
+``--database-url`` is given, with the failure mode catalogue of
+``fms.json`` and a synthetic facility per scale, see
+:mod:`benchmarks.synthetic`. The scales are set by ``--scales``.
+
+Every benchmark records the number of SQL statements of one run in its
+``extra_info``, next to the timings. Results are saved as JSON under
+``.benchmarks/`` and can be compared with a previous run::
+
+    pytest benchmarks --scales 1,10
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+import os
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.catalogue import read_catalogue, sync_catalogue
+from app.generation import generate_facility
+from app.models import Area, Component, FMECA, RBI, Failure
+from app.rbi import run_facility
+from config import config, TestingConfig
+from .synthetic import generate
+
+FMS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fms.json')
+
+# rounds per benchmark, fewer for the larger scales
+ROUNDS = {1: 10, 10: 5}
+DEFAULT_ROUNDS = 3
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('fmeca benchmarks')
+    group.addoption('--scales', default='1,10,100',
+                    help='comma separated scales of the synthetic facility '
+                         '(default: 1,10,100)')
+    group.addoption('--database-url', default=None,
+                    help='scratch database to run against, its tables are '
+                         'dropped (default: a temporary SQLite file)')
+
+
+def pytest_generate_tests(metafunc):
+    if 'scale' in metafunc.fixturenames:
+        scales = [int(scale) for scale in
+                  metafunc.config.getoption('scales').split(',')]
+        metafunc.parametrize('scale', scales, scope='session',
+                             ids=['{}x'.format(scale) for scale in scales])
+
+
+@pytest.fixture(scope='session')
+def app(request, tmpdir_factory):
+    url = request.config.getoption('database_url') or \
+        'sqlite:///' + str(tmpdir_factory.mktemp('benchmarks').join(
+            'db.sqlite'))
+
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = url
+
+    config['benchmark'] = BenchmarkConfig
+    app = create_app('benchmark')
+    ctx = app.app_context()
+    ctx.push()
+    db.drop_all()
+    db.create_all()
+    with open(FMS) as fp:
+        sync_catalogue(read_catalogue(fp))
+    db.session.commit()
+    yield app
+    db.session.remove()
+    db.drop_all()
+    ctx.pop()
+
+
+@pytest.fixture(scope='session')
+def facility(app, scale):
+    facility = generate(scale)
+    db.session.commit()
+    return facility
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    return app.test_client()
+
+
+class QueryCounter(object):
+    """Counts the SQL statements executed by an engine."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+@pytest.fixture
+def queries(app):
+    counter = QueryCounter()
+    event.listen(db.engine, 'before_cursor_execute', counter)
+    yield counter
+    event.remove(db.engine, 'before_cursor_execute', counter)
+
+
+@pytest.fixture
+def measure(benchmark, queries, scale):
+    """Benchmark a function, recording the number of SQL statements of its
+    last run. ``setup`` runs before every round and is not timed."""
+    def measure(target, setup=None, warmup=False):
+        def counted():
+            queries.count = 0
+            result = target()
+            benchmark.extra_info['queries'] = queries.count
+            return result
+        benchmark.extra_info['scale'] = scale
+        return benchmark.pedantic(counted, setup=setup, iterations=1,
+                                  rounds=ROUNDS.get(scale, DEFAULT_ROUNDS),
+                                  warmup_rounds=int(warmup))
+    return measure
+
+
+def fmeca_ids(facility):
+    """Return the ids of the FMECAs of a facility."""
+    return [id for id, in db.session.query(FMECA.id).join(Component).
+            join(Area).filter(Area.facility_id == facility.id)]
+
+
+def clear_fmecas(facility):
+    """Delete the FMECAs of a facility with their RBIs and failures."""
+    ids = fmeca_ids(facility)
+    Failure.query.filter(Failure.fmeca_id.in_(ids)).\
+        delete(synchronize_session=False)
+    RBI.query.filter(RBI.fmeca_id.in_(ids)).delete(synchronize_session=False)
+    FMECA.query.filter(FMECA.id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def prepare(facility, rbis=True):
+    """Make sure a facility has its FMECAs and, optionally, its RBIs."""
+    generate_facility(facility)
+    if rbis and not RBI.query.filter(RBI.fmeca_id.in_(
+            fmeca_ids(facility))).count():
+        run_facility(facility)
+    db.session.commit()
@@ -0,0 +1,64 @@
+"""Micro-benchmark of the JSON encoders of app.serialization.
+
+Compares the previous path, Flask's jsonify for pages and json.dumps for the
+export, with the encoders available to the json decorator, on an expanded
+collection page and an NDJSON export payload.
+
+Usage: python -m benchmarks.json_encoding [--repeat N]
+"""
+import argparse
+import json
+import math
+import timeit
+
+from flask import jsonify
+
+from app import create_app
+from app.serialization import ENCODERS
+
+
+def expanded_page(items=1000):
+    """Return a page like the expanded components of an area."""
+    return {'components': [
+        {'self_url': 'http://localhost/api/components/{}'.format(i),
+         'area_url': 'http://localhost/api/areas/{}'.format(i // 50),
+         'ident': 'M{:05d}'.format(i)} for i in range(items)],
+        'pages': {'page': 1, 'per_page': items, 'total': items, 'pages': 1}}
+
+
+def export_records(failures=20000):
+    """Return failure records like those of the NDJSON export."""
+    return [{'type': 'failure', 'id': i, 'subcomponent_id': i // 3,
+             'fmeca_id': i // 300, 'rbi_id': i // 300,
+             'failure_mode_id': i % 186, 'failure_mode': 'External leak',
+             'consequence_id': i % 40, 'consequence': 'Minor Intervention',
+             'probability': 1 - math.exp(-1 / (1 + i % 97)),
+             'total_cost': 1234567.89 + i, 'risk': 12345.6789 * (i % 13)}
+            for i in range(failures)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app('production')
+    page = expanded_page()
+    records = export_records()
+    with app.test_request_context('/'):
+        cases = [('previous', 'page', lambda: jsonify(page).get_data()),
+                 ('previous', 'export', lambda: [
+                     json.dumps(record) + '\n' for record in records])]
+        for name, encoder in sorted(ENCODERS.items()):
+            cases.append((name, 'page', lambda e=encoder: e(page)))
+            cases.append((name, 'export', lambda e=encoder: [
+                e(record) + b'\n' for record in records]))
+
+        print('{:<10}{:<10}{:>12}'.format('encoder', 'payload', 'best [ms]'))
+        for name, payload, case in cases:
+            best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+            print('{:<10}{:<10}{:>12.1f}'.format(name, payload, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
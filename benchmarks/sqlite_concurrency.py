@@ -0,0 +1,99 @@
+"""Concurrent read/write throughput of a file-backed SQLite database.
+
+Runs writer threads that insert failures in small transactions and reader
+threads that aggregate them, first with SQLite's default settings and then
+with the pragmas of the ``SQLITE_PRAGMAS`` setting, and reports operations
+per second and "database is locked" errors for each.
+
+Usage: python -m benchmarks.sqlite_concurrency [--seconds S] [--readers N]
+"""
+import argparse
+import functools
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+
+from app.database import apply_pragmas
+from config import BaseConfig
+
+
+def make_engine(path, pragmas):
+    # NullPool, as Flask-SQLAlchemy uses for SQLite files
+    engine = create_engine('sqlite:///' + path, poolclass=NullPool)
+    if pragmas:
+        event.listen(engine, 'connect',
+                     functools.partial(apply_pragmas, tuple(pragmas)))
+    engine.execute('CREATE TABLE IF NOT EXISTS failures '
+                   '(id INTEGER PRIMARY KEY, subcomponent_id INTEGER, '
+                   'risk FLOAT)')
+    return engine
+
+
+def run(engine, seconds, readers, writers):
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    stop = time.time() + seconds
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def write():
+        while time.time() < stop:
+            try:
+                with engine.begin() as connection:
+                    for i in range(20):
+                        connection.execute(
+                            'INSERT INTO failures (subcomponent_id, risk) '
+                            'VALUES (?, ?)', (i, i * 1.5))
+                count('writes')
+            except OperationalError:
+                count('locked')
+
+    def read():
+        while time.time() < stop:
+            try:
+                engine.execute('SELECT subcomponent_id, sum(risk) '
+                               'FROM failures GROUP BY subcomponent_id').\
+                    fetchall()
+                count('reads')
+            except OperationalError:
+                count('locked')
+
+    threads = [threading.Thread(target=write) for _ in range(writers)] + \
+        [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    args = parser.parse_args()
+
+    print('{:<10}{:>12}{:>12}{:>10}'.format('profile', 'reads/s', 'writes/s',
+                                            'locked'))
+    for name, pragmas in (('default', ()),
+                          ('tuned', BaseConfig.SQLITE_PRAGMAS)):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = make_engine(os.path.join(directory, 'bench.sqlite'),
+                                 pragmas)
+            counts = run(engine, args.seconds, args.readers, args.writers)
+            engine.dispose()
+        print('{:<10}{:>12.0f}{:>12.0f}{:>10}'.format(
+            name, counts['reads'] / args.seconds,
+            counts['writes'] / args.seconds, counts['locked']))
+
+
+if __name__ == '__main__':
+    main()
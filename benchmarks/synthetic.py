@@ -0,0 +1,154 @@
+"""Synthetic facility generator.
+
+Builds facilities that look like the example data of ``inputs/`` at a
+chosen scale: every unit of scale adds two areas of ten components, each
+component has three to eight sub-components, and the sub-component
+categories cycle through the whole failure mode catalogue in a shuffled
+order, so that every category of ``fms.json`` appears once every few
+components. Every component gets a consequence for each consequence
+description of the catalogue, with the costs and vessel trips of
+``inputs/consequences.csv`` varied by up to 30%.
+
+The generator is seeded, so the same scale and seed always give the same
+facility. Rows are written with bulk inserts, as the import pipeline does.
+
+Usage: python -m benchmarks.synthetic [--scale N] [--seed S]
+"""
+import argparse
+import random
+
+from app import create_app, db
+from app.generation import bulk_insert, bulk_insert_ids
+from app.models import Facility, Area, Component, SubComponent, \
+    Consequence, VesselTrip, Vessel, FailureMode
+
+AREAS_PER_SCALE = 2
+COMPONENTS_PER_AREA = 10
+SUBCOMPONENTS = (3, 8)
+
+# the vessels of inputs/vessels.csv used by the consequences
+VESSELS = [('ROVSV', 'ROV Support Vessel', 85000, 14),
+           ('TR', 'Topsides Resource', 7000, 1),
+           ('LWIV', 'Light Well Intervention Vessel', 160000, 30)]
+
+# mean time to repair, replacement cost, deferred production rate and
+# vessel trips of inputs/consequences.csv, by lower case name
+CONSEQUENCES = {
+    'change in operation': (30, 50000, 2700, [('ROVSV', 5), ('TR', 1)]),
+    'loss of redundancy': (30, 75000, 2700, [('ROVSV', 5), ('TR', 5)]),
+    'major intervention': (720, 6200000, 2700, [('LWIV', 14), ('ROVSV', 7)]),
+    'minor intervention': (180, 300000, 2700, [('ROVSV', 5), ('TR', 1)]),
+    'planned intervention': (60, 500000, 2700, [('ROVSV', 3), ('TR', 5)]),
+}
+
+# the profile of consequence descriptions missing from the table above
+DEFAULT_CONSEQUENCE = CONSEQUENCES['minor intervention']
+
+SERVICE_TYPES = ('Production', 'Water Injection', 'Gas Lift', 'Control')
+
+
+def catalogue():
+    """Return the sub-component categories and the consequence descriptions
+    of the failure mode catalogue in the database."""
+    categories = [category for category, in
+                  db.session.query(FailureMode.subcomponent_category).
+                  distinct().order_by(FailureMode.subcomponent_category)]
+    descriptions = [description for description, in
+                    db.session.query(FailureMode.consequence_description).
+                    distinct().
+                    filter(FailureMode.consequence_description.isnot(None)).
+                    order_by(FailureMode.consequence_description)]
+    return categories, descriptions
+
+
+def _vary(random, value, spread=0.3):
+    return value * random.uniform(1 - spread, 1 + spread)
+
+
+def generate(scale=1, seed=0, name=None):
+    """Add a synthetic facility to the session and return it.
+
+    The failure mode catalogue must be loaded first. The facility has no
+    FMECAs yet."""
+    rng = random.Random(seed)
+    name = name or 'synthetic-{}x-{}'.format(scale, seed)
+    categories, descriptions = catalogue()
+    if not categories:
+        raise RuntimeError('Load the failure mode catalogue first')
+
+    facility = Facility(name=name, risk_cut_off=302500, deferred_prod_cost=18,
+                        remaining_life=20)
+    vessels = {abbr: Vessel(abbr=abbr, name=vessel_name, day_rate=day_rate,
+                            mob_time=mob_time, facility=facility)
+               for abbr, vessel_name, day_rate, mob_time in VESSELS}
+    areas = [Area(name='{}-area-{}'.format(name, i),
+                  equity_share=round(rng.uniform(0.5, 1), 2),
+                  facility=facility)
+             for i in range(AREAS_PER_SCALE * scale)]
+    db.session.add(facility)
+    db.session.flush()
+
+    components = [{'ident': '{}-{}-{}'.format(name, i, j),
+                   'category': 'Manifold',
+                   'service_type': rng.choice(SERVICE_TYPES),
+                   'area_id': area.id}
+                  for i, area in enumerate(areas)
+                  for j in range(COMPONENTS_PER_AREA)]
+    bulk_insert_ids(Component.__table__, components, ('area_id', 'ident'))
+
+    order = list(categories)
+    rng.shuffle(order)
+    subcomponents = []
+    consequences = []
+    for component in components:
+        for i in range(rng.randint(*SUBCOMPONENTS)):
+            category = order[len(subcomponents) % len(order)]
+            subcomponents.append({'ident': 'SC{}'.format(i),
+                                  'category': category,
+                                  'component_id': component['id']})
+        for description in descriptions:
+            mttr, replacement_cost, deferred_prod_rate, trips = \
+                CONSEQUENCES.get(description.lower(), DEFAULT_CONSEQUENCE)
+            consequences.append({
+                'name': description,
+                'mean_time_to_repair': round(_vary(rng, mttr), 1),
+                'replacement_cost': int(_vary(rng, replacement_cost)),
+                'deferred_prod_rate': round(_vary(rng, deferred_prod_rate)),
+                'component_id': component['id'],
+                'facility_id': facility.id,
+                'trips': trips})
+    bulk_insert(SubComponent.__table__, subcomponents)
+
+    trips = [consequence.pop('trips') for consequence in consequences]
+    bulk_insert_ids(Consequence.__table__, consequences,
+                    ('component_id', 'name'))
+    bulk_insert(VesselTrip.__table__, [
+        {'consequence_id': consequence['id'],
+         'vessel_id': vessels[abbr].id,
+         'active_repair_time': round(_vary(rng, active_repair_time), 1)}
+        for consequence, consequence_trips in zip(consequences, trips)
+        for abbr, active_repair_time in consequence_trips])
+    return facility
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--config', default='development')
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context():
+        facility = generate(args.scale, args.seed)
+        db.session.commit()
+        print('{}: {} components, {} sub-components'.format(
+            facility.name,
+            Component.query.join(Area).
+            filter(Area.facility_id == facility.id).count(),
+            SubComponent.query.join(Component).join(Area).
+            filter(Area.facility_id == facility.id).count()))
+
+
+if __name__ == '__main__':
+    main()
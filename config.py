@@ -8,6 +8,66 @@ class BaseConfig:
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'hard to guess string'
+    # connection pool of server databases, unused with SQLite
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE') or 10)
+    DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW') or 20)
+    DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE')
+                                or 1800)
+    DATABASE_POOL_TIMEOUT = int(os.environ.get('DATABASE_POOL_TIMEOUT') or 30)
+    # run on every new SQLite connection, in order
+    SQLITE_PRAGMAS = (
+        ('busy_timeout', 5000),
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('cache_size', -64000),
+        ('mmap_size', 268435456),
+    )
+    # largest page of an API collection paginated with ?after=<id>
+    API_KEYSET_MAX_PER_PAGE = int(os.environ.get('API_KEYSET_MAX_PER_PAGE')
+                                  or 1000)
+    # 'orjson', 'stdlib' or 'auto' to use orjson when it is installed
+    JSON_ENCODER = os.environ.get('JSON_ENCODER') or 'auto'
+    # background jobs: 'thread', 'process' or 'inline' to run them in the
+    # request, see app/jobs.py
+    JOBS_EXECUTOR = os.environ.get('JOBS_EXECUTOR') or 'thread'
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS') or 2)
+    # seconds after which a job still running is taken for one whose worker
+    # died, and marked as failed
+    JOBS_TIMEOUT = int(os.environ.get('JOBS_TIMEOUT') or 3600)
+    # annual rate discounting the costs of a life-of-field projection
+    PROJECTION_DISCOUNT_RATE = float(
+        os.environ.get('PROJECTION_DISCOUNT_RATE') or 0.08)
+    # longest projection horizon in years, bounding its years × failures
+    # matrices
+    PROJECTION_MAX_HORIZON = int(
+        os.environ.get('PROJECTION_MAX_HORIZON') or 100)
+    # Monte Carlo risk uncertainty, see app/uncertainty.py
+    UNCERTAINTY_SAMPLES = int(os.environ.get('UNCERTAINTY_SAMPLES') or 10000)
+    UNCERTAINTY_MAX_SAMPLES = 100000
+    # largest samples × failures matrix evaluated at once
+    UNCERTAINTY_CHUNK_ELEMENTS = 2000000
+    # size of the process pool, 0 to evaluate in the calling process
+    UNCERTAINTY_WORKERS = int(os.environ.get('UNCERTAINTY_WORKERS') or 0)
+    UNCERTAINTY_DISTRIBUTIONS = {
+        'mean_time_to_failure': ('lognormal', 0.5),
+        'mean_time_to_repair': ('triangular', 0.8, 1.5),
+        'deferred_prod_rate': ('triangular', 0.8, 1.2),
+        'active_repair_time': ('triangular', 0.8, 1.5),
+        'day_rate': ('triangular', 0.9, 1.3),
+        'mob_time': ('triangular', 0.8, 1.5),
+    }
+    # inspection campaigns, see app/campaigns.py
+    CAMPAIGN_HORIZON = 20
+    CAMPAIGN_INSPECTION_DAYS = 1.0
+    CAMPAIGN_TRANSIT_DAYS = 0.5
+    # vessel abbreviations able to do each inspection type, all by default
+    CAMPAIGN_VESSELS = {}
+    # per-request SQL and latency metrics, see app/instrumentation.py
+    INSTRUMENTATION = bool(os.environ.get('INSTRUMENTATION'))
+    INSTRUMENTATION_BUDGET_MS = int(os.environ.get('INSTRUMENTATION_BUDGET_MS')
+                                    or 500)
+    INSTRUMENTATION_QUERY_BUDGET = \
+        int(os.environ.get('INSTRUMENTATION_QUERY_BUDGET') or 50)
 
     @staticmethod
     def init_app(app):
@@ -28,6 +88,7 @@ class TestingConfig(BaseConfig):
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
         'sqlite://'
     WTF_CSRF_ENABLED = False
+    JOBS_EXECUTOR = 'inline'
 
 
 class ProductionConfig(BaseConfig):
@@ -1,6 +1,5 @@
 import os
 import click
-import json
 # import subprocess
 # import sys
 
@@ -69,89 +68,102 @@ def createdb(drop_first):
     db.create_all()
 
 
-@app.cli.command()
-def load_fms():
-    """Seeds the database."""
+def sync_fms(path='fms.json', delete=False):
+    from app.catalogue import read_catalogue, sync_catalogue
+
+    with open(path) as fp:
+        changes = sync_catalogue(read_catalogue(fp), delete)
+    print('Failure modes: {} inserted, {} updated, {} deleted, {} unchanged'.
+          format(*changes))
 
-    fms_json = json.load(open('fms.json'))
-    for sc in fms_json:
-        for fm_json in fms_json[sc]:
-            fm = FailureMode(subcomponent_category=sc,
-                             description=fm_json,
-                             time_dependant=fms_json[sc][fm_json]["time_dependent"],
-                             mean_time_to_failure=fms_json[sc][fm_json]["mean_time_to_failure"],
-                             detectable=fms_json[sc][fm_json]["detectable"],
-                             inspection_type=fms_json[sc][fm_json]["inspection_type"],
-                             consequence_description=fms_json[sc][fm_json]["consequence_description"])
-            db.session.add(fm)
+
+@app.cli.command()
+@click.option('--path', default='fms.json')
+@click.option('--delete', is_flag=True)
+def load_fms(path, delete):
+    """Loads the failure mode catalogue. With --delete, the failure modes
+    missing from it are deleted together with their failures."""
+    sync_fms(path, delete)
     db.session.commit()
 
 
+def open_csv(path):
+    return open(path, newline='', encoding='utf-8-sig')
+
+
 @app.cli.command()
-def example():
-    import csv
+@click.option('--batch_size', default=1000)
+def example(batch_size):
+    from app.importer import import_vessels, import_consequences, \
+        import_subcomponents
 
     f = Facility(name='Foinaven', risk_cut_off=302500,
                  deferred_prod_cost=18)
+    a = Area(name='DC1', equity_share=0.72, facility=f)
+    c = Component(ident='P11', category='Tree',
+                  service_type='Production', area=a)
     db.session.add(f)
+    db.session.flush()
 
-    vessels_file = open('inputs/vessels.csv')
-    vessels = csv.reader(vessels_file)
+    with open_csv('inputs/vessels.csv') as lines:
+        print(import_vessels(f.id, lines, batch_size))
+    with open_csv('inputs/consequences.csv') as lines:
+        print(import_consequences(f.id, c.id, lines, batch_size))
+    with open_csv('inputs/subcomponents.csv') as lines:
+        print(import_subcomponents(f.id, c.id, lines, batch_size))
 
-    for vessel in vessels:
-        v = Vessel(name=vessel[0], abbr=vessel[1], day_rate=vessel[2],
-                   mob_time=vessel[3], facility=f)
-        db.session.add(v)
-
-    a = Area(name='DC1', equity_share=0.72, facility=f)
-    db.session.add(a)
+    db.session.commit()
 
-    c = Component(ident='P11', category='Tree',
-                  service_type='Production', area=a)
-    db.session.add(a)
-
-    consequences_file = open('inputs/consequences.csv')
-    consequences = csv.reader(consequences_file)
-
-    for consequence in consequences:
-        cons = Consequence(name=consequence[0], mean_time_to_repair=consequence[10],
-                           replacement_cost=consequence[11],
-                           deferred_prod_rate=consequence[13],
-                           component=c, facility=f)
-        v1 = Vessel.query.filter_by(name=consequence[2]).first()
-        vt1 = VesselTrip(vessel=v1, active_repair_time=consequence[5],
-                         consequence=cons)
-        v2 = Vessel.query.filter_by(name=consequence[6]).first()
-        vt2 = VesselTrip(vessel=v2, active_repair_time=consequence[9],
-                         consequence=cons)
-        db.session.add(cons)
-
-    subcomponents_file = open('inputs/subcomponents.csv')
-    subcomponents = csv.reader(subcomponents_file)
-
-    for subcomponent in subcomponents:
-        s = SubComponent(category=subcomponent[0], ident=subcomponent[1],
-                         component=c)
-        db.session.add(s)
 
+@app.cli.command()
+@click.option('--facility_id', type=int)
+@click.option('--component', default=None)
+@click.option('--vessels', type=click.Path(exists=True), default=None)
+@click.option('--consequences', type=click.Path(exists=True), default=None)
+@click.option('--subcomponents', type=click.Path(exists=True), default=None)
+@click.option('--batch_size', default=1000)
+def import_csv(facility_id, component, vessels, consequences, subcomponents,
+               batch_size):
+    """Imports vessels, consequences and sub-components from CSV files."""
+    from app.importer import import_vessels, import_consequences, \
+        import_subcomponents, component_index
+
+    facility = Facility.query.get(facility_id)
+    if facility is None:
+        raise click.BadParameter('unknown facility')
+    component_id = None
+    if component is not None:
+        component_id = component_index(facility.id).get(component)
+        if component_id is None:
+            raise click.BadParameter('unknown component')
+    if consequences and component_id is None:
+        raise click.BadParameter('consequences require a component')
+
+    reports = []
+    if vessels:
+        with open_csv(vessels) as lines:
+            reports.append(import_vessels(facility.id, lines, batch_size))
+    if consequences:
+        with open_csv(consequences) as lines:
+            reports.append(import_consequences(facility.id, component_id,
+                                               lines, batch_size))
+    if subcomponents:
+        with open_csv(subcomponents) as lines:
+            reports.append(import_subcomponents(facility.id, component_id,
+                                                lines, batch_size))
     db.session.commit()
 
+    for report in reports:
+        print(report)
+        for line, message in report.errors:
+            print('  line {}: {}'.format(line, message))
+
 
 @app.cli.command()
 def seeddb():
     """Seeds the database."""
 
-    fms_json = json.load(open('fms.json'))
-    for sc in fms_json:
-        for fm_json in fms_json[sc]:
-            fm = FailureMode(subcomponent_category=sc,
-                             description=fm_json,
-                             time_dependant=fms_json[sc][fm_json]["time_dependent"],
-                             mean_time_to_failure=fms_json[sc][fm_json]["mean_time_to_failure"],
-                             detectable=fms_json[sc][fm_json]["detectable"],
-                             inspection_type=fms_json[sc][fm_json]["inspection_type"],
-                             consequence_description=fms_json[sc][fm_json]["consequence_description"])
-            db.session.add(fm)
+    sync_fms()
 
     for i in range(5):
         f = Facility(name='facility-{}'.format(i), risk_cut_off=302500,
@@ -212,6 +224,67 @@ def seeddb():
     db.session.commit()
 
 
+@app.cli.command()
+@click.option('--facility_id', type=int, default=None)
+@click.option('--replace', is_flag=True,
+              help='Regenerate the failures of existing FMECAs.')
+def generate_fmecas(facility_id, replace):
+    """Generates the FMECAs of every component of a facility."""
+    from app.generation import generate_facility, load_catalogue
+
+    catalogue = load_catalogue()
+    facilities = Facility.query
+    if facility_id is not None:
+        facilities = facilities.filter_by(id=facility_id)
+    for facility in facilities:
+        fmecas, failures = generate_facility(facility, replace=replace,
+                                             catalogue=catalogue)
+        print('{}: {} FMECAs, {} failures'.format(facility.name, fmecas,
+                                                   failures))
+    db.session.commit()
+
+
+@app.cli.command()
+@click.option('--facility_id', type=int, default=None)
+def run_rbi(facility_id):
+    """Runs the RBI of every component of a facility for every inspection
+    type."""
+    from app.rbi import run_facility
+
+    facilities = Facility.query
+    if facility_id is not None:
+        facilities = facilities.filter_by(id=facility_id)
+    for facility in facilities:
+        for result in run_facility(facility):
+            interval = result.inspection_interval
+            print('{} {} {} {:,.2f} {}'.format(
+                facility.name, result.ident, result.inspection_type,
+                result.risk, '-' if interval is None else
+                '{:,.2f}'.format(interval)))
+    db.session.commit()
+
+
+def refresh_risks():
+    from app.rollups import refresh
+
+    print('Failure risks: {} recomputed'.format(refresh()))
+
+
+@app.cli.command()
+def refresh_rollups():
+    """Recomputes the stale and missing failure risks and roll-ups."""
+    refresh_risks()
+    db.session.commit()
+
+
+@app.cli.command()
+def run_jobs():
+    """Runs the queued background jobs."""
+    from app.jobs import run_queued
+
+    print('{} jobs run'.format(run_queued()))
+
+
 @app.cli.command()
 def clean():
     """Remove *.pyc and *.pyo files recursively starting at current directory.
@@ -229,3 +302,11 @@ def deploy():
     """Run deployment tasks."""
     # migrate database to latest revision
     upgrade()
+
+    # refresh the failure mode catalogue
+    sync_fms()
+    db.session.commit()
+
+    # fill in the risk roll-ups of existing failures
+    refresh_risks()
+    db.session.commit()
@@ -0,0 +1,119 @@
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from app import db as _db
+from app.catalogue import cache
+from app.models import Facility, Area, Component, SubComponent, \
+    Consequence, Vessel, VesselTrip, FailureMode
+
+
+@pytest.fixture(scope='session')
+def app(request):
+    """Session-wide test Flask application."""
+    app = create_app('testing')
+
+    # establish an application context before running the tests
+    ctx = app.app_context()
+    ctx.push()
+
+    def teardown():
+        ctx.pop()
+
+    request.addfinalizer(teardown)
+    return app
+
+
+@pytest.fixture(scope='session')
+def db(app, request):
+    """Session-wide test database."""
+
+    def teardown():
+        _db.drop_all()
+
+    _db.app = app
+    _db.create_all()
+
+    request.addfinalizer(teardown)
+    return _db
+
+
+@pytest.fixture(scope='function')
+def session(db, request):
+    """Creates a new database session for a test."""
+    connection = db.engine.connect()
+    transaction = connection.begin()
+
+    options = dict(bind=connection, binds={})
+    session = db.create_scoped_session(options=options)
+
+    db.session = session
+
+    def teardown():
+        transaction.rollback()
+        connection.close()
+        session.remove()
+        # the rollback bypasses the session, so drop the cached catalogue
+        cache.invalidate()
+
+    request.addfinalizer(teardown)
+    return session
+
+
+@pytest.fixture(scope='function')
+def queries(db, request):
+    """Records the SQL statements executed during a test."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    def teardown():
+        event.remove(db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+
+    request.addfinalizer(teardown)
+    return statements
+
+
+def create_tree(session, components=3):
+    """Helper function to build a facility with a small failure mode
+    catalogue."""
+    f = Facility(name='Foinaven', risk_cut_off=302500, deferred_prod_cost=18)
+    a = Area(name='DC1', equity_share=0.72, facility=f)
+    v = Vessel(name='ROV Support Vessel', abbr='ROVSV', day_rate=85000,
+               mob_time=14, facility=f)
+    session.add_all([
+        FailureMode(subcomponent_category='Valve', description='leak',
+                    time_dependant=False, mean_time_to_failure=100,
+                    detectable='Lagging', inspection_type='ROV Inspection',
+                    consequence_description='Minor Intervention'),
+        FailureMode(subcomponent_category='Valve', description='seize',
+                    time_dependant=True, mean_time_to_failure=50,
+                    detectable='Leading', inspection_type='ROV Inspection',
+                    consequence_description='Major Intervention'),
+        FailureMode(subcomponent_category='Sensor', description='drift',
+                    time_dependant=False, mean_time_to_failure=20,
+                    detectable='Leading', inspection_type='Diver Inspection',
+                    consequence_description='Minor Intervention'),
+    ])
+    for i in range(components):
+        c = Component(ident='M{}'.format(i), area=a)
+        cons = Consequence(name='Minor Intervention', mean_time_to_repair=10,
+                           replacement_cost=1000, deferred_prod_rate=100,
+                           component=c, facility=f)
+        VesselTrip(active_repair_time=5, vessel=v, consequence=cons)
+        SubComponent(ident='V1', category='Valve', component=c)
+        SubComponent(ident='S1', category='Sensor', component=c)
+        SubComponent(ident='X1', category='Unknown', component=c)
+    session.add(f)
+    session.commit()
+    return f
+
+
+@pytest.fixture(scope='function')
+def facility(session):
+    """A facility with three identical components."""
+    return create_tree(session)
@@ -0,0 +1,95 @@
+import json
+
+from app.api import bulk
+from app.generation import bulk_insert_ids
+from app.models import Area, Component, Consequence
+
+
+def post(client, url, data, content_type='application/json'):
+    rv = client.post(url, data=data, content_type=content_type)
+    return rv, json.loads(rv.data.decode('utf-8'))
+
+
+def test_bulk_components(app, session, facility, queries):
+    area = Area.query.first()
+    items = [{'ident': 'N{}'.format(i)} for i in range(50)]
+    items[3] = {'ident': 'M0'}
+    items[7] = {'category': 'Manifold'}
+    items[9] = 'N9'
+    client = app.test_client()
+    del queries[:]
+    rv, data = post(client, '/api/areas/{}/components/bulk'.format(area.id),
+                    json.dumps(items))
+    assert rv.status_code == 200
+    assert len([query for query in queries
+                if query.startswith('INSERT INTO components')]) == 1
+    assert data['created'] == 47
+    assert data['errors'] == 3
+    assert data['results'][3] == {
+        'status': 400, 'message': 'Invalid component: duplicate ident M0'}
+    assert data['results'][7]['message'] == \
+        'Invalid component: missing ident'
+    assert data['results'][9]['status'] == 400
+    component = Component.query.filter_by(ident='N0').one()
+    assert component.area is area
+    assert data['results'][0] == {
+        'status': 201,
+        'location': 'http://localhost/api/components/{}'.format(component.id)}
+    assert Component.query.count() == 50
+    for item, result in zip(items, data['results']):
+        if result['status'] == 201:
+            id = int(result['location'].rsplit('/', 1)[1])
+            assert Component.query.get(id).ident == item['ident']
+
+
+def test_bulk_ndjson(app, session, facility):
+    component = Component.query.first()
+    lines = '\n'.join(json.dumps({'ident': 'V{}'.format(i),
+                                  'category': 'Valve'}) for i in range(5))
+    client = app.test_client()
+    rv, data = post(client, '/api/components/{}/subcomponents/bulk'.format(
+        component.id), lines + '\n', 'application/x-ndjson')
+    assert rv.status_code == 200
+    assert data['created'] == 5
+    assert component.subcomponents.count() == 8
+
+    rv, data = post(client, '/api/components/{}/subcomponents/bulk'.format(
+        component.id), '{"ident": "V9"}\nnot json', 'application/x-ndjson')
+    assert rv.status_code == 400
+    assert data['message'] == 'Invalid JSON on line 2'
+    assert component.subcomponents.count() == 8
+
+
+def test_bulk_consequences(app, session, facility):
+    component = Component.query.first()
+    items = [{'name': 'Major Intervention', 'mean_time_to_repair': 20},
+             {'name': 'Replacement'}]
+    client = app.test_client()
+    rv, data = post(client, '/api/components/{}/consequences/bulk'.format(
+        component.id), json.dumps(items))
+    assert data['created'] == 1
+    consequence = Consequence.query.filter_by(name='Major Intervention').one()
+    assert consequence.component is component
+    assert consequence.facility is facility
+    assert consequence.mean_time_to_repair == 20
+
+    rv, data = post(client, '/api/components/{}/consequences/bulk'.format(
+        component.id), json.dumps({'name': 'Replacement'}))
+    assert rv.status_code == 400
+
+
+def test_bulk_conflict(app, session, facility, monkeypatch):
+    area = Area.query.first()
+
+    def racing_insert(table, rows, key):
+        # another request creates N1 after the idents were checked
+        session.execute(table.insert().values(ident='N1', area_id=area.id))
+        bulk_insert_ids(table, rows, key)
+
+    monkeypatch.setattr(bulk, 'bulk_insert_ids', racing_insert)
+    items = [{'ident': 'N0'}, {'ident': 'N1'}]
+    rv, data = post(app.test_client(),
+                    '/api/areas/{}/components/bulk'.format(area.id),
+                    json.dumps(items))
+    assert rv.status_code == 409
+    assert data['error'] == 'conflict'
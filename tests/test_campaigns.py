@@ -0,0 +1,133 @@
+import json
+import random
+import time
+
+import pytest
+
+from app.campaigns import Group, Item, VesselCosts, optimize, plan, sailings
+from app.generation import generate_facility
+from app.rbi import RBIResult, run_facility
+
+
+def item(interval, area_id, vessels, ident='C'):
+    return Item(RBIResult(None, None, ident, 'ROV Inspection', 1, 1,
+                          interval), area_id, vessels)
+
+
+def total(groups, horizon):
+    return sum(group.cost(horizon) for group in groups)
+
+
+def test_sailings():
+    assert sailings(20, 5) == 4
+    assert sailings(20, 6) == 3
+    assert sailings(20, 0.1 + 0.2 + 19.7) == 1
+    assert sailings(20, 25) == 0
+
+
+def test_group_costs():
+    vessel = VesselCosts('ROVSV', 100, 10, 1, 0.5)
+    group = Group(vessel)
+    a, b, c = item(5, 1, [vessel]), item(8, 1, [vessel]), item(4, 2, [vessel])
+    assert group.cost_with(20, a) == 4 * (1000 + 100 + 50)
+    group.add(a)
+    group.add(b)
+    assert group.cost(20) == 4 * (1000 + 200 + 50)
+    assert group.cost_with(20, c) == 5 * (1000 + 300 + 100)
+    assert group.cost_without(20, a) == 2 * (1000 + 100 + 50)
+    group.remove(a)
+    assert group.cost(20) == 2 * (1000 + 100 + 50)
+
+
+def test_optimize():
+    vessel = VesselCosts('ROVSV', 100, 1, 1, 0.5)
+    # close intervals share campaigns, a long interval sails on its own
+    items = [item(5, 1, [vessel]), item(6, 1, [vessel]),
+             item(5.5, 2, [vessel]), item(19, 1, [vessel])]
+    groups = optimize(items, 20)
+    assert sorted(len(group.members) for group in groups) == [1, 3]
+    assert total(groups, 20) < sum(Group(vessel).cost_with(20, i)
+                                   for i in items)
+
+
+def test_optimize_vessels():
+    rov = VesselCosts('ROVSV', 100, 10, 1, 0.5)
+    dsv = VesselCosts('DSV', 150, 5, 1, 0.5)
+    items = [item(5, 1, [rov]), item(5, 1, [dsv]), item(5, 1, [rov, dsv])]
+    groups = optimize(items, 20)
+    for group in groups:
+        assert all(group.vessel in i.vessels for i in group.members)
+
+
+def test_optimize_scale():
+    vessels = [VesselCosts('V{}'.format(i), 50000 + 10000 * i, 5 + i, 1, 0.5)
+               for i in range(3)]
+    rng = random.Random(0)
+    items = [item(rng.uniform(0.5, 25), rng.randrange(50),
+                  rng.sample(vessels, rng.randint(1, 3)))
+             for i in range(3000)]
+    start = time.time()
+    groups = optimize(items, 20)
+    assert time.time() - start < 30
+    assert sum(len(group.members) for group in groups) == 3000
+    assert total(groups, 20) < sum(
+        min(Group(v).cost_with(20, i) for v in i.vessels) for i in items)
+
+
+def test_optimize_many_groups():
+    # without a mobilisation to share, only components that sail as often
+    # share a campaign, which leaves hundreds of groups
+    vessel = VesselCosts('ROVSV', 100, 0, 1, 50)
+    rng = random.Random(0)
+    items = [item(rng.uniform(1, 1000), i, [vessel]) for i in range(3000)]
+    start = time.time()
+    groups = optimize(items, 10000)
+    assert time.time() - start < 10
+    assert len(groups) > 300
+    assert len({sailings(10000, group.period) for group in groups}) == \
+        len(groups)
+    assert total(groups, 10000) == pytest.approx(sum(
+        Group(vessel).cost_with(10000, i) for i in items))
+
+
+def test_plan(app, session, facility):
+    facility.remaining_life = 20
+    generate_facility(facility)
+    run_facility(facility)
+    session.commit()
+
+    result = plan(facility)
+    assert result.horizon == 20
+    inspected = [rbi for campaign in result.campaigns for rbi in campaign.rbis]
+    assert len(inspected) + len(result.uninspected) == 6
+    assert result.cost <= result.individual_cost
+
+    client = app.test_client()
+    rv = client.get('/api/facilities/{}/campaigns?horizon=10'.
+                    format(facility.id))
+    data = json.loads(rv.data.decode('utf-8'))
+    assert data['horizon'] == 10
+    assert data['saving'] == pytest.approx(
+        data['individual_cost'] - data['cost'])
+    rv = client.get('/api/facilities/{}/campaigns?horizon=-1'.
+                    format(facility.id))
+    assert rv.status_code == 400
+
+
+def test_plan_invalid(app, session, facility):
+    facility.remaining_life = 20
+    facility.risk_cut_off = 0
+    generate_facility(facility)
+    run_facility(facility)
+    session.commit()
+
+    # a zero cut-off gives zero intervals, which no campaign can meet
+    result = plan(facility)
+    assert result.campaigns == []
+    assert len(result.uninspected) == 6
+
+    client = app.test_client()
+    for horizon in ('nan', 'inf', '0'):
+        rv = client.get('/api/facilities/{}/campaigns?horizon={}'.
+                        format(facility.id, horizon))
+        assert rv.status_code == 400, horizon
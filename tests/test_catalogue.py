@@ -0,0 +1,181 @@
+import io
+import json
+
+from app.catalogue import cache, read_catalogue, sync_catalogue
+from app.counters import touch
+from app.generation import generate_facility
+from app.models import Failure, FailureMode, FailureRisk
+
+CATALOGUE = '''{
+    "Valve": {
+        "leak": {
+            "time_dependent": false,
+            "mean_time_to_failure": 100,
+            "detectable": "Lagging",
+            "inspection_type": "ROV Inspection",
+            "consequence_description": "Minor Intervention"
+        },
+        "seize": {
+            "time_dependent": true,
+            "mean_time_to_failure": 25,
+            "detectable": "Leading",
+            "inspection_type": "ROV Inspection",
+            "consequence_description": "Major Intervention",
+            "weibull_shape": 2.5,
+            "weibull_scale": 28
+        }
+    },
+    "Actuator": {
+        "stall": {
+            "time_dependent": false,
+            "mean_time_to_failure": 80,
+            "detectable": "Leading",
+            "inspection_type": "ROV Inspection",
+            "consequence_description": "Minor Intervention"
+        }
+    }
+}'''
+
+
+def test_read_catalogue():
+    entries = list(read_catalogue(io.StringIO(CATALOGUE)))
+    assert len(entries) == 3
+    assert entries[0] == {'subcomponent_category': 'Valve',
+                          'description': 'leak',
+                          'time_dependant': False,
+                          'mean_time_to_failure': 100,
+                          'detectable': 'Lagging',
+                          'inspection_type': 'ROV Inspection',
+                          'consequence_description': 'Minor Intervention',
+                          'weibull_shape': None,
+                          'weibull_scale': None}
+    assert entries[1]['weibull_shape'] == 2.5
+    assert entries[1]['weibull_scale'] == 28
+
+
+def test_sync_catalogue(session, facility):
+    generate_facility(facility)
+    session.commit()
+    leak = FailureMode.query.filter_by(description='leak').one()
+
+    # 'seize' changes, 'stall' is new and 'drift' is not in the file
+    changes = sync_catalogue(read_catalogue(io.StringIO(CATALOGUE)))
+    assert changes == (1, 1, 0, 2)
+    assert FailureMode.query.filter_by(description='drift').count() == 1
+    assert Failure.query.count() == 9
+
+    # missing failure modes are only deleted on request
+    changes = sync_catalogue(read_catalogue(io.StringIO(CATALOGUE)),
+                             delete=True)
+    assert changes == (0, 0, 1, 3)
+    session.commit()
+    assert FailureMode.query.count() == 3
+    assert FailureMode.query.filter_by(description='leak').one() is leak
+    seize = FailureMode.query.filter_by(description='seize').one()
+    assert seize.mean_time_to_failure == 25
+    assert Failure.query.count() == 6
+    assert FailureRisk.query.count() == 6
+
+    # syncing is idempotent
+    changes = sync_catalogue(read_catalogue(io.StringIO(CATALOGUE)))
+    assert changes == (0, 0, 0, 3)
+
+
+def test_sync_catalogue_duplicates(session, facility):
+    session.add(FailureMode(subcomponent_category='Valve', description='leak',
+                            mean_time_to_failure=100))
+    session.commit()
+
+    changes = sync_catalogue(read_catalogue(io.StringIO(CATALOGUE)))
+    assert changes == (1, 1, 0, 3)
+    assert FailureMode.query.filter_by(description='leak').count() == 2
+
+    changes = sync_catalogue(read_catalogue(io.StringIO(CATALOGUE)),
+                             delete=True)
+    assert changes == (0, 0, 2, 3)
+    assert FailureMode.query.filter_by(description='leak').count() == 1
+    assert FailureMode.query.filter_by(description='drift').count() == 0
+
+
+def test_cache(session, facility, queries):
+    version = cache.version
+    assert cache.categories() == ['Sensor', 'Valve']
+    assert [failure_mode.description
+            for failure_mode in cache.failure_modes('Valve')] == \
+        ['leak', 'seize']
+    assert cache.consequence_descriptions() == ['Major Intervention',
+                                                'Minor Intervention']
+
+    # reads are served from memory, after checking the stamp
+    del queries[:]
+    cache.by_category()
+    cache.failure_modes('Sensor')
+    assert len(queries) == 2
+    assert all('change_counters' in query for query in queries)
+    assert cache.version == version
+
+    # uncommitted writes are only seen by their session, committed ones
+    # invalidate the cache
+    leak = FailureMode.query.filter_by(description='leak').one()
+    leak.consequence_description = 'Leak Repair'
+    assert cache.failure_modes('Valve')[0].consequence_description == \
+        'Leak Repair'
+    assert cache.version == version
+    session.commit()
+    assert cache.version > version
+    assert cache.failure_modes('Valve')[0].consequence_description == \
+        'Leak Repair'
+
+    version = cache.version
+    FailureMode.query.filter_by(subcomponent_category='Sensor').\
+        delete(synchronize_session=False)
+    assert cache.categories() == ['Valve']
+    session.commit()
+    assert cache.version > version
+    assert cache.categories() == ['Valve']
+
+
+def test_cache_other_writers(session, facility):
+    assert cache.categories() == ['Sensor', 'Valve']
+
+    # a change committed elsewhere, e.g. by another worker, bumps the
+    # counter and is seen on the next read
+    table = FailureMode.__table__
+    session.execute(table.update().
+                    where(table.c.subcomponent_category == 'Sensor').
+                    values(subcomponent_category='Gauge'))
+    touch(table)
+    session.commit()
+    assert cache.categories() == ['Gauge', 'Valve']
+
+    # so is a row inserted without touching the counter
+    session.execute(table.insert().values(subcomponent_category='Pump',
+                                          description='trip'))
+    session.commit()
+    assert 'Pump' in cache.categories()
+
+
+def test_cache_sync_catalogue(session, facility):
+    assert cache.categories() == ['Sensor', 'Valve']
+    version = cache.version
+    sync_catalogue(read_catalogue(io.StringIO(CATALOGUE)), delete=True)
+    assert cache.categories() == ['Actuator', 'Valve']
+    session.commit()
+    assert cache.version > version
+    assert cache.categories() == ['Actuator', 'Valve']
+
+    # a rolled back change never reaches the cache
+    session.add(FailureMode(subcomponent_category='Pump', description='trip'))
+    session.flush()
+    assert 'Pump' in cache.categories()
+    session.rollback()
+    assert 'Pump' not in cache.categories()
+
+
+def test_get_catalogue(app, session, facility):
+    client = app.test_client()
+    rv = client.get('/api/failure_modes/catalogue')
+    assert rv.status_code == 200
+    data = json.loads(rv.data.decode('utf-8'))
+    assert data == {'version': cache.version,
+                    'categories': {'Sensor': 1, 'Valve': 2}}
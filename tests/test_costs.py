@@ -0,0 +1,102 @@
+import math
+
+import pytest
+
+from app.costs import CostResolver, MissingInputError, compute_costs, \
+    get_resolver
+from app.generation import bulk_insert
+from app.models import Consequence, Vessel, VesselTrip
+
+
+def test_resolver(session, facility, queries):
+    consequences = Consequence.query.all()
+    facility_id = facility.id
+    resolver = CostResolver()
+
+    del queries[:]
+    costs = resolver.facility(facility_id)
+    assert len(queries) == 1
+    assert len(costs) == 3
+    for consequence in consequences:
+        assert costs[consequence.id] == compute_costs(consequence)
+
+    # resolved costs are memoized
+    del queries[:]
+    for consequence in consequences:
+        assert resolver.costs(consequence) == costs[consequence.id]
+    assert len(queries) == 0
+
+
+def test_consequence_total_cost(session, facility):
+    consequence = Consequence.query.first()
+    production_impact = 10 * 100 * 18
+    equipment_cost = 0.72 * (1000 + (5 + 14) * 85000)
+    assert consequence.production_impact == production_impact
+    assert consequence.equipment_cost == equipment_cost
+    assert consequence.total_cost == production_impact + equipment_cost
+
+    # editing an input invalidates the memoized costs
+    vessel = Vessel.query.first()
+    vessel.day_rate = 100000
+    session.commit()
+    equipment_cost = 0.72 * (1000 + (5 + 14) * 100000)
+    assert consequence.equipment_cost == equipment_cost
+
+    # unflushed changes are computed directly
+    consequence.replacement_cost = 2000
+    equipment_cost = 0.72 * (2000 + (5 + 14) * 100000)
+    assert consequence.equipment_cost == equipment_cost
+    session.flush()
+    assert get_resolver().costs(consequence).equipment_cost == equipment_cost
+
+
+def test_resolver_scope(session, facility):
+    consequence = Consequence.query.first()
+    resolver = get_resolver()
+    assert get_resolver() is resolver
+    session.commit()
+    assert get_resolver() is not resolver
+
+    # unflushed edits to a related input drop the memo, without flushing
+    resolver = get_resolver()
+    vessel = Vessel.query.first()
+    vessel.day_rate = 100000
+    assert get_resolver() is not resolver
+    assert 'cost_resolver' not in session.info
+    assert vessel in session.dirty
+    equipment_cost = 0.72 * (1000 + (5 + 14) * 100000)
+    assert consequence.equipment_cost == equipment_cost
+
+    # Core writes
+    resolver = get_resolver()
+    bulk_insert(VesselTrip.__table__, [{'consequence_id': consequence.id,
+                                        'vessel_id': vessel.id,
+                                        'active_repair_time': 1}])
+    assert get_resolver() is not resolver
+    equipment_cost += 0.72 * (1 + 14) * 100000
+    assert consequence.equipment_cost == pytest.approx(equipment_cost)
+
+
+def test_missing_inputs(session, facility, queries):
+    consequence = Consequence.query.first()
+    consequence.replacement_cost = None
+    with pytest.raises(MissingInputError):
+        consequence.equipment_cost
+    with pytest.raises(MissingInputError):
+        consequence.total_cost
+    assert consequence.production_impact == 10 * 100 * 18
+    session.flush()
+    costs = get_resolver().facility(facility.id)
+    assert math.isnan(costs[consequence.id].total_cost)
+
+    # consequences without a facility are resolved in one query
+    session.add_all([Consequence(name='Orphan', mean_time_to_repair=1,
+                                 deferred_prod_rate=1, replacement_cost=1)
+                     for _ in range(3)])
+    session.flush()
+    del queries[:]
+    costs = CostResolver().total_costs(
+        Consequence.query.filter(Consequence.facility_id.is_(None)))
+    assert len(costs) == 3
+    assert all(math.isnan(cost) for cost in costs.values())
+    assert len(queries) == 3
@@ -0,0 +1,30 @@
+from flask import Flask
+
+from app import create_app, db
+from app.database import configure_pool
+from config import config, TestingConfig
+
+
+def test_sqlite_pragmas(tmpdir, monkeypatch):
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmpdir.join('db.sqlite'))
+
+    monkeypatch.setitem(config, 'file', FileConfig)
+    app = create_app('file')
+    engine = db.get_engine(app)
+    assert engine.execute('PRAGMA journal_mode').scalar() == 'wal'
+    assert engine.execute('PRAGMA synchronous').scalar() == 1
+    assert engine.execute('PRAGMA busy_timeout').scalar() == 5000
+    assert engine.execute('PRAGMA cache_size').scalar() == -64000
+    assert 'pool_size' not in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+
+
+def test_server_pool():
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://localhost/fmeca'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_timeout': 5}
+    configure_pool(app)
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {
+        'pool_size': 10, 'max_overflow': 20, 'pool_recycle': 1800,
+        'pool_timeout': 5}
@@ -0,0 +1,114 @@
+import json
+
+from app import db
+from app.counters import touch
+from app.generation import generate_facility
+from app.models import Area, ChangeCounter, Facility
+
+
+def test_resource_etag(app, session, facility):
+    client = app.test_client()
+    url = '/api/facilities/{}'.format(facility.id)
+    rv = client.get(url)
+    assert rv.status_code == 200
+    etag = rv.headers['ETag']
+    assert etag == '"facilities-{}-1"'.format(facility.id)
+
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.data == b''
+    assert rv.headers['ETag'] == etag
+
+    rv = client.put(url, data=json.dumps({'name': 'Schiehallion'}),
+                    content_type='application/json')
+    assert rv.status_code == 200
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] == '"facilities-{}-2"'.format(facility.id)
+    assert json.loads(rv.data.decode('utf-8'))['name'] == 'Schiehallion'
+
+
+def test_collection_etag(app, session, facility):
+    client = app.test_client()
+    url = '/api/facilities/{}/areas/?expanded=1'.format(facility.id)
+    rv = client.get(url)
+    etag = rv.headers['ETag']
+    assert etag.startswith('W/"areas-')
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+
+    area = Area.query.first()
+    area.equity_share = 0.5
+    session.commit()
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+    etag = rv.headers['ETag']
+
+    session.add(Area(name='DC2', equity_share=1, facility=facility))
+    session.commit()
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert len(json.loads(rv.data.decode('utf-8'))['areas']) == 2
+
+
+def test_collection_etag_writes(app, session, facility):
+    client = app.test_client()
+    url = '/api/facilities/{}/areas/'.format(facility.id)
+    etag = client.get(url).headers['ETag']
+
+    # a delete and an insert reusing the largest id in one transaction
+    area = Area.query.first()
+    id = area.id
+    session.delete(area)
+    session.flush()
+    session.add(Area(id=id, name='DC2', equity_share=1, facility=facility))
+    session.commit()
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    etag = rv.headers['ETag']
+
+    # a Core update, which does not bump the versions of the rows
+    table = Area.__table__
+    session.execute(table.update().values(equity_share=0.5))
+    touch(table)
+    session.commit()
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+
+
+def test_change_counters(session, facility, queries):
+    def counters():
+        return dict(session.query(ChangeCounter.table_name,
+                                  ChangeCounter.counter))
+
+    # every table has a counter from the start, so commits only update them
+    before = counters()
+    assert set(before) == set(db.metadata.tables) - {'change_counters'}
+    del queries[:]
+    generate_facility(facility)
+    session.commit()
+    assert not [query for query in queries
+                if query.startswith('INSERT INTO change_counters')]
+
+    # the writes of the roll-up refresh are counted
+    after = counters()
+    for name in ('fmecas', 'failures', 'failure_risks', 'risk_rollups'):
+        assert after[name] == before[name] + 1
+
+
+def test_conflict(app, session, facility):
+    url = '/api/facilities/{}'.format(facility.id)
+    # another request updates the facility after it was read
+    table = Facility.__table__
+    session.execute(table.update().values(version=table.c.version + 1))
+    rv = app.test_client().put(url, data=json.dumps({'name': 'Clair'}),
+                               content_type='application/json')
+    assert rv.status_code == 409
+    assert json.loads(rv.data.decode('utf-8'))['error'] == 'conflict'
+
+
+def test_keyset_untagged(app, session, facility):
+    rv = app.test_client().get('/api/facilities/?after=0')
+    assert rv.status_code == 200
+    assert 'ETag' not in rv.headers
@@ -0,0 +1,39 @@
+import json
+
+from app.export import export_facility
+from app.generation import generate_facility
+from app.models import Failure
+
+
+def test_export_facility(session, facility):
+    generate_facility(facility)
+    session.commit()
+    records = list(export_facility(facility.id))
+    types = [record['type'] for record in records]
+    assert types == ['facility'] + ['area'] + ['component'] * 3 + \
+        ['subcomponent'] * 9 + ['failure'] * 9
+    assert records[0]['name'] == 'Foinaven'
+
+    failures = {record['id']: record for record in records
+                if record['type'] == 'failure'}
+    for failure in Failure.query:
+        record = failures[failure.id]
+        assert record['failure_mode'] == failure.failure_mode.description
+        assert record['probability'] == failure.probability
+        assert record['total_cost'] == failure.total_cost
+        assert record['risk'] == failure.risk
+
+
+def test_get_facility_export(app, session, facility):
+    generate_facility(facility)
+    session.commit()
+    client = app.test_client()
+    rv = client.get('/api/facilities/{}/export'.format(facility.id))
+    assert rv.status_code == 200
+    assert rv.mimetype == 'application/x-ndjson'
+    lines = rv.data.decode('utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == \
+        list(export_facility(facility.id))
+
+    rv = client.get('/api/facilities/0/export')
+    assert rv.status_code == 404
@@ -0,0 +1,84 @@
+import io
+
+from app.importer import NameIndex, import_vessels, import_consequences, \
+    import_subcomponents
+from app.models import Component, Consequence, SubComponent, Vessel
+
+VESSELS = '''Light Well Intervention Vessel ,LWIV,160000,30
+ROV Support Vessel,ROVSV,85000,14
+Topsides Resource,TR,7000,1
+Guard Vessel,GV,lots,2
+'''
+
+CONSEQUENCES = '''\
+Major Intervention,0,Light Well Intervention Vessel ,160000,30,14,\
+ROV Support Vessel,85000,14,7,720,6200000,0,2700,0,0
+Minor Intervention,0,ROV Support Vessel,85000,14,5,Topsides Resource,7000,\
+1,1,180,300000,0,2700,0,0
+Planned Intervention,0,Guard Vessel,10000,2,3,Topsides Resource,7000,1,5,\
+60,500000,0,2700,0,0
+'''
+
+
+def test_name_index():
+    index = NameIndex([(1, 'Light Well Intervention Vessel ')])
+    assert index.get('light well  intervention vessel') == 1
+    assert 'Light Well Intervention Vessel' in index
+    assert index.get('Guard Vessel') is None
+
+
+def test_import(session, facility):
+    component = Component.query.filter_by(ident='M0').first()
+
+    report = import_vessels(facility.id, io.StringIO(VESSELS), batch_size=1)
+    assert (report.rows, report.inserted, report.skipped) == (4, 2, 1)
+    assert report.errors == [(4, 'invalid day_rate')]
+    assert Vessel.query.filter_by(abbr='LWIV').one().name == \
+        'Light Well Intervention Vessel'
+
+    report = import_consequences(facility.id, component.id,
+                                 io.StringIO(CONSEQUENCES), batch_size=2)
+    assert (report.rows, report.inserted) == (3, 2)
+    assert report.errors == [(3, 'unknown vessel Guard Vessel')]
+    consequence = component.consequences.\
+        filter_by(name='Major Intervention').one()
+    assert consequence.mean_time_to_repair == 720
+    assert consequence.deferred_prod_rate == 2700
+    assert sorted((trip.vessel.abbr, trip.active_repair_time)
+                  for trip in consequence.vessel_trips) == \
+        [('LWIV', 14), ('ROVSV', 7)]
+
+    lines = io.StringIO('Hydraulic Coupling,S-D1\n'
+                        'Hydraulic Coupling,S-D2,m1\n'
+                        ',S-D3\n'
+                        'Hydraulic Coupling,S-D4,P99\n')
+    report = import_subcomponents(facility.id, component.id, lines)
+    assert report.inserted == 2
+    assert [line for line, message in report.errors] == [3, 4]
+    assert SubComponent.query.filter_by(category='Hydraulic Coupling').\
+        count() == 2
+    session.commit()
+    assert Consequence.query.count() == 5
+
+
+def test_import_consequences_batched(session, facility, queries):
+    component = Component.query.filter_by(ident='M0').first()
+    import_vessels(facility.id, io.StringIO(VESSELS))
+    # the same name twice, told apart by their order
+    lines = CONSEQUENCES.splitlines()[:2] + \
+        [CONSEQUENCES.splitlines()[0].replace(',720,', ',360,')]
+
+    del queries[:]
+    report = import_consequences(facility.id, component.id,
+                                 io.StringIO('\n'.join(lines)))
+    assert report.inserted == 3
+    assert len([query for query in queries
+                if query.startswith('INSERT INTO consequences')]) == 1
+    major = component.consequences.filter_by(name='Major Intervention').\
+        order_by(Consequence.id).all()
+    assert [consequence.mean_time_to_repair for consequence in major] == \
+        [720, 360]
+    for consequence in major:
+        assert sorted(trip.vessel.abbr
+                      for trip in consequence.vessel_trips) == \
+            ['LWIV', 'ROVSV']
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from app import instrumentation
+from app.instrumentation import UNMATCHED
+from app.models import Component
+
+
+@pytest.fixture
+def instrumented(app):
+    app.config['INSTRUMENTATION'] = True
+    instrumentation.reset()
+    yield app
+    app.config['INSTRUMENTATION'] = False
+    instrumentation.reset()
+
+
+def test_disabled(app, session, facility):
+    client = app.test_client()
+    rv = client.get('/api/facilities/')
+    assert 'X-Query-Count' not in rv.headers
+    rv = client.get('/api/_metrics')
+    assert rv.status_code == 404
+
+
+def test_request_metrics(instrumented, session, facility):
+    client = instrumented.test_client()
+    id = Component.query.first().id
+    rv = client.get('/component/{}/fmeca'.format(id))
+    assert rv.status_code == 200
+    assert int(rv.headers['X-Query-Count']) > 0
+    timing = rv.headers['Server-Timing']
+    assert timing.startswith('sql;dur=')
+    assert 'render;dur=' in timing and 'total;dur=' in timing
+    client.get('/component/{}/fmeca'.format(id))
+
+    rv = client.get('/api/_metrics')
+    assert rv.status_code == 200
+    endpoints = json.loads(rv.data.decode('utf-8'))['endpoints']
+    fmeca = endpoints['main.fmeca']
+    assert fmeca['requests'] == 2
+    assert fmeca['max_queries'] >= fmeca['mean_queries'] > 0
+    assert fmeca['mean_render_ms'] > 0
+    assert fmeca['over_budget'] == 0
+
+
+def test_unmatched_requests(instrumented, session):
+    client = instrumented.test_client()
+    for path in ('/wp-login.php', '/.env', '/api/nothing/here'):
+        assert client.get(path).status_code == 404
+    endpoints = instrumentation.export_data()
+    assert endpoints[UNMATCHED]['requests'] == 3
+    assert not [endpoint for endpoint in endpoints
+                if endpoint.startswith('/')]
+
+
+def test_over_budget(instrumented, session, facility, caplog):
+    instrumented.config['INSTRUMENTATION_QUERY_BUDGET'] = 0
+    try:
+        client = instrumented.test_client()
+        id = Component.query.first().id
+        client.get('/component/{}'.format(id))
+    finally:
+        instrumented.config['INSTRUMENTATION_QUERY_BUDGET'] = 50
+    assert 'over budget' in caplog.text
+    assert instrumentation.export_data()['main.component']['over_budget'] == 1
@@ -0,0 +1,166 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app, db
+from app.jobs import task, submit, run_queued, expire
+from app.models import Component, FMECA, RBI, Job
+from config import config, TestingConfig
+from .conftest import create_tree
+
+
+@task('test_fail')
+def fail(context):
+    raise RuntimeError('boom')
+
+
+def test_fmeca_create_view(app, session, facility):
+    component = Component.query.first()
+    client = app.test_client()
+    rv = client.get('/component/{}/fmeca/create'.format(component.id))
+    assert rv.status_code == 302
+    assert rv.location.endswith('/component/{}/fmeca'.format(component.id))
+    job = Job.query.one()
+    assert job.status == 'done'
+    assert job.progress == 1
+    fmeca = FMECA.query.filter_by(component_id=component.id).one()
+    assert json.loads(job.result) == {'fmeca_id': fmeca.id, 'failures': 3}
+    rv = client.get('/job/{}'.format(job.id))
+    assert b'fmeca_create' in rv.data
+
+
+def test_fmeca_update_keeps_rbi(app, session, facility):
+    component = Component.query.first()
+    submit('fmeca_create', component_id=component.id)
+    submit('rbi_create', component_id=component.id)
+    fmeca = FMECA.query.filter_by(component_id=component.id).one()
+    rbi = fmeca.rbi
+    assert rbi.failures.count() == 1
+
+    job = submit('fmeca_update', component_id=component.id)
+    assert job.status == 'done'
+    assert FMECA.query.filter_by(component_id=component.id).one() is fmeca
+    assert fmeca.failures.count() == 3
+    assert RBI.query.count() == 1
+    assert rbi.failures.count() == 1
+
+
+def test_facility_fmecas_progress(app, session, facility):
+    job = submit('facility_fmecas', facility_id=facility.id)
+    assert job.status == 'done'
+    assert job.message == 'M2'
+    assert json.loads(job.result) == {'components': 3, 'fmecas': 3}
+    assert FMECA.query.count() == 3
+
+
+def test_unknown_kind(app, session):
+    with pytest.raises(ValueError):
+        submit('missing')
+
+
+def test_invalid_submit(app, session, facility):
+    component = Component.query.first()
+    for params in ({}, {'component': component.id},
+                   {'component_id': component.id, 'replace': True}):
+        with pytest.raises(ValueError):
+            submit('fmeca_create', **params)
+    for url in ('http://example.com/', '//example.com/',
+                'javascript:alert(1)', '/\\example.com', 'fmeca'):
+        with pytest.raises(ValueError):
+            submit('fmeca_create', component_id=component.id, next_url=url)
+    assert Job.query.count() == 0
+
+
+def test_expire(app, session):
+    now = datetime.utcnow()
+    stuck = Job(kind='fmeca_create', status='running',
+                started_at=now - timedelta(hours=2))
+    running = Job(kind='fmeca_create', status='running', started_at=now)
+    session.add_all([stuck, running])
+    session.flush()
+    assert expire(3600) == 1
+    session.expire_all()
+    assert stuck.status == 'failed'
+    assert stuck.finished_at is not None
+    assert running.status == 'running'
+
+
+def test_api(app, session, facility):
+    client = app.test_client()
+    rv = client.post('/api/jobs/', content_type='application/json',
+                     data=json.dumps({'kind': 'facility_fmecas',
+                                      'params': {'facility_id': facility.id}}))
+    assert rv.status_code == 202
+    rv = client.get(rv.headers['Location'])
+    data = json.loads(rv.data.decode('utf-8'))
+    assert data['status'] == 'done'
+    assert data['params'] == {'facility_id': facility.id}
+    assert data['result']['fmecas'] == 3
+
+    rv = client.post('/api/jobs/', content_type='application/json',
+                     data=json.dumps({'kind': 'missing'}))
+    assert rv.status_code == 400
+
+    # the parameters of the task only, so never the next URL of the job
+    for params in ({'facility_id': facility.id,
+                    'next_url': 'javascript:alert(1)'},
+                   {'facility': facility.id}):
+        rv = client.post('/api/jobs/', content_type='application/json',
+                         data=json.dumps({'kind': 'facility_fmecas',
+                                          'params': params}))
+        assert rv.status_code == 400
+    assert Job.query.count() == 1
+
+
+@pytest.fixture
+def file_app(tmpdir, monkeypatch):
+    """An application with a file database and its own session, as jobs run
+    outside of the transaction of the session fixture."""
+    def factory(executor):
+        class FileConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + \
+                str(tmpdir.join('db.sqlite'))
+            JOBS_EXECUTOR = executor
+
+        monkeypatch.setitem(config, 'file', FileConfig)
+        monkeypatch.setattr(db, 'session', db.create_scoped_session())
+        app = create_app('file')
+        with app.app_context():
+            db.create_all()
+        return app
+    return factory
+
+
+def test_failed_job(file_app):
+    app = file_app('inline')
+    with app.app_context():
+        create_tree(db.session)
+        job = submit('test_fail')
+        assert job.status == 'failed'
+        assert 'RuntimeError: boom' in job.error
+        assert job.finished_at is not None
+        assert run_queued() == 0
+
+        # missing rows fail the job with a message
+        component = Component.query.first()
+        job = submit('rbi_update', component_id=component.id)
+        assert job.status == 'failed'
+        assert job.error == 'Component {} has no FMECA'.format(component.id)
+        job = submit('rbi_create', component_id=0)
+        assert job.error == 'Component 0 not found'
+        job = submit('facility_rbi', facility_id=0)
+        assert job.error == 'Facility 0 not found'
+        db.session.remove()
+
+
+def test_thread_executor(file_app):
+    app = file_app('thread')
+    with app.app_context():
+        facility = create_tree(db.session)
+        job = submit('facility_fmecas', facility_id=facility.id)
+        app.extensions['jobs'].shutdown()
+        db.session.expire_all()
+        assert Job.query.get(job.id).status == 'done'
+        assert FMECA.query.count() == 3
+        db.session.remove()
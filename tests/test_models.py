@@ -1,59 +1,8 @@
-import os
 import pytest
 
-from app import create_app
-from app import db as _db
-from app.models import Vessel, VesselTrip, Consequence
-
-
-@pytest.fixture(scope='session')
-def app(request):
-    """Session-wide test Flask application."""
-    app = create_app('testing')
-
-    # establish an application context before running the tests
-    ctx = app.app_context()
-    ctx.push()
-
-    def teardown():
-        ctx.pop()
-
-    request.addfinalizer(teardown)
-    return app
-
-
-@pytest.fixture(scope='session')
-def db(app, request):
-    """Session-wide test database."""
-
-    def teardown():
-        _db.drop_all()
-
-    _db.app = app
-    _db.create_all()
-
-    request.addfinalizer(teardown)
-    return _db
-
-
-@pytest.fixture(scope='function')
-def session(db, request):
-    """Creates a new database session for a test."""
-    connection = db.engine.connect()
-    transaction = connection.begin()
-
-    options = dict(bind=connection, binds={})
-    session = db.create_scoped_session(options=options)
-
-    db.session = session
-
-    def teardown():
-        transaction.rollback()
-        connection.close()
-        session.remove()
-
-    request.addfinalizer(teardown)
-    return session
+from app.models import Component, SubComponent, Vessel, VesselTrip, \
+    Consequence, FMECA, RBI, Failure
+from app.generation import generate_facility
 
 
 def test_vessel_model(session):
@@ -88,3 +37,82 @@ def test_consequence(session):
 
     assert c.id > 0
     assert 'Minor Intervention' in repr(c)
+
+
+def test_fmeca_create(session, facility):
+    c = Component.query.filter_by(ident='M0').first()
+
+    fmeca = FMECA(component=c)
+    fmeca.create()
+    session.commit()
+
+    assert fmeca.failures.count() == 3
+    minor = c.consequences.filter_by(name='Minor Intervention').first()
+    for failure in fmeca.failures:
+        assert failure.subcomponent.component == c
+        if failure.failure_mode.description == 'seize':
+            assert failure.consequence is None
+        else:
+            assert failure.consequence == minor
+
+
+def test_fmeca_generate_facility(session, facility):
+    c = Component.query.filter_by(ident='M0').first()
+    fmeca = FMECA(component=c)
+    fmeca.create()
+    session.commit()
+
+    assert generate_facility(facility) == (2, 6)
+    session.commit()
+    assert FMECA.query.count() == 3
+    assert Failure.query.count() == 9
+    for fmeca in FMECA.query:
+        assert fmeca.failures.count() == 3
+        for failure in fmeca.failures:
+            assert failure.subcomponent.component == fmeca.component
+
+    assert generate_facility(facility) == (0, 0)
+
+    # replacing keeps the failures that are still wanted and their RBIs
+    rbi = RBI(fmeca=fmeca, inspection_type='ROV Inspection')
+    rbi.run()
+    session.commit()
+    failures = {failure.id for failure in rbi.failures}
+    assert failures
+    assert generate_facility(facility, replace=True) == (0, 0)
+    session.commit()
+    assert Failure.query.count() == 9
+    assert {failure.id for failure in rbi.failures} == failures
+    assert rbi.risk > 0
+
+
+def test_fmeca_update(session, facility):
+    c = Component.query.filter_by(ident='M0').first()
+    fmeca = FMECA(component=c)
+    fmeca.create()
+    rbi = RBI(fmeca=fmeca, inspection_type='ROV Inspection')
+    rbi.run()
+    session.commit()
+    leak = rbi.failures.one()
+    risk = leak.risk
+
+    assert fmeca.update() == (0, 0, 0, 3)
+
+    # a new valve, a sensor that is no longer a sensor and a consequence for
+    # the 'seize' failure mode
+    SubComponent(ident='V2', category='Valve', component=c)
+    c.subcomponents.filter_by(ident='S1').one().category = 'Unknown'
+    major = Consequence(name='Major Intervention', mean_time_to_repair=10,
+                        replacement_cost=1000, deferred_prod_rate=100,
+                        component=c, facility=facility)
+    session.add(major)
+    session.flush()
+    assert fmeca.update() == (2, 1, 1, 1)
+    session.commit()
+
+    assert fmeca.failures.count() == 4
+    assert Failure.query.get(leak.id).rbi_id == rbi.id
+    assert Failure.query.get(leak.id).risk == pytest.approx(risk)
+    assert rbi.failures.count() == 2
+    assert {failure.consequence for failure in fmeca.failures
+            if failure.failure_mode.description == 'seize'} == {major}
@@ -0,0 +1,94 @@
+import json
+from urllib.parse import urlsplit
+
+from flask import url_for
+
+from app.models import Facility, Area, Component
+from app.urls import resource_url
+
+
+def get(client, url):
+    parts = urlsplit(url)
+    rv = client.get(parts.path + ('?' + parts.query if parts.query else ''))
+    assert rv.status_code == 200
+    return json.loads(rv.data.decode('utf-8'))
+
+
+def test_keyset(app, session, facility):
+    area = Area.query.first()
+    session.add_all([Component(ident='N{}'.format(i), area=area)
+                     for i in range(7)])
+    session.commit()
+    ids = [id for id, in session.query(Component.id).order_by(Component.id)]
+    assert len(ids) == 10
+
+    client = app.test_client()
+    url = '/api/areas/{}/components/?after=0&per_page=4'.format(area.id)
+    components = []
+    pages = 0
+    while url:
+        data = get(client, url)
+        assert 'total' not in data['pages']
+        components += data['components']
+        url = data['pages']['next_url']
+        pages += 1
+    assert pages == 3
+    assert components == ['http://localhost/api/components/{}'.format(id)
+                          for id in ids]
+
+    data = get(client, '/api/areas/{}/components/?after={}&count=1'.format(
+        area.id, ids[5]))
+    assert len(data['components']) == 4
+    assert data['pages']['total'] == 10
+    assert data['pages']['next_url'] is None
+
+
+def test_keyset_max_per_page(app, session, facility):
+    client = app.test_client()
+    app.config['API_KEYSET_MAX_PER_PAGE'] = 2
+    try:
+        data = get(client, '/api/areas/{}/components/?after=0&per_page=50'.
+                   format(Area.query.first().id))
+    finally:
+        app.config['API_KEYSET_MAX_PER_PAGE'] = 1000
+    assert data['pages']['per_page'] == 2
+    assert len(data['components']) == 2
+
+
+def test_keyset_query_count(app, session, facility, queries):
+    client = app.test_client()
+    del queries[:]
+    get(client, '/api/areas/?after=0')
+    assert not any('count(' in statement.lower() for statement in queries)
+
+
+def test_expanded_query_count(app, session, queries):
+    client = app.test_client()
+    counts = []
+    for areas in (5, 20):
+        for i in range(Area.query.count(), areas):
+            facility = Facility(name='F{}'.format(i))
+            area = Area(name='A{}'.format(i), equity_share=1,
+                        facility=facility)
+            session.add(Component(ident='C{}'.format(i), area=area))
+        session.commit()
+        counts.append([])
+        for url in ('/api/areas/?expanded=1&per_page=50',
+                    '/api/areas/?expanded=1&after=0'):
+            del queries[:]
+            data = get(client, url)
+            assert len(data['areas']) == areas
+            assert data['areas'][0]['facility_url'].startswith(
+                'http://localhost/api/facilities/')
+            counts[-1].append(len(queries))
+    assert counts[0] == counts[1]
+
+
+def test_resource_url(app, session, facility):
+    with app.test_request_context('/'):
+        for id in (1, 12, 1234567890):
+            assert resource_url('api.get_area_components', id) == \
+                url_for('api.get_area_components', id=id, _external=True)
+    with app.test_request_context('/', base_url='https://example.com/fmeca'):
+        assert resource_url('api.get_area', 3) == \
+            'https://example.com/fmeca/api/areas/3'
@@ -0,0 +1,88 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from app.exceptions import ValidationError
+from app.generation import generate_facility
+from app.models import Failure, FailureMode
+from app.projection import life_parameters, project, project_facility, \
+    component_totals
+from app.risk import evaluate_failures, load_columns
+
+
+def test_life_parameters():
+    shape, scale = life_parameters([50, 50, 50, 50], [False, True, True, True],
+                                   [2, np.nan, 2, 2], [40, 40, 40, np.nan])
+    assert list(shape) == [1, 1, 2, 2]
+    assert scale[:3] == pytest.approx([50, 50, 40])
+    assert scale[3] == pytest.approx(50 / math.gamma(1.5))
+
+
+def test_project(session, facility):
+    generate_facility(facility)
+    session.commit()
+    columns = load_columns(Failure.query)
+    projection = project(columns, 9.5, discount_rate=0.1)
+    assert list(projection.years) == list(range(1, 11))
+    assert projection.cumulative_probability.shape == (10, 9)
+
+    # the first year of a random failure mode is its annual probability
+    ids, probability, risk = evaluate_failures(Failure.query)
+    random = ~columns['time_dependant']
+    assert projection.cumulative_probability[0][random] == \
+        pytest.approx(probability[random])
+    assert projection.expected_cost[0][random] == pytest.approx(risk[random])
+
+    # the probabilities of each year add up to the cumulative probability
+    assert projection.expected_cost.sum(axis=0) == pytest.approx(
+        projection.cumulative_probability[-1] * columns['total_cost'])
+    assert projection.discounted_cost[4] == \
+        pytest.approx(projection.expected_cost[4] / 1.1 ** 5)
+
+
+def test_weibull(session, facility):
+    FailureMode.query.filter_by(description='seize').\
+        update({'weibull_shape': 3, 'weibull_scale': 8})
+    generate_facility(facility)
+    session.commit()
+    columns = load_columns(Failure.query)
+    projection = project(columns, 10)
+    seize = np.flatnonzero(columns['time_dependant'])[0]
+    assert projection.cumulative_probability[:, seize] == pytest.approx(
+        1 - np.exp(-(np.arange(1, 11) / 8) ** 3))
+
+
+def test_project_facility(app, session, facility):
+    generate_facility(facility)
+    session.commit()
+    with pytest.raises(ValidationError):
+        project_facility(facility)
+
+    facility.remaining_life = 20
+    projection = project_facility(facility)
+    assert len(projection.years) == 20
+    totals = component_totals(projection, facility.id)
+    assert [ident for id, ident, total in totals] == ['M0', 'M1', 'M2']
+    assert sum(total for id, ident, total in totals) == \
+        pytest.approx(np.nansum(projection.discounted_cost))
+
+    session.commit()
+    client = app.test_client()
+    rv = client.get('/api/facilities/{}/projection?discount_rate=0'.
+                    format(facility.id))
+    data = json.loads(rv.data.decode('utf-8'))
+    assert data['years'] == list(range(1, 21))
+    assert data['total'] == pytest.approx(
+        np.nansum(projection.expected_cost))
+    assert data['cumulative_discounted_cost'][-1] == \
+        pytest.approx(data['total'])
+    assert len(data['components']) == 3
+
+    for query in ('horizon=1e8', 'horizon=inf', 'horizon=nan',
+                  'discount_rate=-1', 'discount_rate=-2',
+                  'discount_rate=nan'):
+        rv = client.get('/api/facilities/{}/projection?{}'.
+                        format(facility.id, query))
+        assert rv.status_code == 400, query
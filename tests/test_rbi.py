@@ -0,0 +1,56 @@
+import pytest
+
+from app.generation import generate_facility
+from app.models import Component, Failure, FMECA, RBI
+from app.rbi import inspection_types, run_facility
+
+
+def test_inspection_types(session, facility):
+    assert inspection_types() == ['Diver Inspection', 'ROV Inspection']
+
+
+def test_rbi_run(session, facility):
+    generate_facility(facility)
+    fmeca = FMECA.query.first()
+    rbi = RBI(fmeca=fmeca, inspection_type='ROV Inspection')
+    rbi.run()
+    session.commit()
+
+    # the 'seize' failure mode is time dependant
+    assert [failure.failure_mode.description
+            for failure in rbi.failures] == ['leak']
+    assert fmeca.rbi == rbi
+
+
+def test_run_facility(session, facility):
+    generate_facility(facility)
+    session.commit()
+
+    results = run_facility(facility)
+    session.commit()
+    assert len(results) == 6
+    assert RBI.query.count() == 6
+    for result in results:
+        assert result.failures == 1
+        rbi = RBI.query.get(result.rbi_id)
+        assert rbi.inspection_type == result.inspection_type
+        assert rbi.fmeca.component.ident == result.ident
+        failure = rbi.failures.one()
+        assert failure.failure_mode.inspection_type == rbi.inspection_type
+        assert result.risk == pytest.approx(failure.risk)
+        assert result.inspection_interval == \
+            pytest.approx(rbi.inspection_interval)
+    assert Failure.query.filter(Failure.rbi_id.is_(None)).count() == 3
+
+    # running again reuses the RBIs
+    assert run_facility(facility) == results
+    assert RBI.query.count() == 6
+
+
+def test_rbi_without_risk(session, facility):
+    generate_facility(facility)
+    rbi = RBI(fmeca=FMECA.query.first(), inspection_type='Visual')
+    session.add(rbi)
+    session.commit()
+    assert rbi.risk == 0
+    assert rbi.inspection_interval is None
@@ -0,0 +1,54 @@
+from app.generation import generate_facility
+from app.models import Component, SubComponent, FMECA, RBI
+from app.rbi import run_facility
+from app.reports import fmeca_rows, rbi_rows, rbi_summary
+
+
+def test_fmeca_rows(session, facility):
+    generate_facility(facility)
+    session.commit()
+    fmeca = FMECA.query.first()
+    rows = fmeca_rows(fmeca)
+    failures = fmeca.failures.all()
+    assert [row.id for row in rows] == [failure.id for failure in failures]
+    for row, failure in zip(rows, failures):
+        assert row.subcomponent_ident == failure.subcomponent.ident
+        assert row.failure_mode == failure.failure_mode.description
+        assert row.consequence == (failure.consequence.name
+                                   if failure.consequence else None)
+        assert row.probability == failure.probability
+        assert row.total_cost == failure.total_cost
+        assert row.risk == failure.risk
+
+
+def test_rbi_summary(session, facility):
+    generate_facility(facility)
+    run_facility(facility, ['ROV Inspection'])
+    session.commit()
+    rbi = RBI.query.first()
+    rows = rbi_rows(rbi)
+    assert [row.id for row in rows] == [failure.id
+                                        for failure in rbi.failures]
+    summary = rbi_summary(rbi, facility.risk_cut_off, rows)
+    assert summary.failures == 1
+    assert summary.risk == rbi.risk
+    assert summary.inspection_interval == rbi.inspection_interval
+
+
+def test_view_query_count(app, session, facility, queries):
+    component = Component.query.first()
+    for i in range(50):
+        session.add(SubComponent(ident='V{}'.format(i + 2), category='Valve',
+                                 component=component))
+    generate_facility(facility)
+    run_facility(facility, ['ROV Inspection'])
+    session.commit()
+    id = component.id
+    assert component.fmeca.failures.count() == 103
+
+    client = app.test_client()
+    for url in ('/component/{}/fmeca', '/component/{}/rbi'):
+        del queries[:]
+        rv = client.get(url.format(id))
+        assert rv.status_code == 200
+        assert len(queries) <= 10
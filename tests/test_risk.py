@@ -0,0 +1,56 @@
+import math
+import numpy as np
+
+from app import risk
+from app.models import Failure, FMECA, RBI
+from app.generation import generate_facility
+
+
+def test_probability():
+    mttf = np.array([100, 100, 50, 20])
+    multiplier = risk.detectability_multiplier(
+        ['Lagging', 'Leading', 'Lagging', None])
+    time_dependant = [False, None, True, False]
+    p = risk.probability(mttf, multiplier, time_dependant)
+    assert list(multiplier) == [0.5, 1, 0.5, 1]
+    assert p[0] == 0.5 * (1 - math.exp(-1 / 100))
+    assert p[1] == 1 - math.exp(-1 / 100)
+    assert p[2] == 0
+    assert p[3] == 1 - math.exp(-1 / 20)
+
+
+def test_probability_missing_mttf():
+    p = risk.probability([None, None], [1, 1], [False, True])
+    assert math.isnan(p[0])
+    assert p[1] == 0
+
+
+def test_evaluate():
+    p, r = risk.evaluate([100, 20], [0.5, 1], [False, False], [1000, 0])
+    assert list(r) == [p[0] * 1000, 0]
+
+
+def test_evaluate_failures(session, facility):
+    generate_facility(facility)
+    session.commit()
+
+    ids, p, r = risk.evaluate_failures(Failure.query)
+    assert len(ids) == 9
+    for id, probability, commercial_risk in zip(ids, p, r):
+        failure = Failure.query.get(int(id))
+        assert probability == failure.probability
+        assert commercial_risk == failure.risk
+    assert r.sum() > 0
+
+
+def test_rbi_risk(session, facility):
+    generate_facility(facility)
+    fmeca = FMECA.query.first()
+    rbi = RBI(fmeca=fmeca, inspection_type='ROV Inspection')
+    rbi.run()
+    session.add(rbi)
+    session.commit()
+
+    assert rbi.failures.count() == 1
+    assert rbi.risk == sum(failure.risk for failure in rbi.failures)
+    assert rbi.inspection_interval == 302500 / rbi.risk
@@ -0,0 +1,130 @@
+import pytest
+
+from app import rollups
+from app.generation import generate_facility
+from app.models import Area, Component, Failure, FailureMode, FailureRisk, \
+    RiskRollup, Vessel
+
+
+def stale():
+    return FailureRisk.query.filter_by(stale=True).count()
+
+
+def test_rollups(session, facility):
+    generate_facility(facility)
+    session.commit()
+
+    assert FailureRisk.query.count() == 9
+    assert stale() == 0
+    total = sum(failure.risk for failure in Failure.query)
+    area = Area.query.first()
+    assert rollups.risk('facility', facility.id) == pytest.approx(total)
+    assert rollups.risk('area', area.id) == pytest.approx(total)
+    components = rollups.rollup('component')
+    assert len(components) == 3
+    assert sum(components.values()) == pytest.approx(total)
+    for component in Component.query:
+        risk = sum(failure.risk for failure in component.fmeca.failures)
+        assert components[component.id] == pytest.approx(risk)
+
+
+def test_rollups_invalidation(session, facility):
+    generate_facility(facility)
+    session.commit()
+    before = rollups.risk('facility', facility.id)
+
+    # only the failures linked to a consequence use the vessel
+    vessel = Vessel.query.first()
+    vessel.day_rate = 2 * vessel.day_rate
+    session.flush()
+    assert stale() == 6
+    assert rollups.refresh() == 6
+    assert stale() == 0
+    assert rollups.risk('facility', facility.id) > before
+
+    failure_mode = FailureMode.query.filter_by(description='drift').first()
+    failure_mode.mean_time_to_failure = 10
+    facility.name = 'Schiehallion'
+    session.flush()
+    assert stale() == 3
+    session.commit()
+    assert stale() == 0
+    total = sum(failure.risk for failure in Failure.query)
+    assert rollups.risk('facility', facility.id) == pytest.approx(total)
+
+
+def test_rollups_deleted_failures(session, facility):
+    generate_facility(facility)
+    session.commit()
+
+    component = Component.query.filter_by(ident='M0').first()
+    Failure.query.filter_by(fmeca_id=component.fmeca.id).\
+        delete(synchronize_session=False)
+    session.commit()
+    assert FailureRisk.query.count() == 6
+    assert component.id not in rollups.rollup('component')
+    total = sum(failure.risk for failure in Failure.query)
+    assert rollups.risk('facility', facility.id) == pytest.approx(total)
+
+
+def test_rollups_bulk_update(session, facility):
+    generate_facility(facility)
+    session.commit()
+
+    Vessel.query.update({'mob_time': 1}, synchronize_session=False)
+    assert stale() == 9
+    session.commit()
+    total = sum(failure.risk for failure in Failure.query)
+    assert rollups.risk('facility', facility.id) == pytest.approx(total)
+
+
+def test_rollups_commit_without_changes(session, facility, queries):
+    generate_facility(facility)
+    session.commit()
+
+    del queries[:]
+    facility.name = 'Schiehallion'
+    session.commit()
+    assert not [query for query in queries if 'failure_risks' in query]
+
+
+def test_rollups_read_without_writes(session, facility, queries):
+    generate_facility(facility)
+    session.flush()
+    total = sum(failure.risk for failure in Failure.query)
+    assert rollups.risk('facility', facility.id) == pytest.approx(total)
+    assert FailureRisk.query.count() == 0
+    session.commit()
+    before = rollups.risk('facility', facility.id)
+
+    vessel = Vessel.query.first()
+    vessel.day_rate = 2 * vessel.day_rate
+    session.flush()
+    del queries[:]
+    after = rollups.risk('facility', facility.id)
+    assert after > before
+    assert after == pytest.approx(sum(failure.risk
+                                      for failure in Failure.query))
+    assert not [query for query in queries
+                if query.startswith(('INSERT', 'UPDATE', 'DELETE'))]
+    assert stale() == 6
+
+    session.commit()
+    assert stale() == 0
+    assert rollups.risk('facility', facility.id) == pytest.approx(after)
+
+
+def test_rollups_backfill(session, facility):
+    generate_facility(facility)
+    session.commit()
+    total = rollups.risk('facility', facility.id)
+
+    # tables created empty by the migration, on an existing database
+    FailureRisk.query.delete()
+    RiskRollup.query.delete()
+    session.info.pop('rollups', None)
+    session.commit()
+    assert rollups.risk('facility', facility.id) == 0
+    assert rollups.refresh() == 9
+    session.commit()
+    assert rollups.risk('facility', facility.id) == pytest.approx(total)
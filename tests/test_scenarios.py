@@ -0,0 +1,180 @@
+import json
+
+import pytest
+
+from app.generation import generate_facility
+from app.models import Consequence, Facility, FailureMode, Scenario, \
+    ScenarioOverride, Vessel
+from app.rbi import results, run_facility
+from app.rollups import rollup
+from app.scenarios import compare
+
+
+def run(session, facility):
+    generate_facility(facility)
+    run_facility(facility)
+    session.commit()
+
+
+def add_scenario(session, facility, overrides):
+    scenario = Scenario(facility=facility).import_data(
+        {'name': 'What if', 'overrides': overrides})
+    session.add(scenario)
+    session.commit()
+    return scenario
+
+
+def test_compare(session, facility):
+    run(session, facility)
+    consequence = Consequence.query.order_by(Consequence.id).first()
+    failure_mode = FailureMode.query.filter_by(description='drift').one()
+    scenario = add_scenario(session, facility, [
+        {'model': 'vessel', 'field': 'day_rate', 'factor': 1.2},
+        {'model': 'consequence', 'entity_id': consequence.id,
+         'field': 'replacement_cost', 'value': 50000},
+        {'model': 'failure_mode', 'entity_id': failure_mode.id,
+         'field': 'mean_time_to_failure', 'factor': 0.5},
+        {'model': 'facility', 'field': 'risk_cut_off', 'value': 400000}])
+    comparison = compare(scenario)
+    assert comparison.delta > 0
+
+    # the scenario matches the facility with the overrides applied
+    vessel = Vessel.query.one()
+    vessel.day_rate *= 1.2
+    consequence.replacement_cost = 50000
+    failure_mode.mean_time_to_failure *= 0.5
+    facility.risk_cut_off = 400000
+    session.flush()
+    risks = rollup('component')
+    for component in comparison.components:
+        assert component.scenario_risk == \
+            pytest.approx(risks[component.component_id])
+        assert component.delta == \
+            pytest.approx(component.scenario_risk - component.base_risk)
+    intervals = {result.rbi_id: result.inspection_interval
+                 for result in results(facility)}
+    for rbi in comparison.rbis:
+        assert rbi.scenario_interval == pytest.approx(intervals[rbi.rbi_id])
+    assert comparison.scenario_risk == \
+        pytest.approx(sum(risks[c.component_id]
+                          for c in comparison.components))
+
+
+def test_compare_untouched(session, facility, queries):
+    run(session, facility)
+    consequence = Consequence.query.order_by(Consequence.id).first()
+    scenario = add_scenario(session, facility, [
+        {'model': 'consequence', 'entity_id': consequence.id,
+         'field': 'mean_time_to_repair', 'factor': 2}])
+    del queries[:]
+    comparison = compare(scenario)
+    assert not [query for query in queries
+                if query.startswith(('INSERT', 'UPDATE', 'DELETE'))]
+    # only the failures of the consequence are evaluated again
+    assert comparison.evaluated == consequence.failures.count()
+    changed = [c for c in comparison.components if c.delta]
+    assert [c.component_id for c in changed] == [consequence.component_id]
+
+    scenario = add_scenario(session, facility, [])
+    comparison = compare(scenario)
+    assert comparison.evaluated == 0
+    assert comparison.delta == 0
+    assert all(rbi.base_interval == rbi.scenario_interval
+               for rbi in comparison.rbis)
+
+
+def test_import_data(session, facility):
+    scenario = add_scenario(session, facility, [
+        {'model': 'vessel', 'field': 'day_rate', 'factor': 1.2}])
+    scenario.import_data({'name': 'Renamed', 'overrides': [
+        {'model': 'vessel', 'field': 'day_rate', 'value': 100000}]})
+    session.commit()
+    override = scenario.overrides.one()
+    assert (override.value, override.factor) == (100000, None)
+    assert ScenarioOverride.query.count() == 1
+
+    for overrides in ([{'model': 'vessel', 'field': 'name', 'value': 1}],
+                      [{'model': 'vessel', 'field': 'day_rate'}],
+                      [{'model': 'vessel', 'field': 'day_rate',
+                        'value': 1, 'factor': 2}],
+                      [{'model': 'area', 'field': 'equity_share',
+                        'value': 'half'}],
+                      [{'model': 'vessel', 'field': 'day_rate', 'value': 1},
+                       {'model': 'vessel', 'field': 'day_rate', 'value': 2}],
+                      [{'field': 'day_rate'}]):
+        with pytest.raises(ValueError):
+            Scenario().import_data({'name': 'Bad', 'overrides': overrides})
+
+
+def test_import_data_entities(session, facility):
+    other = Facility(name='Schiehallion')
+    foreign = Vessel(abbr='DSV', name='Dive Support Vessel', day_rate=1,
+                     mob_time=1, facility=other)
+    session.add(other)
+    session.flush()
+    vessel = Vessel.query.filter_by(facility=facility).first()
+    failure_mode = FailureMode.query.first()
+
+    scenario = add_scenario(session, facility, [
+        {'model': 'vessel', 'entity_id': vessel.id, 'field': 'day_rate',
+         'factor': 1.2},
+        {'model': 'failure_mode', 'entity_id': failure_mode.id,
+         'field': 'mean_time_to_failure', 'value': 10},
+        {'model': 'facility', 'entity_id': facility.id,
+         'field': 'risk_cut_off', 'value': 1}])
+    assert scenario.overrides.count() == 3
+
+    for override in ({'entity_id': foreign.id},
+                     {'entity_id': vessel.id + foreign.id},
+                     {'entity_id': str(vessel.id)},
+                     {'entity_id': True},
+                     {'value': True},
+                     {'factor': False},
+                     {'value': float('nan')}):
+        override = dict({'model': 'vessel', 'field': 'day_rate',
+                         'factor': 1.2}, **override)
+        if 'value' in override:
+            del override['factor']
+        with pytest.raises(ValueError):
+            Scenario(facility=facility).import_data(
+                {'name': 'Bad', 'overrides': [override]})
+    with pytest.raises(ValueError):
+        Scenario(facility=facility).import_data({'name': 'Bad', 'overrides': [
+            {'model': 'facility', 'entity_id': other.id,
+             'field': 'risk_cut_off', 'value': 1}]})
+    with pytest.raises(ValueError):
+        Scenario(facility=facility).import_data({'name': 'Bad', 'overrides': [
+            {'model': 'failure_mode', 'entity_id': -1,
+             'field': 'mean_time_to_failure', 'value': 1}]})
+
+
+def test_api(app, session, facility):
+    run(session, facility)
+    client = app.test_client()
+    rv = client.post('/api/facilities/{}/scenarios/'.format(facility.id),
+                     data=json.dumps({'name': 'Day rates +20%', 'overrides': [
+                         {'model': 'vessel', 'field': 'day_rate',
+                          'factor': 1.2}]}),
+                     content_type='application/json')
+    assert rv.status_code == 201
+    url = rv.headers['Location']
+    data = json.loads(client.get(url).data.decode('utf-8'))
+    assert data['overrides'][0]['factor'] == 1.2
+
+    rv = client.get(data['comparison_url'])
+    data = json.loads(rv.data.decode('utf-8'))
+    assert len(data['components']) == 3
+    assert data['delta'] > 0
+    assert all(c['scenario_risk'] > c['base_risk']
+               for c in data['components'])
+
+    rv = client.get('/api/facilities/{}/scenarios/'.format(facility.id))
+    assert json.loads(rv.data.decode('utf-8'))['pages']['total'] == 1
+    rv = client.post('/api/facilities/{}/scenarios/'.format(facility.id),
+                     data=json.dumps({'name': 'Bad', 'overrides': [
+                         {'model': 'vessel', 'field': 'abbr',
+                          'value': 1}]}),
+                     content_type='application/json')
+    assert rv.status_code == 400
+    assert client.delete(url).status_code == 200
+    assert client.get(url).status_code == 404
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+
+from app.generation import generate_facility
+from app.models import Area, Component, Consequence, FailureMode, FMECA, \
+    RBI, Vessel, VesselTrip
+from app.sensitivity import analyse
+
+
+def create_rbi(session, facility):
+    generate_facility(facility)
+    fmeca = FMECA.query.first()
+    rbi = RBI(fmeca=fmeca, inspection_type='ROV Inspection')
+    rbi.run()
+    session.commit()
+    return rbi
+
+
+def by_label(analysis):
+    return {sensitivity.label: sensitivity for sensitivity in analysis.inputs}
+
+
+def test_analyse(session, facility):
+    rbi = create_rbi(session, facility)
+    analysis = analyse(rbi, 0.2)
+    assert analysis.risk == pytest.approx(rbi.risk)
+    assert analysis.inspection_interval == \
+        pytest.approx(rbi.inspection_interval)
+    swings = [sensitivity.swing for sensitivity in analysis.inputs]
+    assert swings == sorted(swings, reverse=True)
+
+    # each input matches the risk recomputed with the input changed
+    inputs = by_label(analysis)
+    vessel = Vessel.query.one()
+    consequence = Consequence.query.get(rbi.failures.one().consequence_id)
+    area = Area.query.one()
+    failure_mode = FailureMode.query.filter_by(description='leak').one()
+    for label, model, field in (
+            ('Day rate (ROVSV)', vessel, 'day_rate'),
+            ('Mobilisation time (ROVSV)', vessel, 'mob_time'),
+            ('Mean time to repair', consequence, 'mean_time_to_repair'),
+            ('Replacement cost', consequence, 'replacement_cost'),
+            ('Deferred production cost', facility, 'deferred_prod_cost'),
+            ('Equity share', area, 'equity_share'),
+            ('Mean time to failure', failure_mode, 'mean_time_to_failure')):
+        value = getattr(model, field)
+        setattr(model, field, value * 1.2)
+        session.flush()
+        assert rbi.risk == pytest.approx(inputs[label].high_risk), label
+        assert rbi.inspection_interval == \
+            pytest.approx(inputs[label].high_interval), label
+        setattr(model, field, value * 0.8)
+        session.flush()
+        assert rbi.risk == pytest.approx(inputs[label].low_risk), label
+        setattr(model, field, value)
+        session.flush()
+
+
+def test_api(app, session, facility):
+    rbi = create_rbi(session, facility)
+    component = rbi.fmeca.component
+    client = app.test_client()
+    rv = client.get('/api/components/{}/rbi/sensitivity?variation=0.5'.
+                    format(component.id))
+    data = json.loads(rv.data.decode('utf-8'))
+    assert data['variation'] == 0.5
+    assert data['risk'] == pytest.approx(rbi.risk)
+    assert data['inputs'][0]['swing'] >= data['inputs'][-1]['swing']
+    assert {'input': 'day_rate', 'vessel': 'ROVSV'}.items() <= \
+        next(item for item in data['inputs']
+             if item['input'] == 'day_rate').items()
+
+    rv = client.get('/api/components/{}/rbi/sensitivity?variation=2'.
+                    format(component.id))
+    assert rv.status_code == 400
+    other = Component.query.filter(Component.id != component.id).first()
+    rv = client.get('/api/components/{}/rbi/sensitivity'.format(other.id))
+    assert rv.status_code == 404
+
+    # the RBI page links to the analysis instead of running it
+    rv = client.get('/component/{}/rbi'.format(component.id))
+    url = '/component/{}/rbi/sensitivity'.format(component.id)
+    assert url.encode() in rv.data
+    assert b'Mean time to failure' not in rv.data
+    rv = client.get(url)
+    assert rv.status_code == 200
+    assert b'Mean time to failure' in rv.data
+    rv = client.get('/component/{}/rbi/sensitivity'.format(other.id))
+    assert rv.status_code == 404
+
+
+def test_analyse_vessels(session, facility):
+    rbi = create_rbi(session, facility)
+    consequence = Consequence.query.get(rbi.failures.one().consequence_id)
+    # a second vessel with the same abbreviation gets its own inputs
+    other = Vessel(name='Spare ROV Support Vessel', abbr='ROVSV',
+                   day_rate=50000, mob_time=7, facility=facility)
+    VesselTrip(active_repair_time=2, vessel=other, consequence=consequence)
+    session.commit()
+    analysis = analyse(rbi)
+    day_rates = [sensitivity for sensitivity in analysis.inputs
+                 if sensitivity.input == 'day_rate']
+    assert sorted(s.vessel_id for s in day_rates) == \
+        sorted(v.id for v in Vessel.query)
+    assert all(s.vessel == 'ROVSV' for s in day_rates)
+    assert len({s.label for s in analysis.inputs}) == len(analysis.inputs)
+    assert analysis.risk == pytest.approx(rbi.risk)
+
+
+def test_analyse_missing_inputs(session, facility):
+    rbi = create_rbi(session, facility)
+    FailureMode.query.filter_by(description='leak').one().\
+        mean_time_to_failure = None
+    session.commit()
+    analysis = analyse(rbi)
+    # the failure carries no risk, as in the roll-ups
+    assert analysis.risk == pytest.approx(rbi.risk)
+    assert all(s.swing == 0 for s in analysis.inputs)
@@ -0,0 +1,53 @@
+import datetime
+import json
+
+import numpy as np
+import pytest
+
+from app.serialization import ENCODERS, get_encoder, dumps
+
+
+@pytest.mark.parametrize('name', sorted(ENCODERS))
+def test_encoders(name):
+    encoder = get_encoder(name)
+    data = {'date': datetime.date(2017, 11, 3),
+            'datetime': datetime.datetime(2017, 11, 3, 12, 30),
+            'int': np.int64(3), 'float': np.float64(0.25), 'text': 'é'}
+    assert json.loads(encoder(data).decode('utf-8')) == {
+        'date': '2017-11-03', 'datetime': '2017-11-03T12:30:00', 'int': 3,
+        'float': 0.25, 'text': 'é'}
+    assert b'\n' not in encoder({'a': [1, 2]})
+    assert b'\n' in encoder({'a': [1, 2]}, pretty=True)
+    with pytest.raises(TypeError):
+        encoder({'a': object()})
+
+
+def test_non_finite():
+    data = {'nan': float('nan'), 'inf': [np.float64('inf'), 1.5],
+            'array': np.array([1.0, np.nan]), 'tuple': (float('-inf'),),
+            'nested': {'a': np.float64('nan')}}
+    expected = {'nan': None, 'inf': [None, 1.5], 'array': [1.0, None],
+                'tuple': [None], 'nested': {'a': None}}
+    outputs = set()
+    for name in sorted(ENCODERS):
+        output = get_encoder(name)(data)
+        assert json.loads(output.decode('utf-8')) == expected
+        outputs.add(output)
+    assert len(outputs) == 1
+
+
+def test_get_encoder(app):
+    assert get_encoder('stdlib') is ENCODERS['stdlib']
+    with pytest.raises(ValueError):
+        get_encoder('simplejson')
+    app.config['JSON_ENCODER'] = 'stdlib'
+    try:
+        assert dumps({'a': 1}) == b'{"a":1}'
+    finally:
+        app.config['JSON_ENCODER'] = 'auto'
+
+
+def test_response(app, session, facility):
+    rv = app.test_client().get('/api/facilities/{}'.format(facility.id))
+    assert rv.mimetype == 'application/json'
+    assert json.loads(rv.data.decode('utf-8'))['name'] == 'Foinaven'
@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.exceptions import ValidationError
+from app.generation import generate_facility
+from app.jobs import submit
+from app.models import Component
+from app.rollups import risk
+from app.uncertainty import load_inputs, sample, evaluate_chunk, \
+    simulate, simulate_facility
+
+
+def test_sample():
+    random = np.random.RandomState(0)
+    values = sample(random, [10, 0, np.nan], ('triangular', 0.5, 2), 1000)
+    assert values.shape == (1000, 3)
+    assert 5 <= values[:, 0].min() and values[:, 0].max() <= 20
+    assert (values[:, 1] == 0).all()
+    assert np.isnan(values[:, 2]).all()
+    values = sample(random, [10], ('lognormal', 0.2), 10000)
+    assert np.median(values) == pytest.approx(10, rel=0.02)
+    assert (sample(random, [10], None, 5) == 10).all()
+
+
+def test_point_estimates(session, facility):
+    generate_facility(facility)
+    session.commit()
+    inputs = load_inputs(facility.id)
+    assert len(inputs.failure_ids) == 9
+    assert list(inputs.component_ids) == \
+        [c.id for c in Component.query.order_by(Component.id)]
+
+    # without distributions every sample is the deterministic risk
+    components = evaluate_chunk(inputs, {}, 3, 0)
+    assert components.shape == (3, 3)
+    for index, id in enumerate(inputs.component_ids):
+        assert components[:, index] == pytest.approx(risk('component', int(id)))
+
+
+def test_simulate(app, session, facility):
+    generate_facility(facility)
+    session.commit()
+    inputs = load_inputs(facility.id)
+    result = simulate(inputs, samples=2000, seed=1)
+    assert result.samples == 2000
+    p = result.facility
+    assert p.p10 < p.p50 < p.p90
+    assert sum(c.p50 for c in result.components.values()) == \
+        pytest.approx(p.p50, rel=0.1)
+
+    # the chunks are seeded up front, so workers do not change the result
+    app.config['UNCERTAINTY_CHUNK_ELEMENTS'] = 900
+    try:
+        chunked = simulate(inputs, samples=2000, seed=1)
+        assert simulate(inputs, samples=2000, seed=1, workers=2) == chunked
+    finally:
+        app.config['UNCERTAINTY_CHUNK_ELEMENTS'] = 2000000
+    assert chunked.facility.mean == pytest.approx(p.mean, rel=0.1)
+
+
+def test_empty_facility(app, session, facility):
+    result = simulate_facility(facility.id, samples=10)
+    assert result.components == {}
+    assert result.facility.p50 == 0
+
+
+def test_api(app, session, facility):
+    generate_facility(facility)
+    session.commit()
+    client = app.test_client()
+    rv = client.get('/api/facilities/{}/uncertainty?samples=500&seed=3'.
+                    format(facility.id))
+    data = json.loads(rv.data.decode('utf-8'))
+    assert data['samples'] == 500
+    assert data['facility']['p10'] <= data['facility']['p90']
+    assert [c['ident'] for c in data['components']] == ['M0', 'M1', 'M2']
+
+    for samples in ('1000000', '0', '-5', 'many'):
+        rv = client.get('/api/facilities/{}/uncertainty?samples={}'.
+                        format(facility.id, samples))
+        assert rv.status_code == 400, samples
+
+    job = submit('facility_uncertainty', facility_id=facility.id,
+                 samples=500, seed=3)
+    assert json.loads(job.result) == data
+
+    # the limit also holds outside of the API, e.g. in jobs
+    with pytest.raises(ValidationError):
+        simulate_facility(facility.id, samples=1000000)